@@ -0,0 +1,69 @@
+"""
+Messages per second of WS RPC JSON encoding: marshmallow dump and stdlib json against gateway codec.
+
+    python -m benchmarks.codec_benchmark --messages 20000
+"""
+import argparse
+import json
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from booker.finteh_proto.dto import OrderDTO, TransactionDTO
+
+from src import codec
+from src.gw_dto import TxError
+
+order_schema = OrderDTO.Schema()
+
+
+def make_order() -> OrderDTO:
+    tx = TransactionDTO(
+        coin="FINTEHTEST.USDT",
+        amount=Decimal("12.345"),
+        from_address="fincubator-gateway-test",
+        to_address="some-user-account",
+        created_at=1590000000,
+        confirmations=3,
+        max_confirmations=5,
+        error=TxError.NO_ERROR,
+        tx_id="12345:8d8e3a0a1ab0c7d4e4c2b1f6e0f2c1d3e4f5a6b7",
+    )
+    return OrderDTO(order_id=uuid4(), in_tx=tx, out_tx=tx)
+
+
+def rate(func, messages: list) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main(count: int):
+    orders = [make_order() for _ in range(count)]
+    encoded = [json.dumps(order_schema.dump(order)) for order in orders]
+
+    results = {
+        "encode marshmallow + json": rate(
+            lambda order: json.dumps(order_schema.dump(order)), orders
+        ),
+        f"encode codec ({'orjson' if codec.orjson else 'json'})": rate(
+            codec.dumps, orders
+        ),
+        "decode json + marshmallow": rate(
+            lambda msg: order_schema.load(json.loads(msg)), encoded
+        ),
+        "decode codec + marshmallow": rate(
+            lambda msg: order_schema.load(codec.loads(msg)), encoded
+        ),
+        "decode json": rate(json.loads, encoded),
+        "decode codec": rate(codec.loads, encoded),
+    }
+    for name, messages_per_second in results.items():
+        print(f"{name:>30}: {messages_per_second:>10.0f} msg/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    main(parser.parse_args().messages)
@@ -0,0 +1,137 @@
+"""
+Memory of in-flight operations: marshmallow DTOs and SQLAlchemy ORM instances against OpRecord.
+
+    python -m benchmarks.op_record_memory --ops 100000 --tick 1000
+
+Bytes per op are measured by tracemalloc with all ops alive. Field values are shared by all
+representations, so only container overhead is counted. Loop tick processes --tick rows the way
+watch_unconfirmed_operations does: row to operation, one changed field, column values for UPDATE.
+Allocation pressure of a tick is reported as peak traced memory and number of generation 0
+garbage collections it triggers.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+from uuid import uuid4
+
+from src.db_utils.models import BitsharesOperation
+from src.gw_dto import (
+    BitSharesOperation as BitSharesOperationDTO,
+    OrderType,
+    TxError,
+    TxStatus,
+)
+from src.op_record import FIELDS, OpRecord
+from src.utils import object_as_dict, rowproxy_to_dto
+
+
+def make_rows(count: int) -> list:
+    """Rows as returned by select([BitsharesOperation]), RowProxy is a mapping as well"""
+    created_at = datetime.utcnow()
+    return [
+        {
+            "pk": n,
+            "op_id": 40000000 + n,
+            "order_id": uuid4(),
+            "order_type": OrderType.DEPOSIT,
+            "asset": "FINTEHTEST.USDT",
+            "from_account": "fincubator-gateway-test",
+            "to_account": "some-user-account",
+            "amount": 100000,
+            "status": TxStatus.RECEIVED_NOT_CONFIRMED,
+            "confirmations": 0,
+            "irreversible_confirmations": 0,
+            "block_num": 37899972,
+            "tx_hash": "8d8e3a0a1ab0c7d4e4c2b1f6e0f2c1d3e4f5a6b7",
+            "tx_created_at": created_at,
+            "tx_expiration": None,
+            "error": TxError.NO_ERROR,
+            "memo": None,
+        }
+        for n in range(count)
+    ]
+
+
+def dto_of(row):
+    values = dict(row)
+    values.pop("pk")
+    return BitSharesOperationDTO(**values)
+
+
+def bytes_per_op(make, rows: list) -> float:
+    gc.collect()
+    tracemalloc.start()
+    ops = [make(row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ops
+    # Minus list of ops itself
+    return size / len(rows) - 8
+
+
+def old_tick(rows: list) -> list:
+    updates = []
+    for row in rows:
+        op = rowproxy_to_dto(row, BitsharesOperation, BitSharesOperationDTO)
+        op.confirmations += 1
+        values = object_as_dict(BitsharesOperation(**op.__dict__))
+        values.pop("pk")
+        updates.append(values)
+    return updates
+
+
+def new_tick(rows: list) -> list:
+    updates = []
+    for row in rows:
+        op = OpRecord.from_row(row).replace(confirmations=row["confirmations"] + 1)
+        updates.append(op.values())
+    return updates
+
+
+def measure_tick(tick, rows: list, repeat: int) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    tick(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    collections = gc.get_stats()[0]["collections"]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        tick(rows)
+    elapsed = (time.perf_counter() - started) / repeat
+    collections = (gc.get_stats()[0]["collections"] - collections) / repeat
+    return elapsed, peak, collections
+
+
+def main(args):
+    rows = make_rows(args.ops)
+    assert set(rows[0]) == set(FIELDS)
+
+    print(f"{args.ops} in-flight ops")
+    for name, make in (
+        ("dict row", dict),
+        ("marshmallow DTO", dto_of),
+        ("SQLAlchemy ORM instance", lambda row: BitsharesOperation(**row)),
+        ("OpRecord", OpRecord.from_row),
+    ):
+        print(f"{name:>25}: {bytes_per_op(make, rows):>6.0f} bytes/op")
+
+    tick_rows = rows[: args.tick]
+    print(f"loop tick of {args.tick} ops")
+    for name, tick in (("DTO + ORM", old_tick), ("OpRecord", new_tick)):
+        elapsed, peak, collections = measure_tick(tick, tick_rows, args.repeat)
+        print(
+            f"{name:>25}: {elapsed * 1000:>7.2f} ms, peak {peak / 1024:>8.0f} KiB, "
+            f"{collections:>6.1f} gen0 collections"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ops", type=int, default=100000)
+    parser.add_argument("--tick", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
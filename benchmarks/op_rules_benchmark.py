@@ -0,0 +1,132 @@
+"""
+Validation rules throughput: compiled OpValidator against per-operation Config checks.
+
+    python -m benchmarks.op_rules_benchmark --ops 100000 --tenants 4
+
+Page of --ops transfers to and from gateway account is validated with decrypted memos already at
+hand, so only rules are measured. Old path looks tenant up by (account, asset) for every op, falls
+back to a fresh Config() and splits memo three times, the way validate_op() did.
+"""
+import argparse
+import random
+import time
+from copy import copy
+
+from src.blockchain.op_rules import OpValidator
+from src.config import Config
+from src.gw_dto import OrderType, TxError
+
+GATEWAY_ID = "1.2.100"
+
+
+def make_tenants(count: int) -> list:
+    base = Config()
+    tenants = []
+    for n in range(count):
+        tenant = copy(base)
+        tenant.gateway_distribute_asset = f"COIN{n}"
+        tenant.set_asset(f"1.3.{10 + n}", 6)
+        tenants.append(tenant)
+    return tenants
+
+
+def make_page(tenants: list, count: int) -> tuple:
+    transfers = []
+    memos = []
+    for n in range(count):
+        tenant = random.choice(tenants)
+        user = f"1.2.{1000 + n % 500}"
+        if n % 2:
+            transfers.append(
+                {
+                    "from": user,
+                    "to": GATEWAY_ID,
+                    "amount": {"amount": 500000, "asset_id": tenant.asset_id},
+                }
+            )
+            memos.append(f"{tenant.gateway_distribute_asset.lower()}:0x{n:x}")
+        else:
+            transfers.append(
+                {
+                    "from": GATEWAY_ID,
+                    "to": user,
+                    "amount": {"amount": 500000, "asset_id": tenant.asset_id},
+                }
+            )
+            memos.append(None)
+    return transfers, memos
+
+
+def old_check(tenants_by_ids: dict, transfer: dict, memo: str) -> tuple:
+    asset_id = transfer["amount"]["asset_id"]
+    cfg = None
+    for account_id in (transfer["from"], transfer["to"]):
+        cfg = tenants_by_ids.get((account_id, asset_id))
+        if cfg is not None:
+            break
+    cfg = Config() if not cfg else cfg
+
+    amount = int(transfer["amount"]["amount"])
+    error = TxError.NO_ERROR
+    if asset_id != cfg.asset_id:
+        error = TxError.BAD_ASSET
+    if transfer["from"] == GATEWAY_ID:
+        order_type = OrderType.DEPOSIT
+        if amount < cfg.min_deposit_units:
+            error = TxError.LESS_MIN
+        if amount > cfg.max_deposit_units:
+            error = TxError.GREATER_MAX
+    else:
+        order_type = OrderType.WITHDRAWAL
+        if amount < cfg.min_withdrawal_units:
+            error = TxError.LESS_MIN
+        if amount > cfg.max_withdrawal_units:
+            error = TxError.GREATER_MAX
+        if not memo:
+            error = TxError.NO_MEMO
+        elif (
+            len(memo.split(":")) != 2
+            or memo.split(":")[0].upper() != cfg.gateway_distribute_asset
+            or len(memo.split(":")[1]) == 0
+        ):
+            error = TxError.FLOOD_MEMO
+    return cfg, order_type, error
+
+
+def measure(check, repeat: int, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        check()
+    return count * repeat / (time.perf_counter() - started)
+
+
+def main(args):
+    random.seed(args.seed)
+    tenants = make_tenants(args.tenants)
+    transfers, memos = make_page(tenants, args.ops)
+
+    tenants_by_ids = {(GATEWAY_ID, tenant.asset_id): tenant for tenant in tenants}
+    validator = OpValidator.compile(tenants, {tenants[0].account: GATEWAY_ID})
+
+    old = [old_check(tenants_by_ids, t, m)[1:] for t, m in zip(transfers, memos)]
+    new = [verdict[1:] for verdict in validator.check_page(transfers, memos)]
+    assert old == new
+
+    print(f"{args.ops} transfers, {args.tenants} tenants")
+    for name, check in (
+        (
+            "per-op Config",
+            lambda: [old_check(tenants_by_ids, t, m) for t, m in zip(transfers, memos)],
+        ),
+        ("OpValidator page", lambda: validator.check_page(transfers, memos)),
+    ):
+        print(f"{name:>20}: {measure(check, args.repeat, args.ops):>12,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ops", type=int, default=100000)
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,103 @@
+"""
+Reconciliation time of synthetic account history and database snapshot.
+
+    python -m benchmarks.reconcile_benchmark --ops 1000000
+
+History and CSV snapshot of --ops transfers are written to a temporary directory first, with
+--diff of them changed in database, then src.reconcile is timed by stage: loading of each input
+into columns and bulk comparison. Backend is numpy if it is installed, plain arrays otherwise.
+"""
+import argparse
+import csv
+import json
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from src import reconcile
+
+GATEWAY_ID = "1.2.100"
+USDT = "1.3.10"
+
+
+def write_inputs(directory: Path, count: int, diff: int) -> tuple:
+    history = directory / "history.jsonl"
+    operations = directory / "operations.csv"
+    changed = set(random.sample(range(count), diff))
+    first_day = date(2020, 1, 1)
+
+    with open(history, "w") as history_out, open(
+        operations, "w", newline=""
+    ) as operations_out:
+        writer = csv.writer(operations_out)
+        writer.writerow(
+            ["op_id", "order_type", "asset", "amount", "status", "tx_created_at"]
+        )
+        for n in range(count):
+            day = (first_day + timedelta(days=n // 5000)).isoformat()
+            user = f"1.2.{1000 + n % 5000}"
+            deposit = n % 3 == 0
+            amount = random.randrange(1, 10 ** 8)
+            op = {
+                "id": f"1.11.{1000000 + n}",
+                "op": [
+                    0,
+                    {
+                        "from": GATEWAY_ID if deposit else user,
+                        "to": user if deposit else GATEWAY_ID,
+                        "amount": {"amount": amount, "asset_id": USDT},
+                    },
+                ],
+                "block_num": 30000000 + n,
+                "block_time": f"{day}T12:00:00",
+            }
+            history_out.write(json.dumps(op) + "\n")
+            writer.writerow(
+                [
+                    1000000 + n,
+                    "DEPOSIT" if deposit else "WITHDRAWAL",
+                    "FINTEHTEST.USDT",
+                    amount + 1 if n in changed else amount,
+                    "RECEIVED_AND_CONFIRMED",
+                    f"{day} 12:00:01.000",
+                ]
+            )
+    return history, operations
+
+
+def main(args):
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        history, operations = write_inputs(Path(directory), args.ops, args.diff)
+        assets = reconcile.Assets({USDT: "FINTEHTEST.USDT"})
+
+        started = time.perf_counter()
+        with open(history) as lines:
+            chain = reconcile.load_history(lines, GATEWAY_ID, assets)
+        loaded_history = time.perf_counter()
+        with open(operations, newline="") as rows:
+            db, unsent = reconcile.load_operations(csv.DictReader(rows), assets)
+        loaded_operations = time.perf_counter()
+        report = reconcile.reconcile(chain, db, unsent, assets)
+        finished = time.perf_counter()
+
+    assert report["summary"]["mismatched"] == args.diff
+    backend = "numpy" if reconcile.numpy is not None else "array"
+    print(f"{args.ops} ops, {backend} backend")
+    for name, seconds in (
+        ("load history", loaded_history - started),
+        ("load operations", loaded_operations - loaded_history),
+        ("compare", finished - loaded_operations),
+        ("total", finished - started),
+    ):
+        print(f"{name:>16}: {seconds:>8.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--ops", type=int, default=1000000)
+    parser.add_argument("--diff", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+"""
+Signed transactions per second of TransactionSigner by number of worker processes.
+
+Works offline with random key and synthetic transfer:
+
+    python -m benchmarks.signer_benchmark --txs 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from bitsharesbase import operations
+from bitsharesbase.account import PrivateKey
+from bitsharesbase.objects import Operation
+from bitsharesbase.signedtransactions import Signed_Transaction
+
+from src.blockchain.signer import TransactionSigner
+
+CHAIN = {
+    "chain_id": "39f5e2ede1f8bc1a3a54a7914414e3779e33193f1f5693510e73cb7a87617447",
+    "core_symbol": "TEST",
+    "prefix": "TEST",
+}
+
+
+def make_transfer(n: int) -> dict:
+    op = operations.Transfer(
+        **{
+            "fee": {"amount": 100, "asset_id": "1.3.0"},
+            "from": "1.2.100",
+            "to": "1.2.200",
+            "amount": {"amount": 1000 + n, "asset_id": "1.3.1"},
+            "prefix": CHAIN["prefix"],
+        }
+    )
+    return Signed_Transaction(
+        ref_block_num=1,
+        ref_block_prefix=2,
+        expiration="2030-01-01T00:00:00",
+        operations=[Operation(op)],
+    ).json()
+
+
+async def measure(wif: str, workers: int, txs: list) -> float:
+    signer = TransactionSigner([wif], CHAIN, workers)
+    try:
+        # Warm up all workers before measuring
+        await asyncio.gather(*(signer.sign(tx, [wif]) for tx in txs[:workers]))
+        start = time.perf_counter()
+        await asyncio.gather(*(signer.sign(tx, [wif]) for tx in txs))
+        return len(txs) / (time.perf_counter() - start)
+    finally:
+        signer.close()
+
+
+async def main(count: int, max_workers: int):
+    wif = str(PrivateKey(prefix=CHAIN["prefix"]))
+    txs = [make_transfer(n) for n in range(count)]
+
+    print(f"{'workers':>8} {'tx/s':>10} {'speedup':>8}")
+    single = None
+    for workers in range(1, max_workers + 1):
+        rate = await measure(wif, workers, txs)
+        single = single or rate
+        print(f"{workers:>8} {rate:>10.1f} {rate / single:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--txs", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    asyncio.run(main(args.txs, args.max_workers))
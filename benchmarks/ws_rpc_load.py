@@ -0,0 +1,106 @@
+"""
+Websocket load generator for gateway WS RPC server.
+
+Sends init_new_tx requests from concurrent connections, one request per message or as JSON-RPC
+batches, and reports requests per second, latency and overload errors:
+
+    python -m benchmarks.ws_rpc_load --url ws://127.0.0.1:9999/ws-rpc --requests 5000 --batch 50
+
+Every request inserts an operation, so run it against test database only.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from uuid import uuid4
+
+import aiohttp
+
+# Same as src.bts_ws_rpc_server.OVERLOADED_ERROR_CODE, not imported to keep generator standalone
+OVERLOADED_ERROR_CODE = -32000
+
+
+def make_request(msg_id: int, asset: str, to_address: str) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": msg_id,
+        "method": "init_new_tx",
+        "params": {
+            "order_id": str(uuid4()),
+            "out_tx": {"coin": asset, "to_address": to_address, "amount": "0.1"},
+        },
+    }
+
+
+async def connection_worker(
+    session, url: str, messages: asyncio.Queue, stats: dict
+) -> None:
+    async with session.ws_connect(url) as ws:
+        while True:
+            try:
+                message = messages.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            started = time.perf_counter()
+            await ws.send_str(json.dumps(message))
+            response = json.loads((await ws.receive()).data)
+            stats["latencies"].append(time.perf_counter() - started)
+
+            for item in response if isinstance(response, list) else [response]:
+                error = item.get("error")
+                if error is None:
+                    stats["ok"] += 1
+                elif error["code"] == OVERLOADED_ERROR_CODE:
+                    stats["overloaded"] += 1
+                else:
+                    stats["errors"] += 1
+
+
+async def main(args):
+    requests = [
+        make_request(n, args.asset, args.to_address) for n in range(args.requests)
+    ]
+    messages = asyncio.Queue()
+    if args.batch > 1:
+        for i in range(0, len(requests), args.batch):
+            messages.put_nowait(requests[i : i + args.batch])
+    else:
+        for request in requests:
+            messages.put_nowait(request)
+
+    stats = {"ok": 0, "overloaded": 0, "errors": 0, "latencies": []}
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                connection_worker(session, args.url, messages, stats)
+                for _ in range(args.connections)
+            )
+        )
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats["latencies"])
+    print(
+        f"requests: {args.requests}, batch: {args.batch}, connections: {args.connections}"
+    )
+    print(f"requests/s: {args.requests / elapsed:.1f}")
+    print(
+        f"message latency ms: median {statistics.median(latencies) * 1000:.1f}, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}"
+    )
+    print(
+        f"ok: {stats['ok']}, overloaded: {stats['overloaded']}, errors: {stats['errors']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="ws://127.0.0.1:9999/ws-rpc")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--asset", default="FINTEHTEST.USDT")
+    parser.add_argument("--to-address", default="fincubator-gateway-test")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""Create bitshares operations archive table
+
+Revision ID: 3e5b0c7a9d21
+Revises: 1aaaa2faf8bc
+Create Date: 2026-10-19 10:12:03.418215
+
+"""
+import sys
+
+sys.path.append("/app")
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID, ENUM
+
+import datetime
+
+
+# revision identifiers, used by Alembic.
+revision = "3e5b0c7a9d21"
+down_revision = "1aaaa2faf8bc"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Enum types are already created with bitshares_operations table
+    op.create_table(
+        "bitshares_operations_archive",
+        sa.Column("pk", sa.Integer, primary_key=True, index=True),
+        sa.Column("op_id", sa.Integer, unique=True),
+        sa.Column("order_id", UUID(as_uuid=True), unique=True),
+        sa.Column(
+            "order_type",
+            ENUM(
+                "TRASH", "DEPOSIT", "WITHDRAWAL", name="order_type", create_type=False
+            ),
+        ),
+        sa.Column("asset", sa.String),
+        sa.Column("from_account", sa.String),
+        sa.Column("to_account", sa.String),
+        sa.Column("amount", sa.Numeric),
+        sa.Column(
+            "status",
+            ENUM(
+                "ERROR",
+                "WAIT",
+                "RECEIVED_NOT_CONFIRMED",
+                "RECEIVED_AND_CONFIRMED",
+                name="status",
+                create_type=False,
+            ),
+        ),
+        sa.Column("confirmations", sa.Integer),
+        sa.Column("block_num", sa.Integer),
+        sa.Column("tx_hash", sa.String, index=True),
+        sa.Column("tx_created_at", sa.DateTime, default=datetime.datetime.utcnow()),
+        sa.Column("tx_expiration", sa.DateTime),
+        sa.Column(
+            "error",
+            ENUM(
+                "NO_ERROR",
+                "UNKNOWN_ERROR",
+                "BAD_ASSET",
+                "LESS_MIN",
+                "GREATER_MAX",
+                "NO_MEMO",
+                "FLOOD_MEMO",
+                "OP_COLLISION",
+                "TX_HASH_NOT_FOUND",
+                name="error",
+                create_type=False,
+            ),
+        ),
+        sa.Column("memo", sa.String),
+    )
+
+
+def downgrade():
+    op.drop_table("bitshares_operations_archive")
@@ -0,0 +1,30 @@
+"""Add irreversible confirmations to bitshares operations
+
+Revision ID: a4f1d2c6b803
+Revises: 3e5b0c7a9d21
+Create Date: 2026-10-19 13:40:27.106385
+
+"""
+import sys
+
+sys.path.append("/app")
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a4f1d2c6b803"
+down_revision = "3e5b0c7a9d21"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("bitshares_operations", "bitshares_operations_archive"):
+        op.add_column(table, sa.Column("irreversible_confirmations", sa.Integer))
+
+
+def downgrade():
+    for table in ("bitshares_operations", "bitshares_operations_archive"):
+        op.drop_column(table, "irreversible_confirmations")
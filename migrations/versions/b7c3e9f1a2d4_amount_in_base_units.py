@@ -0,0 +1,93 @@
+"""Store operation amounts as integer base units
+
+Revision ID: b7c3e9f1a2d4
+Revises: a4f1d2c6b803
+Create Date: 2026-10-19 15:02:41.530117
+
+Existing amounts are converted by precision of their assets, which must be passed if tables are
+not empty, like:
+
+    alembic -x precisions=FINTEHTEST.USDT:6,FINTEHTEST.BTC:8 upgrade head
+
+"""
+import sys
+
+sys.path.append("/app")
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7c3e9f1a2d4"
+down_revision = "a4f1d2c6b803"
+branch_labels = None
+depends_on = None
+
+tables = ("bitshares_operations", "bitshares_operations_archive")
+
+
+def get_precisions() -> dict:
+    value = context.get_x_argument(as_dictionary=True).get("precisions", "")
+    return {
+        asset: int(precision)
+        for asset, precision in (
+            item.rsplit(":", 1) for item in value.split(",") if item
+        )
+    }
+
+
+def convert(table: str, new_type, scale: str) -> None:
+    """Rewrite amount column of table as amount * 10 ^ (scale * precision) of every asset"""
+    conn = op.get_bind()
+    precisions = get_precisions()
+    assets = [
+        row[0]
+        for row in conn.execute(
+            sa.text(f"SELECT DISTINCT asset FROM {table} WHERE amount IS NOT NULL")
+        )
+    ]
+    missing = [asset for asset in assets if asset not in precisions]
+    if missing:
+        raise RuntimeError(
+            f"Unknown precision of {', '.join(map(str, missing))} in {table}, "
+            f"pass it as: alembic -x precisions=ASSET:PRECISION,... upgrade head"
+        )
+
+    # Integer ^ is computed in double precision, like 4.35 * 100 = 434.99999999999994, numeric is exact
+    scaled = f"amount * power(10::numeric, {scale} * :precision)"
+    for asset in assets:
+        # BIGINT cast would silently round amounts finer than asset precision
+        fractional = conn.execute(
+            sa.text(
+                f"SELECT count(*) FROM {table} "
+                f"WHERE asset = :asset AND {scaled} <> trunc({scaled})"
+            ),
+            precision=precisions[asset],
+            asset=asset,
+        ).scalar()
+        if fractional and new_type is sa.BigInteger:
+            raise RuntimeError(
+                f"{fractional} amounts of {asset} in {table} are finer than precision "
+                f"{precisions[asset]}"
+            )
+
+    op.add_column(table, sa.Column("amount_new", new_type))
+    for asset in assets:
+        conn.execute(
+            sa.text(f"UPDATE {table} SET amount_new = {scaled} WHERE asset = :asset"),
+            precision=precisions[asset],
+            asset=asset,
+        )
+    op.drop_column(table, "amount")
+    op.alter_column(table, "amount_new", new_column_name="amount")
+
+
+def upgrade():
+    for table in tables:
+        convert(table, sa.BigInteger, "1")
+
+
+def downgrade():
+    for table in tables:
+        convert(table, sa.Numeric, "-1")
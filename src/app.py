@@ -1,5 +1,6 @@
 import asyncio
 import aiohttp
+from datetime import datetime, timedelta
 from getpass import getpass
 import signal
 
@@ -9,12 +10,36 @@ from src.blockchain.bitshares_utils import (
     init_bitshares,
     get_last_op_num,
     get_current_block_num,
-    validate_op,
+    validate_ops,
     confirm_op,
-    wait_new_account_ops,
-    asset_transfer,
-    broadcast_tx,
+    poll_account_ops,
+    GATEWAY_OP_TYPES,
+    get_account_id,
+    get_account_balances,
+    get_transfer_fee,
+    chain_cache,
+    restore_chain_cache,
+    load_gateway_asset,
+    sign_transfer,
+    send_tx,
+    init_signer,
+    init_rpc_scheduler,
+    close_signer,
+    get_head_and_irreversible_block_nums,
+    update_block_window,
+    get_head_block,
+    get_block_interval,
+    find_transaction,
+    get_irreversible_block_time,
+    get_max_tx_expiration,
+    locate_transactions,
+    relocate_operation,
+    parse_bitshares_time,
 )
+from src.blockchain.block_window import BlockWindow
+from src.blockchain.op_rules import OpValidator
+from src.blockchain.rpc_scheduler import RpcPriority, with_rpc_priority
+from src.block_scheduler import BlockScheduler
 
 from src.db_utils.queries import (
     init_database,
@@ -22,25 +47,42 @@ from src.db_utils.queries import (
     add_gateway_wallet,
     add_operation,
     get_gateway_wallet,
-    get_unconfirmed_operations,
+    iter_unconfirmed_operations,
     update_last_operation,
     update_operation,
     update_last_parsed_block,
-    get_new_ops_for_booker,
-    get_pending_operations,
+    iter_new_ops_for_booker,
+    iter_pending_operations,
     get_operation_by_hash,
+    get_operation,
+    iter_op_ids,
+    archive_operations,
+    rollback_operations,
+    get_rolled_back_operations,
+    get_broadcast_operations,
+    mark_operation_included,
+    requeue_operation,
 )
 
 from src.db_utils.models import BitsharesOperation, GatewayWallet
 from src.gw_dto import (
-    BitSharesOperation as BitSharesOperationDTO,
     OrderType,
     TxStatus,
     TxError,
 )
+from src.op_record import OpRecord
 from src.bts_ws_rpc_server import BtsWsRPCServer
+from src.profiling import LoopMonitor, SamplingProfiler
+from src.supervisor import Supervisor
+from src.startup import Startup
+from src.expiration_queue import ExpirationQueue
+from src.tx_hash_index import TxHashIndex
+from src.op_filter import OpIdFilter
+from src.balance_ledger import BalanceLedger
+from src.cache_snapshot import CacheSnapshot
+from src.metrics import metrics
 from src.cryptor import get_wallet_keys, save_wallet_keys, encrypt, decrypt
-from src.utils import get_logger, rowproxy_to_dto
+from src.utils import get_logger, units_to_amount, RATE_LIMITED
 
 from src.config import BITSHARES_BLOCK_TIME, BITSHARES_NEED_CONF, Config
 
@@ -54,12 +96,61 @@ from booker.finteh_proto.dto import (
 
 log = get_logger("Gateway")
 
+# Seconds to wait for in-flight batches of work on shutdown
+SHUTDOWN_TIMEOUT = 30
+
 
 class AppContext:
     def __init__(self):
         self.cfg = Config()
         self.cfg.with_environment()
 
+        # All (account, asset) pairs served by this process share node connection, db pool and loops
+        self.tenants = self.cfg.tenants()
+        self.account_ids = {}
+
+        # Validation rules of all tenants by account and asset IDs, compiled when assets are loaded
+        self.validator: OpValidator = None
+
+        # Recent block IDs to detect forks in head confirmation mode
+        self.block_window = BlockWindow()
+        # First block to look for transactions of operations rolled back by fork, None if there are none
+        self.relocate_from = None
+
+        # Broadcast transactions by expiration time
+        self.expiration_queue = ExpirationQueue()
+
+        # Operations of broadcast transactions by tx_hash, so history loop matches them without database
+        self.tx_hash_index = TxHashIndex()
+
+        # IDs of saved operations, so replayed account history is not validated again
+        self.op_filter = OpIdFilter(capacity=self.cfg.op_filter_capacity)
+
+        # Caches saved to local file, restored at start after checks against chain and database
+        self.cache_snapshot = CacheSnapshot(self.cfg.cache_snapshot_path)
+        self.snapshot_header = {}
+        self.snapshot_sections = {}
+
+        # Pending orders which broadcast loop skips, like ones not covered by balance, warned once
+        self.skipped_orders = set()
+
+        # Balances of gateway accounts by account names, transfers are checked against them before broadcast.
+        # Account gets ledger when it is seeded
+        self.ledgers = {}
+
+        # Wakes up polling loops just after new blocks instead of fixed sleeps
+        self.block_scheduler = BlockScheduler(
+            get_head_block,
+            block_interval=BITSHARES_BLOCK_TIME,
+            max_idle_blocks=self.cfg.scheduler_max_idle_blocks,
+        )
+
+        # Owns long-running coroutines: restarts them with backoff and drains them on shutdown
+        self.supervisor = Supervisor()
+
+        self.loop_monitor = LoopMonitor(threshold=self.cfg.slow_callback_threshold)
+        self.profiler = SamplingProfiler()
+
         self.booker_cli = GatewaySideClient(
             ctx=self, host=self.cfg.booker_host, port=self.cfg.booker_port
         )
@@ -67,8 +158,21 @@ class AppContext:
             host=self.cfg.http_host, port=self.cfg.http_port, ctx=self
         )
 
-    def unlock_wallet(self):
-        account_name = self.cfg.account
+    @property
+    def accounts(self) -> list:
+        """Distinct gateway accounts of all tenants"""
+        return list(dict.fromkeys(tenant.account for tenant in self.tenants))
+
+    def get_tenant_by_asset(self, asset: str) -> Config or None:
+        """Find tenant by asset symbol, like FINTEHTEST.USDT. None if asset is not served by gateway"""
+        for tenant in self.tenants:
+            if f"{tenant.gateway_prefix}.{tenant.gateway_distribute_asset}" == asset:
+                return tenant
+        return None
+
+    def unlock_wallet(self, cfg: Config = None):
+        cfg = self.cfg if not cfg else cfg
+        account_name = cfg.account
         active_key = ""
         memo_key = ""
 
@@ -115,7 +219,7 @@ class AppContext:
                 except Exception as ex:
                     log.exception(ex)
 
-        self.cfg.keys = [active_key, memo_key]
+        cfg.keys = [active_key, memo_key]
         del password
 
     async def synchronize(self):
@@ -134,251 +238,551 @@ class AppContext:
         """
 
         async with self.db.acquire() as conn:
-            wallet = GatewayWallet(account_name=self.cfg.account)
-            is_new = await add_gateway_wallet(conn, wallet)
-            if is_new:
-                log.info(
-                    f"Account {self.cfg.account} is new. Let's retrieve data from blockchain and"
-                    f" record it in database!"
-                )
+            for account in self.accounts:
+                wallet = GatewayWallet(account_name=account)
+                is_new = await add_gateway_wallet(conn, wallet)
+                if is_new:
+                    log.info(
+                        f"Account {account} is new. Let's retrieve data from blockchain and"
+                        f" record it in database!"
+                    )
 
-                last_op = await get_last_op_num(self.cfg.account)
-                last_block = await get_current_block_num()
+                    last_op = await get_last_op_num(account)
+                    last_block = await get_current_block_num()
 
-                await update_last_parsed_block(conn, self.cfg.account, last_block)
-                await update_last_operation(conn, self.cfg.account, last_op)
+                    await update_last_parsed_block(conn, account, last_block)
+                    await update_last_operation(conn, account, last_op)
 
-            log.info(f"Retrieve account {self.cfg.account} data from database")
-            gateway_wallet = await get_gateway_wallet(conn, self.cfg.account)
+                log.info(f"Retrieve account {account} data from database")
+                gateway_wallet = await get_gateway_wallet(conn, account)
 
-            if (gateway_wallet.last_operation is None) or (
-                gateway_wallet.last_parsed_block is None
-            ):
-                raise
+                if (gateway_wallet.last_operation is None) or (
+                    gateway_wallet.last_parsed_block is None
+                ):
+                    raise
 
-            log.info(
-                f"Start from operation {gateway_wallet.last_operation}, "
-                f"block number {gateway_wallet.last_parsed_block}"
-            )
+                log.info(
+                    f"Account {account}: start from operation {gateway_wallet.last_operation}, "
+                    f"block number {gateway_wallet.last_parsed_block}"
+                )
             return True
 
     async def watch_account_history(self):
         """
-        BitShares Gateway account monitoring
+        BitShares Gateway accounts monitoring
 
         All new operations will be validate and insert in database. Booker will be notified about it.
+        History of all tenants accounts is polled by this single coroutine.
         """
 
-        log.info(
-            f"Watching {self.bitshares_instance.config['default_account']} for new operations started"
-        )
+        log.info(f"Watching {', '.join(self.accounts)} for new operations started")
+        last_ops = {}
         async with self.db.acquire() as conn:
-            gateway_wallet = await get_gateway_wallet(conn, self.cfg.account)
-
-        last_op = gateway_wallet.last_operation
+            for account in self.accounts:
+                gateway_wallet = await get_gateway_wallet(conn, account)
+                last_ops[account] = gateway_wallet.last_operation
 
         while True:
-            new_ops = await wait_new_account_ops(last_op=last_op)
-            log.info(f"Found new {len(new_ops)} operations")
+            found_new_ops = False
 
-            for op in new_ops:
-                # BitShares have '1.11.1234567890' so need to retrieve integer ID of operation
-                op_id = op["id"].split(".")[2]
-                last_op = op_id
+            for account in self.accounts:
+                new_ops, newest_op = await poll_account_ops(
+                    account, last_op=last_ops[account], op_types=GATEWAY_OP_TYPES
+                )
+                if not new_ops:
+                    await self.skip_history_ops(account, last_ops, newest_op)
+                    continue
 
-                op_dto = await validate_op(op, cfg=self.cfg)
-                async with self.db.acquire() as conn:
-                    async with conn.begin("SERIALIZABLE") as transaction:
-                        if op_dto is not None:
-                            if op_dto.order_type == OrderType.WITHDRAWAL:
-                                # if operation is relevant WITHDRAWAL, add it to database
-                                op_to_insert = BitsharesOperation(**op_dto.__dict__)
-                                await insert_operation(conn, op_to_insert)
-                            else:
-                                op_from_db = await get_operation_by_hash(
-                                    conn, op_dto.tx_hash
-                                )
-                                if op_from_db is None:
-                                    continue
-                                op_from_db_dto = rowproxy_to_dto(
-                                    op_from_db,
-                                    BitsharesOperation,
-                                    BitSharesOperationDTO,
+                found_new_ops = True
+                log.info(
+                    "Account %s: found new %s operations",
+                    account,
+                    len(new_ops),
+                    extra=RATE_LIMITED,
+                )
+
+                ledger = self.ledgers.get(account)
+                if ledger is not None:
+                    for op in new_ops:
+                        ledger.apply_op(op)
+                    if self.skipped_orders:
+                        # Incoming funds may cover orders waiting for them
+                        self.block_scheduler.wake("broadcast_transactions")
+
+                # Whole page is validated at once, saved operations are only skipped
+                saved = [
+                    await self.is_op_saved(int(op["id"].split(".")[2]))
+                    for op in new_ops
+                ]
+                records = iter(
+                    await validate_ops(
+                        [op for op, is_saved in zip(new_ops, saved) if not is_saved],
+                        self.validator,
+                    )
+                )
+
+                for op, is_saved in zip(new_ops, saved):
+                    async with self.supervisor.batch():
+                        # BitShares have '1.11.1234567890' so need to retrieve integer ID of operation
+                        last_ops[account] = op["id"].split(".")[2]
+                        if is_saved:
+                            log.info(
+                                "Op %s is already processed, skip it",
+                                op["id"],
+                                extra=RATE_LIMITED,
+                            )
+                            async with self.db.acquire() as conn:
+                                await update_last_operation(
+                                    conn,
+                                    account_name=account,
+                                    last_operation=last_ops[account],
                                 )
+                            continue
+                        await self.process_history_op(account, op, next(records))
 
-                                assert not op_from_db_dto.op_id
-                                assert op_from_db_dto.block_num == op_dto.block_num
+                await self.skip_history_ops(account, last_ops, newest_op)
 
-                                op_from_db_dto.op_id = op_dto.op_id
-                                op_from_db_dto.status = TxStatus.RECEIVED_NOT_CONFIRMED
-                                op_from_db_dto.error = op_dto.error
-                                op_from_db_dto.memo = op_dto.memo
-                                op_from_db_dto.confirmations = 0
-                                op_from_db_dto.tx_created_at = op_dto.tx_created_at
+            await self.block_scheduler.wait("watch_account_history", busy=found_new_ops)
 
-                                op_to_update = BitsharesOperation(
-                                    pk=op_from_db["pk"], **op_from_db_dto.__dict__
-                                )
+    async def skip_history_ops(self, account: str, last_ops: dict, newest_op: int):
+        """Move history cursor past operations of other types, so they are not fetched again"""
+        if newest_op <= int(last_ops[account]):
+            return
+        last_ops[account] = newest_op
+        async with self.db.acquire() as conn:
+            await update_last_operation(
+                conn, account_name=account, last_operation=newest_op
+            )
 
-                                await update_operation(
-                                    conn,
-                                    op_to_update,
-                                    BitsharesOperation.order_id,
-                                    op_to_update.order_id,
-                                )
+    async def process_history_op(
+        self, account: str, op: dict, op_dto: OpRecord or None
+    ):
+        """Save validated operation of gateway's account history, op_dto is None for foreign operation"""
+        op_id = op["id"].split(".")[2]
+        async with self.db.acquire() as conn:
+            async with conn.begin("SERIALIZABLE") as transaction:
+                if op_dto is not None:
+                    if op_dto.order_type == OrderType.WITHDRAWAL:
+                        # if operation is relevant WITHDRAWAL, add it to database
+                        await insert_operation(conn, op_dto)
+                    else:
+                        op_from_db = self.tx_hash_index.pop(op_dto.tx_hash)
+                        if op_from_db is None:
+                            row = await get_operation_by_hash(conn, op_dto.tx_hash)
+                            if row is None:
+                                return
+                            op_from_db = OpRecord.from_row(row)
+
+                        # Transaction is found, so it is not checked on expiration
+                        self.expiration_queue.discard(op_from_db.order_id)
+                        ledger = self.ledgers.get(op_from_db.from_account)
+                        if ledger is not None:
+                            ledger.release(op_from_db.order_id)
+
+                        if op_from_db.op_id:
+                            # Operation rolled back by fork is applied again, its block is found by
+                            # relocation of rolled back transactions
+                            op_to_update = op_from_db.replace(op_id=op_dto.op_id)
+                        else:
+                            # Transaction is broadcast without waiting for block, so block is learned here
+                            assert op_from_db.block_num in (None, op_dto.block_num)
+                            op_to_update = op_from_db.replace(
+                                op_id=op_dto.op_id,
+                                block_num=op_dto.block_num,
+                                status=TxStatus.RECEIVED_NOT_CONFIRMED,
+                                error=op_dto.error,
+                                memo=op_dto.memo,
+                                confirmations=0,
+                                tx_created_at=op_dto.tx_created_at,
+                            )
 
-                        # Just refresh last account operations in database
-                        await update_last_operation(
+                        await update_operation(
                             conn,
-                            account_name=self.bitshares_instance.config[
-                                "default_account"
-                            ],
-                            last_operation=op_id,
+                            op_to_update,
+                            BitsharesOperation.order_id,
+                            op_to_update.order_id,
                         )
 
+                # Just refresh last account operations in database
+                await update_last_operation(
+                    conn, account_name=account, last_operation=op_id
+                )
+
+        if op_dto is not None:
+            self.op_filter.add(op_dto.op_id)
+            # New operation is for booker and confirmations now, not after idle backoff
+            self.block_scheduler.wake("notify_booker")
+            self.block_scheduler.wake("watch_unconfirmed_operations")
+
+    async def is_op_saved(self, op_id: int) -> bool:
+        """Check filter first, database is read only to rule out false positive"""
+        if op_id not in self.op_filter:
+            return False
+        async with self.db.acquire() as conn:
+            if await get_operation(conn, op_id) is not None:
+                metrics.inc("op_filter_skipped_total")
+                return True
+        metrics.inc("op_filter_false_positives_total")
+        return False
+
     async def notify_booker(self):
         while True:
             async with self.db.acquire() as conn:
                 # TODO implement serialization
-                new_ops = await get_new_ops_for_booker(conn)
-
-                if len(new_ops) == 0:
-                    continue
-
-                for op in new_ops:
-                    op_dict = dict(op)
-                    op_dict.pop("pk")
-                    op_dto = BitSharesOperationDTO(**op_dict)
-
-                    new_tx = TransactionDTO(
-                        coin=op_dto.asset,
-                        amount=op_dto.amount,
-                        from_address=op_dto.from_account,
-                        to_address=op_dto.to_account,
-                        created_at=op_dto.tx_created_at,
-                        confirmations=op_dto.confirmations,
-                        max_confirmations=BITSHARES_NEED_CONF,
-                        tx_id=f"{op_dto.op_id}:{op_dto.tx_hash}",
-                    )
+                new_ops = iter_new_ops_for_booker(conn, self.cfg.query_chunk_size)
+
+                busy = False
+                async for op_dto in new_ops:
+                    busy = True
+                    async with self.supervisor.batch():
+                        tenant = self.get_tenant_by_asset(op_dto.asset)
+                        if tenant is None:
+                            log.warning(
+                                "Operation %s has asset %s not served by gateway",
+                                op_dto.op_id,
+                                op_dto.asset,
+                            )
+                            continue
+                        new_tx = TransactionDTO(
+                            coin=op_dto.asset,
+                            amount=units_to_amount(
+                                op_dto.amount, tenant.asset_precision
+                            ),
+                            from_address=op_dto.from_account,
+                            to_address=op_dto.to_account,
+                            created_at=op_dto.tx_created_at,
+                            confirmations=op_dto.confirmations,
+                            max_confirmations=BITSHARES_NEED_CONF,
+                            tx_id=f"{op_dto.op_id}:{op_dto.tx_hash}",
+                        )
 
-                    order_dto_to_create = OrderDTO(
-                        in_tx=new_tx,
-                        out_tx=TransactionDTO(to_address=op_dto.memo.split(":")[1]),
-                    )
+                        order_dto_to_create = OrderDTO(
+                            in_tx=new_tx,
+                            out_tx=TransactionDTO(to_address=op_dto.memo.split(":")[1]),
+                        )
 
-                    order_dto = await self.booker_cli.create_order_request(
-                        order_dto_to_create
-                    )
+                        order_dto = await self.booker_cli.create_order_request(
+                            order_dto_to_create
+                        )
 
-                    try:
-                        if hasattr(order_dto, "order_id"):
-                            op_dto.order_id = order_dto.order_id
-                            op_model = BitsharesOperation(**op_dto.__dict__)
-                            await update_operation(
-                                conn, op_model, BitsharesOperation.op_id, op_dto.op_id
-                            )
-                        elif hasattr(order_dto, "message"):
+                        try:
+                            if hasattr(order_dto, "order_id"):
+                                op_dto = op_dto.replace(order_id=order_dto.order_id)
+                                await update_operation(
+                                    conn,
+                                    op_dto,
+                                    BitsharesOperation.op_id,
+                                    op_dto.op_id,
+                                )
+                            elif hasattr(order_dto, "message"):
+                                log.warning(
+                                    "Unable to create order on booker side now: %s",
+                                    order_dto.message,
+                                    extra=RATE_LIMITED,
+                                )
+                        except Exception as ex:
                             log.warning(
-                                f"Unable to create order on booker side now: {order_dto.message}"
+                                "Unable to create order on booker side now: %s",
+                                ex,
+                                extra=RATE_LIMITED,
                             )
-                    except Exception as ex:
-                        log.warning(f"Unable to create order on booker side now: {ex}")
 
-                await asyncio.sleep(5)
+            await self.block_scheduler.wait("notify_booker", busy=busy)
 
     async def watch_unconfirmed_operations(self):
         """Grep unconfirmed transactions from base and try to confirm it"""
-        log.info(f"Watching unconfirmed operations")
+        log.info(
+            f"Watching unconfirmed operations in {self.cfg.confirmation_mode} confirmation mode"
+        )
         while True:
             async with self.db.acquire() as conn:
 
-                unconfirmed_ops = await get_unconfirmed_operations(conn)
-                for op in unconfirmed_ops:
+                if self.cfg.confirmation_mode == "head":
+                    fork_at = await update_block_window(self.block_window)
+                    if fork_at is not None:
+                        await self.rollback_fork(conn, fork_at)
+                    await self.relocate_operations(conn)
 
-                    op_dto = rowproxy_to_dto(
-                        op, BitsharesOperation, BitSharesOperationDTO
-                    )
-                    is_changed = await confirm_op(op_dto)
-                    if is_changed:
-                        updated_op = BitsharesOperation(**op_dto.__dict__)
-                        await update_operation(
-                            conn, updated_op, BitsharesOperation.op_id, updated_op.op_id
-                        )
+                unconfirmed_ops = iter_unconfirmed_operations(
+                    conn, self.cfg.query_chunk_size
+                )
+                busy = False
+                async for op in unconfirmed_ops:
+                    if op.block_num is None:
+                        # Rolled back by fork, confirmed again when its transaction is relocated
+                        continue
+                    busy = True
+                    async with self.supervisor.batch():
+                        op_dto = await confirm_op(op, mode=self.cfg.confirmation_mode)
+                        if op_dto is not None:
+                            await update_operation(
+                                conn, op_dto, BitsharesOperation.op_id, op_dto.op_id,
+                            )
+                            await self.update_booker_order(op_dto)
+
+            await self.block_scheduler.wait("watch_unconfirmed_operations", busy=busy)
+
+    async def update_booker_order(self, op_dto: OpRecord):
+        """Send current state of operation's transaction to booker"""
+        if op_dto.order_id is None:
+            # Booker does not know about operation yet, it gets current state with new order
+            return
+        tenant = self.get_tenant_by_asset(op_dto.asset)
+        if tenant is None:
+            log.warning(
+                "Operation %s has asset %s not served by gateway",
+                op_dto.op_id,
+                op_dto.asset,
+            )
+            return
+
+        updated_tx = TransactionDTO(
+            coin=op_dto.asset,
+            amount=units_to_amount(op_dto.amount, tenant.asset_precision),
+            tx_id=f"{op_dto.op_id}:{op_dto.tx_hash}",
+            from_address=op_dto.from_account,
+            to_address=op_dto.to_account,
+            created_at=op_dto.tx_created_at,
+            confirmations=op_dto.confirmations,
+            max_confirmations=BITSHARES_NEED_CONF,
+        )
 
-                        updated_tx = TransactionDTO(
-                            coin=op_dto.asset,
-                            amount=op_dto.amount,
-                            tx_id=f"{op_dto.op_id}:{op_dto.tx_hash}",
-                            from_address=op_dto.from_account,
-                            to_address=op_dto.to_account,
-                            created_at=op_dto.tx_created_at,
-                            confirmations=op_dto.confirmations,
-                            max_confirmations=BITSHARES_NEED_CONF,
-                        )
+        if op_dto.order_type == OrderType.DEPOSIT:
+            order_dto_to_update = OrderDTO(order_id=op_dto.order_id, out_tx=updated_tx)
+        elif op_dto.order_type == OrderType.WITHDRAWAL:
+            order_dto_to_update = OrderDTO(order_id=op_dto.order_id, in_tx=updated_tx)
+        else:
+            raise
 
-                        if op_dto.order_type == OrderType.DEPOSIT:
-                            order_dto_to_update = OrderDTO(
-                                order_id=op_dto.order_id, out_tx=updated_tx
-                            )
-                        elif op_dto.order_type == OrderType.WITHDRAWAL:
-                            order_dto_to_update = OrderDTO(
-                                order_id=op_dto.order_id, in_tx=updated_tx
-                            )
-                        else:
-                            raise
+        remote_update = await self.booker_cli.update_order_request(order_dto_to_update)
 
-                        remote_update = await self.booker_cli.update_order_request(
-                            order_dto_to_update
-                        )
+        if hasattr(remote_update, "is_updated"):
+            log.info(
+                "Update order %s on booker side: %s "
+                "(confirmations: %s, irreversible: %s)",
+                order_dto_to_update.order_id,
+                remote_update.is_updated,
+                op_dto.confirmations,
+                op_dto.irreversible_confirmations,
+            )
 
-                        if hasattr(remote_update, "is_updated"):
-                            log.info(
-                                f"Update order {order_dto_to_update.order_id} "
-                                f"on booker side: {remote_update.is_updated}"
-                            )
+    async def rollback_fork(self, conn, fork_at: int):
+        """Forget blocks of operations from orphaned blocks and tell booker they lost confirmations"""
+        rolled_back = await rollback_operations(conn, fork_at)
+        log.warning(
+            f"Rolled back {len(rolled_back)} operations from orphaned blocks since {fork_at}"
+        )
+        for op in rolled_back:
+            async with self.supervisor.batch():
+                await self.update_booker_order(op)
 
-            await asyncio.sleep(BITSHARES_BLOCK_TIME)
+        # Transactions may be included again since fork block
+        if self.relocate_from is None or fork_at < self.relocate_from:
+            self.relocate_from = fork_at
+
+        # Balances of orphaned blocks are not on chain anymore
+        for account in list(self.ledgers):
+            await self.seed_ledger(account)
+
+    async def relocate_operations(self, conn):
+        """
+        Look for transactions of rolled back operations in blocks of current chain. Found operations are
+        confirmed from their new blocks, the ones which can not be included anymore are requeued or failed
+        """
+        ops = await get_rolled_back_operations(conn)
+        if not ops:
+            self.relocate_from = None
+            return
+
+        head_num, _ = await get_head_and_irreversible_block_nums()
+        if self.relocate_from is None:
+            # Fork happened before restart, transactions may be in any block of window
+            self.relocate_from = max(head_num - self.block_window.size, 1)
+        found = await locate_transactions(
+            [op.tx_hash for op in ops], self.relocate_from, head_num
+        )
+        self.relocate_from = head_num + 1
+
+        irreversible_time = await get_irreversible_block_time()
+        max_expiration = await get_max_tx_expiration()
+        for op in ops:
+            relocated = relocate_operation(
+                op, found.get(op.tx_hash), irreversible_time, max_expiration
+            )
+            if relocated is None:
+                continue
+
+            async with self.supervisor.batch():
+                await update_operation(conn, relocated, BitsharesOperation.pk, op.pk)
+                if relocated.block_num is not None:
+                    log.info(
+                        f"Transaction {op.tx_hash} of rolled back operation {op.op_id} "
+                        f"is included again in block {relocated.block_num}"
+                    )
+                    continue
+
+                if relocated.status == TxStatus.WAIT:
+                    log.warning(
+                        f"Transaction {op.tx_hash} of order {op.order_id} is lost by fork "
+                        f"and will be broadcast again"
+                    )
+                    self.block_scheduler.wake("broadcast_transactions")
+                else:
+                    log.warning(
+                        f"Transaction {op.tx_hash} of operation {op.op_id} is lost by fork"
+                    )
+                await self.update_booker_order(relocated)
 
     async def broadcast_transactions(self):
         """Grep all WAIT-status transaction from database and broatcast it all. If ok, update order on booker"""
         while True:
             async with self.db.acquire() as conn:
-                pending_ops = await get_pending_operations(conn)
-
-                for op in pending_ops:
+                pending_ops = iter_pending_operations(conn, self.cfg.query_chunk_size)
+
+                busy = False
+                async for op_dto in pending_ops:
+                    async with self.supervisor.batch():
+                        # Skipped rows are not work done: loop backs off and warns once per order
+                        tenant = self.get_tenant_by_asset(op_dto.asset)
+                        if tenant is None:
+                            # Never sent with asset of another tenant
+                            if op_dto.order_id not in self.skipped_orders:
+                                self.skipped_orders.add(op_dto.order_id)
+                                log.warning(
+                                    "Order %s has asset %s not served by gateway, it is not broadcast",
+                                    op_dto.order_id,
+                                    op_dto.asset,
+                                )
+                            continue
+                        ledger = self.ledgers.get(op_dto.from_account)
+                        if ledger is not None and not ledger.reserve(
+                            op_dto.order_id, tenant.asset_id, op_dto.amount
+                        ):
+                            # Row stays pending, smaller transfers after it may still fit
+                            if op_dto.order_id not in self.skipped_orders:
+                                self.skipped_orders.add(op_dto.order_id)
+                                log.warning(
+                                    "Account %s can not cover %s units of %s with fee for order %s, "
+                                    "available %s. It is broadcast when funds arrive",
+                                    op_dto.from_account,
+                                    op_dto.amount,
+                                    op_dto.asset,
+                                    op_dto.order_id,
+                                    ledger.available(tenant.asset_id),
+                                )
+                            continue
+                        busy = True
+                        self.skipped_orders.discard(op_dto.order_id)
 
-                    op_dto = rowproxy_to_dto(
-                        op, BitsharesOperation, BitSharesOperationDTO
-                    )
+                        tx_id, signed_tx = await sign_transfer(
+                            account=op_dto.from_account,
+                            to=op_dto.to_account,
+                            amount=op_dto.amount,
+                            asset_id=tenant.asset_id,
+                        )
+                        expiration = parse_bitshares_time(signed_tx["expiration"])
 
-                    _transfer_body = await asset_transfer(
-                        account=op_dto.from_account,
-                        to=op_dto.to_account,
-                        amount=op_dto.amount,
-                        asset=op_dto.asset,
-                    )
+                        # Transaction is saved before it is sent: if gateway stops in between, it is
+                        # still found in blocks or requeued by expiration watcher, never sent twice
+                        op_dto = op_dto.replace(tx_hash=tx_id, tx_expiration=expiration)
+                        await update_operation(
+                            conn, op_dto, BitsharesOperation.order_id, op_dto.order_id,
+                        )
+                        self.tx_hash_index.add(op_dto)
+                        self.expiration_queue.push(
+                            op_dto.order_id, expiration, (tx_id, expiration)
+                        )
 
-                    transfer = await broadcast_tx(_transfer_body)
+                        # Inclusion is not awaited: history loop matches transaction by its ID
+                        try:
+                            await send_tx(signed_tx)
+                        except Exception as ex:
+                            log.warning(
+                                "Broadcast %s transaction of order %s failed, "
+                                "it will be sent again after expiration: %s",
+                                tx_id,
+                                op_dto.order_id,
+                                ex,
+                            )
+                            if ledger is not None:
+                                # Balances are read again, reservation must not count twice
+                                ledger.release(op_dto.order_id)
+                                await self.seed_ledger(ledger.account)
+                            continue
 
-                    if transfer:
                         log.info(
-                            f"Broadcast {transfer['id']} transaction as part of order {op_dto.order_id} successful"
+                            "Broadcast %s transaction as part of order %s",
+                            tx_id,
+                            op_dto.order_id,
                         )
 
-                        op_dto.tx_hash = transfer["id"]
-                        op_dto.block_num = transfer["block_num"]
-                        op_dto.tx_expiration = transfer["expiration"]
+            await self.block_scheduler.wait("broadcast_transactions", busy=busy)
 
-                        updated_op = BitsharesOperation(pk=op.pk, **op_dto.__dict__)
+    async def watch_expired_transactions(self):
+        """
+        Wake up exactly when broadcast transaction expires and check that it is included in blockchain.
+        If it is not, forget it, so broadcast_transactions will send operation again with new reference block.
 
-                        await update_operation(
-                            conn,
-                            updated_op,
-                            BitsharesOperation.order_id,
-                            updated_op.order_id,
+        Transaction is checked only when last irreversible block is newer than expiration:
+        after that moment transaction can not appear in blockchain anymore and it is safe to send it again.
+        """
+        async with self.db.acquire() as conn:
+            for op in await get_broadcast_operations(conn):
+                self.expiration_queue.push(
+                    op.order_id, op.tx_expiration, (op.tx_hash, op.tx_expiration)
+                )
+        log.info(
+            f"Watching expiration of {len(self.expiration_queue)} broadcast transactions"
+        )
+
+        while True:
+            due = await self.expiration_queue.wait_due()
+            irreversible_time = await get_irreversible_block_time()
+
+            for order_id, (tx_hash, expiration) in due:
+                async with self.supervisor.batch():
+                    if irreversible_time <= expiration:
+                        # Wake up again when expiration is expected to become irreversible
+                        self.expiration_queue.push(
+                            order_id,
+                            datetime.utcnow()
+                            + (expiration - irreversible_time)
+                            + timedelta(seconds=BITSHARES_BLOCK_TIME),
+                            (tx_hash, expiration),
                         )
+                        continue
 
-            await asyncio.sleep(1)
+                    block_num = await find_transaction(tx_hash, expiration)
+                    async with self.db.acquire() as conn:
+                        if block_num is not None:
+                            log.info(
+                                f"Transaction {tx_hash} of order {order_id} is included in block {block_num}"
+                            )
+                            await mark_operation_included(conn, order_id, block_num)
+                            self.tx_hash_index.update(tx_hash, block_num=block_num)
+                        elif await requeue_operation(conn, order_id):
+                            self.tx_hash_index.discard(tx_hash)
+                            log.warning(
+                                f"Transaction {tx_hash} of order {order_id} expired and will be broadcast again"
+                            )
+
+    async def archive_finalized_operations(self):
+        """Move finalized operations to archive table, so polling loops always work with small hot table"""
+        log.info(f"Archiving finalized operations")
+        while True:
+            # Confirmed operations from reversible blocks may still be rolled back by fork
+            _, irreversible_block_num = await get_head_and_irreversible_block_nums()
+            async with self.db.acquire() as conn:
+                moved = await archive_operations(
+                    conn, self.cfg.archive_batch_size, irreversible_block_num
+                )
+
+            if moved:
+                log.info(f"Moved {moved} finalized operations to archive")
+
+            # Full batch means there are more finalized operations, so do not wait
+            if moved < self.cfg.archive_batch_size:
+                await asyncio.sleep(self.cfg.archive_interval)
 
     async def watch_blocks(self):
         log.info(f"Parsing blocks...")
@@ -387,36 +791,28 @@ class AppContext:
             # await parse_blocks(start_block_num=gateway_wallet.last_parsed_block)
 
     def ex_handler(self, loop, ex_context):
+        """Long-running coroutines are restarted by supervisor, here are only unexpected errors of other tasks"""
         ex = ex_context.get("exception")
-        coro_name = ex_context["future"].get_coro().__name__
+        future = ex_context.get("future")
+        coro_name = future.get_coro().__name__ if future else None
 
         log.exception(f"{ex.__class__.__name__} in {coro_name}: {ex_context}")
 
-        coro_to_restart = None
-
-        if coro_name == self.watch_blocks.__name__:
-            coro_to_restart = self.watch_blocks
-
-        if coro_name == self.watch_account_history.__name__:
-            coro_to_restart = self.watch_account_history
-
-        if coro_name == self.watch_unconfirmed_operations.__name__:
-            coro_to_restart = self.watch_unconfirmed_operations
-
-        if coro_name == self.notify_booker.__name__:
-            coro_to_restart = self.notify_booker
-
-        if coro_to_restart:
-            log.info(f"Trying to restart {coro_to_restart.__name__} coroutine")
-            loop.create_task(coro_to_restart())
-
-    @staticmethod
-    async def shutdown(loop, _signal=None):
+    async def shutdown(self, loop, _signal=None):
         if _signal:
             log.info(f"Received exit signal {_signal.name}...")
         else:
             log.info("No exit signal")
 
+        # In-flight batches, like broadcast and saving of transaction, are finished before cancelling
+        await self.supervisor.stop(timeout=SHUTDOWN_TIMEOUT)
+
+        # Loops are stopped, so snapshot is consistent with database
+        try:
+            await self.save_caches()
+        except Exception as ex:
+            log.warning(f"Unable to save caches: {ex}")
+
         tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
 
         [task.cancel() for task in tasks]
@@ -426,66 +822,268 @@ class AppContext:
         log.info(f"Make some post-shutdown things")
         loop.stop()
 
-    def run(self):
-        loop = asyncio.get_event_loop()
-        signals = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
-        for s in signals:
-            loop.add_signal_handler(
-                s, lambda s=s: asyncio.create_task(self.shutdown(loop, _signal=s))
+    async def connect_database(self):
+        self.db = await init_database(self.cfg)
+
+    async def connect_bitshares(self):
+        # One shared instance holds keys of all tenants' accounts
+        keys = []
+        for tenant in self.tenants:
+            tenant_keys = (
+                tenant.keys.values() if isinstance(tenant.keys, dict) else tenant.keys
             )
-        loop.set_exception_handler(self.ex_handler)
+            keys.extend(key for key in tenant_keys if key not in keys)
+
+        init_rpc_scheduler(
+            rate=self.cfg.node_rate_limit,
+            burst=self.cfg.node_burst,
+            max_in_flight=self.cfg.node_max_in_flight,
+        )
+        self.bitshares_instance = await init_bitshares(
+            account=self.cfg.account, keys=keys, node=self.cfg.nodes
+        )
+        assert self.bitshares_instance.config["default_account"] == self.cfg.account
+        init_signer(keys, self.cfg.signing_workers)
+        self.block_scheduler.block_interval = await get_block_interval()
 
-        if not self.cfg.keys:
-            self.unlock_wallet()
+        for tenant in self.tenants:
+            account_id = await get_account_id(tenant.account)
+            await load_gateway_asset(tenant)
+            self.account_ids[tenant.account] = account_id
 
-        self.db = loop.run_until_complete(init_database(self.cfg))
-        self.bitshares_instance = loop.run_until_complete(
-            init_bitshares(
-                account=self.cfg.account, keys=self.cfg.keys, node=self.cfg.nodes
+        self.validator = OpValidator.compile(self.tenants, self.account_ids)
+
+    async def load_op_filter(self):
+        after = await self.restore_op_filter()
+        async with self.db.acquire() as conn:
+            async for op_id in iter_op_ids(conn, after=after):
+                self.op_filter.add(op_id)
+        log.info("Loaded %s saved operation IDs to filter", len(self.op_filter))
+
+    async def restore_op_filter(self) -> int:
+        """
+        Load filter from snapshot. Operations saved after snapshot have IDs after history cursors of
+        their accounts at that moment, so only they are read from database.
+
+        :return: ID after which operations must be read from database, -1 to read all of them
+        """
+        section = self.snapshot_sections.get("op_filter")
+        cursors = self.snapshot_header.get("cursors", {})
+        if not section or any(
+            cursors.get(account) is None for account in self.accounts
+        ):
+            return -1
+        if not self.op_filter.restore(section):
+            log.info("Operation IDs filter in snapshot has other capacity, rebuild it")
+            return -1
+
+        # Operation of cursor itself may be saved just after snapshot
+        after = min(cursors[account] for account in self.accounts) - 1
+        log.info("Restored operation IDs filter, reading IDs after %s", after)
+        return after
+
+    async def restore_caches(self):
+        """Load cache snapshot of the same chain and restore caches which are still valid"""
+        chain_id = self.bitshares_instance.rpc.chain_params["chain_id"]
+        self.snapshot_header, self.snapshot_sections = self.cache_snapshot.load(
+            chain_id
+        )
+        if not self.snapshot_header:
+            return
+
+        # Account names, asset IDs and symbols never change
+        restore_chain_cache(self.snapshot_sections.get("chain", {}))
+
+        # Window older than its size is pruned anyway, otherwise forks since snapshot are found by it
+        head_num = await get_current_block_num()
+        saved_head_num = self.snapshot_header.get("head_block_num") or 0
+        if head_num - saved_head_num < self.block_window.size:
+            self.block_window.blocks.update(
+                dict(self.snapshot_sections.get("block_window", []))
             )
+        log.info(
+            "Restored caches from snapshot of block %s, %s blocks ago",
+            saved_head_num,
+            head_num - saved_head_num,
         )
 
-        assert self.bitshares_instance.config["default_account"] == self.cfg.account
+    async def save_caches(self):
+        if not self.cache_snapshot.path:
+            return
+        # Cursors are read before filter is dumped, so filter holds all operations up to them
+        cursors = {}
+        async with self.db.acquire() as conn:
+            for account in self.accounts:
+                cursors[account] = (
+                    await get_gateway_wallet(conn, account)
+                ).last_operation
+
+        size = self.cache_snapshot.save(
+            {
+                "chain_id": self.bitshares_instance.rpc.chain_params["chain_id"],
+                "head_block_num": self.block_scheduler.head_num
+                or self.block_window.head_num,
+                "cursors": cursors,
+            },
+            {
+                "op_filter": self.op_filter.state(),
+                "chain": chain_cache(),
+                "block_window": list(self.block_window.blocks.items()),
+            },
+        )
+        log.info("Saved %s bytes of caches to %s", size, self.cache_snapshot.path)
 
-        loop.run_until_complete(self.synchronize())
+    async def snapshot_caches(self):
+        """Save caches periodically, so even after crash restart begins with recent snapshot"""
+        while True:
+            await asyncio.sleep(self.cfg.cache_snapshot_interval)
+            async with self.supervisor.batch():
+                await self.save_caches()
+
+    async def seed_ledger(self, account: str):
+        """Read balances and transfer fee of account from node and start following its history from here"""
+        ledger = self.ledgers.get(account) or BalanceLedger(
+            account, self.account_ids[account]
+        )
+        last_op = await get_last_op_num(account)
+        ledger.seed(
+            await get_account_balances(ledger.account_id),
+            await get_transfer_fee(),
+            last_op,
+        )
+        self.ledgers[account] = ledger
 
-        try:
-            loop.run_until_complete(
-                self.booker_cli.connect(
-                    self.cfg.booker_host, self.cfg.booker_port, "/ws-rpc"
-                )
-            )
-            log.info(
-                f"BookerClient ready to connect  ws://{self.cfg.booker_host}:{self.cfg.booker_port}/"
-            )
-            loop.run_until_complete(self.booker_cli.disconnect())
-        except Exception as ex:
-            log.warning(f"Unable to connect booker: {ex}")
+    async def seed_ledgers(self):
+        for account in self.accounts:
+            await self.seed_ledger(account)
+
+        # Transactions broadcast before restart may still be included
+        async with self.db.acquire() as conn:
+            for op in await get_broadcast_operations(conn):
+                ledger = self.ledgers.get(op.from_account)
+                tenant = self.get_tenant_by_asset(op.asset)
+                if ledger is not None and tenant is not None:
+                    ledger.reserve(op.order_id, tenant.asset_id, op.amount)
+        log.info("Seeded balance ledgers of %s", ", ".join(self.ledgers))
+
+    async def load_tx_hash_index(self):
+        async with self.db.acquire() as conn:
+            self.tx_hash_index.rebuild(await get_broadcast_operations(conn))
+        log.info("Indexed %s broadcast transactions", len(self.tx_hash_index))
+
+    async def check_booker(self):
+        await self.booker_cli.connect(
+            self.cfg.booker_host, self.cfg.booker_port, "/ws-rpc"
+        )
+        log.info(
+            f"BookerClient ready to connect  ws://{self.cfg.booker_host}:{self.cfg.booker_port}/"
+        )
+        await self.booker_cli.disconnect()
+
+    async def start_ws_server(self):
+        await self.ws_server.start()
+        log.info(
+            f"Started websockets rpc server on ws://{self.cfg.http_host}:{self.cfg.http_port}/ws-rpc"
+        )
+
+    async def startup(self):
+        """Connect database, BitShares node and booker concurrently, then synchronize account"""
+        startup = Startup()
+        startup.add("database", self.connect_database)
+        startup.add("bitshares", self.connect_bitshares)
+        startup.add("synchronize", self.synchronize, requires=("database", "bitshares"))
+        startup.add(
+            "tx_hash_index",
+            self.load_tx_hash_index,
+            requires=("database",),
+            critical=False,
+        )
+        startup.add(
+            "caches", self.restore_caches, requires=("bitshares",), critical=False
+        )
+        startup.add(
+            "op_filter",
+            self.load_op_filter,
+            requires=("database", "caches"),
+            critical=False,
+        )
+        startup.add(
+            "ledgers",
+            self.seed_ledgers,
+            requires=("database", "bitshares"),
+            critical=False,
+        )
+        startup.add("booker", self.check_booker, critical=False)
+        startup.add(
+            "ws_server",
+            self.start_ws_server,
+            # Orders need tenants' asset IDs and precisions, loaded with node connection
+            requires=("database", "bitshares"),
+            critical=False,
+        )
 
         try:
-            loop.run_until_complete(self.ws_server.start())
-            log.info(
-                f"Started websockets rpc server on ws://{self.cfg.http_host}:{self.cfg.http_port}/ws-rpc"
+            await startup.run()
+        finally:
+            log.info(f"Startup phases: {startup.report()}")
+
+    def run(self):
+        loop = asyncio.get_event_loop()
+        signals = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+        for s in signals:
+            loop.add_signal_handler(
+                s, lambda s=s: asyncio.create_task(self.shutdown(loop, _signal=s))
             )
-        except Exception as ex:
-            log.warning(f"Unable to start websocker rpc server: {ex}")
+        loop.set_exception_handler(self.ex_handler)
 
+        for tenant in self.tenants:
+            if not tenant.keys:
+                same_account = [
+                    t for t in self.tenants if t.account == tenant.account and t.keys
+                ]
+                if same_account:
+                    tenant.keys = same_account[0].keys
+                else:
+                    self.unlock_wallet(tenant)
+
+        self.loop_monitor.start(loop)
+        loop.create_task(self.loop_monitor.sample_lag())
+
+        loop.run_until_complete(self.startup())
+
+        # Node calls of every loop are scheduled with its priority
+        for coro, priority in (
+            (self.watch_account_history, RpcPriority.LIVE),
+            (self.watch_unconfirmed_operations, RpcPriority.CONFIRMATION),
+            (self.notify_booker, RpcPriority.LIVE),
+            (self.broadcast_transactions, RpcPriority.BROADCAST),
+            (self.archive_finalized_operations, RpcPriority.BACKFILL),
+            (self.watch_expired_transactions, RpcPriority.CONFIRMATION),
+            (self.snapshot_caches, RpcPriority.BACKFILL),
+        ):
+            self.supervisor.add(coro.__name__, with_rpc_priority(priority, coro))
+        self.supervisor.add(
+            "block_scheduler",
+            with_rpc_priority(RpcPriority.CONFIRMATION, self.block_scheduler.run),
+        )
+
+        assets = ", ".join(
+            f"{t.gateway_prefix} {t.gateway_distribute_asset}" for t in self.tenants
+        )
         log.info(
             f"\n"
-            f"     Run {self.cfg.gateway_prefix} {self.cfg.gateway_distribute_asset} BitShares gateway\n"
-            f"     Distribution account: {self.bitshares_instance.config['default_account']}\n"
+            f"     Run {assets} BitShares gateway\n"
+            f"     Distribution accounts: {', '.join(self.accounts)}\n"
             f"     Connected to BitShares API node: {self.bitshares_instance.rpc.url}\n"
             f"     Connected to database: {not self.db.closed}\n"
         )
 
         try:
-            loop.create_task(self.watch_account_history())
-            loop.create_task(self.watch_unconfirmed_operations())
-            loop.create_task(self.watch_blocks())
-            loop.create_task(self.notify_booker())
-            loop.create_task(self.broadcast_transactions())
-
+            self.supervisor.start()
             loop.run_forever()
         finally:
+            self.profiler.stop()
+            self.loop_monitor.stop()
+            close_signer()
             loop.close()
             log.info("Successfully shutdown the app")
@@ -0,0 +1,126 @@
+"""In-memory balances of gateway account, so transfers are checked against them before broadcast"""
+from src.metrics import metrics
+
+# Fees are paid in core asset
+CORE_ASSET_ID = "1.3.0"
+
+
+class BalanceLedger:
+    """
+    Balances of one gateway account in integer base units, with funds reserved for claimed transfers.
+
+    Ledger is seeded from node once, with account balances and transfer fee, and then follows
+    account history: every transfer op newer than the last counted one changes balances by its
+    amount and fee. History page fetched again after restart of history loop is not counted twice.
+    Funds of transfer which gateway is going to broadcast are reserved by order ID until its op is
+    seen in history, so available balance already excludes everything in flight.
+
+    History loop observes transfers only, so balance can drift on other operations. Ledger is
+    reseeded when node rejects transfer anyway.
+
+    :param account: account name, label of metrics
+    :param account_id: account object ID, like 1.2.123
+    """
+
+    def __init__(self, account: str, account_id: str):
+        self.account = account
+        self.account_id = account_id
+        self.balances = {}
+        self.transfer_fee = 0
+        # Integer ID of the newest history op counted in balances
+        self.last_op = None
+        self._reservations = {}
+        self._reserved = {}
+
+    def seed(self, balances: dict, transfer_fee: int, last_op: int) -> None:
+        """
+        :param balances: base units by asset ID
+        :param transfer_fee: fee of transfer with memo, in core asset base units
+        :param last_op: integer ID of last account history op, already counted in balances
+        """
+        self.balances = dict(balances)
+        self.transfer_fee = transfer_fee
+        self.last_op = last_op
+        for asset_id in self.balances:
+            self._report(asset_id)
+
+    def available(self, asset_id: str) -> int:
+        return self.balances.get(asset_id, 0) - self._reserved.get(asset_id, 0)
+
+    def reserve(self, key, asset_id: str, amount: int) -> bool:
+        """
+        Reserve amount and transfer fee for transfer of key, like order ID. Reserving same key again
+        replaces its reservation.
+
+        :return: False and nothing reserved if balance does not cover amount with fee
+        """
+        self.release(key)
+        if asset_id == CORE_ASSET_ID:
+            needs = {CORE_ASSET_ID: amount + self.transfer_fee}
+        else:
+            needs = {asset_id: amount, CORE_ASSET_ID: self.transfer_fee}
+
+        if any(self.available(_asset_id) < value for _asset_id, value in needs.items()):
+            metrics.inc("ledger_insufficient_total", account=self.account)
+            return False
+
+        self._reservations[key] = needs
+        for _asset_id, value in needs.items():
+            self._reserved[_asset_id] = self._reserved.get(_asset_id, 0) + value
+            self._report(_asset_id)
+        return True
+
+    def release(self, key) -> None:
+        needs = self._reservations.pop(key, None)
+        if needs is None:
+            return
+        for asset_id, value in needs.items():
+            self._reserved[asset_id] -= value
+            self._report(asset_id)
+
+    def is_reserved(self, key) -> bool:
+        return key in self._reservations
+
+    def apply_op(self, op: dict) -> bool:
+        """
+        Count transfer op of account history in balances. Ops up to the last counted one are skipped.
+
+        :return: True if balances changed
+        """
+        op_num = int(op["id"].split(".")[2])
+        if self.last_op is None or op_num <= self.last_op:
+            return False
+        self.last_op = op_num
+        if op["op"][0] != 0:
+            return False
+
+        transfer = op["op"][1]
+        amount = transfer["amount"]
+        fee = transfer["fee"]
+        changed = False
+        if transfer["from"] == self.account_id:
+            self._add(amount["asset_id"], -int(amount["amount"]))
+            self._add(fee["asset_id"], -int(fee["amount"]))
+            changed = True
+        if transfer["to"] == self.account_id:
+            self._add(amount["asset_id"], int(amount["amount"]))
+            changed = True
+        return changed
+
+    def _add(self, asset_id: str, value: int) -> None:
+        self.balances[asset_id] = self.balances.get(asset_id, 0) + value
+        self._report(asset_id)
+
+    def _report(self, asset_id: str) -> None:
+        metrics.set(
+            "ledger_balance",
+            self.balances.get(asset_id, 0),
+            account=self.account,
+            asset=asset_id,
+        )
+        metrics.set(
+            "ledger_available",
+            self.available(asset_id),
+            account=self.account,
+            asset=asset_id,
+        )
@@ -0,0 +1,171 @@
+"""Scheduler which wakes up polling loops in step with BitShares block production"""
+import asyncio
+import calendar
+import time
+from collections import deque
+from datetime import datetime
+
+from src.metrics import metrics
+from src.utils import get_logger, RATE_LIMITED
+
+log = get_logger("BlockScheduler")
+
+
+class BlockScheduler:
+    """
+    Wake up consumers just after new block is produced, instead of sleeping fixed time.
+
+    Producer coroutine run() sleeps until the next expected block time plus a small delay, polls head
+    block and notifies consumers when head has moved. Consumer which had work waits for the next
+    block only. Idle consumer waits for 2, 4, 8... blocks, up to max_idle_blocks, and can be woken up
+    earlier by wake() when work appears outside of blockchain, like new WS RPC order.
+
+    If producer is not running or node is unreachable, consumers fall back to sleeping block
+    interval per awaited block.
+
+    :param get_head: coroutine function returning head block number and its naive UTC timestamp
+    :param delay: seconds after expected block time before polling, for node to receive the block
+    """
+
+    def __init__(
+        self,
+        get_head,
+        block_interval: float = 3,
+        delay: float = 0.3,
+        max_idle_blocks: int = 8,
+    ):
+        self.get_head = get_head
+        self.block_interval = block_interval
+        self.delay = delay
+        self.max_idle_blocks = max_idle_blocks
+
+        self.head_num = None
+        self.head_time = None
+        self.detection_latency = None
+
+        self.idle_streaks = {}
+        self.wakeups = {}
+        self._block = None
+        self._wakers = {}
+
+    @property
+    def block(self) -> asyncio.Event:
+        # Created lazily to bind with running event loop. Replaced by new event on every block
+        if self._block is None:
+            self._block = asyncio.Event()
+        return self._block
+
+    async def run(self) -> None:
+        polls = 0
+        while True:
+            head_num, head_time = await self.get_head()
+            if self.head_num is None or head_num > self.head_num:
+                self.on_block(head_num, head_time)
+                polls = 0
+            else:
+                polls += 1
+                if polls == 10:
+                    log.warning(
+                        "No new blocks after block %s",
+                        self.head_num,
+                        extra=RATE_LIMITED,
+                    )
+
+            await asyncio.sleep(self.next_poll_delay(polls))
+
+    def on_block(self, head_num: int, head_time: datetime, now: float = None) -> None:
+        now = time.time() if now is None else now
+        self.head_num = head_num
+        self.head_time = head_time
+        # Block timestamp is the slot time, so latency includes block propagation to our node
+        self.detection_latency = max(now - calendar.timegm(head_time.timetuple()), 0.0)
+        metrics.set("block_head_num", head_num)
+        metrics.set("block_detection_latency_seconds", round(self.detection_latency, 3))
+
+        block, self._block = self.block, asyncio.Event()
+        block.set()
+
+    def next_poll_delay(self, polls: int = 0, now: float = None) -> float:
+        """
+        Seconds until the next expected block plus delay. If block is late, poll again after delay,
+        doubling it on every miss up to block interval
+        """
+        if polls:
+            return min(self.delay * 2 ** polls, self.block_interval)
+        now = time.time() if now is None else now
+        expected = calendar.timegm(self.head_time.timetuple()) + self.block_interval
+        return min(max(expected + self.delay - now, self.delay), self.block_interval)
+
+    def blocks_to_wait(self, name: str, busy: bool) -> int:
+        if busy:
+            self.idle_streaks[name] = 0
+            return 1
+        streak = self.idle_streaks.get(name, 0)
+        self.idle_streaks[name] = streak + 1
+        return min(2 ** streak, self.max_idle_blocks)
+
+    async def wait(self, name: str, busy: bool) -> None:
+        """Called by consumer instead of sleep. busy tells if consumer had work in last round"""
+        blocks = self.blocks_to_wait(name, busy)
+        waker = self._wakers.get(name)
+        if waker is None:
+            waker = self._wakers[name] = asyncio.Event()
+
+        # Target is fixed now, blocks produced before waiter task starts count as well
+        if self.head_num is None:
+            target, timeout = None, blocks * self.block_interval
+        else:
+            # Blocks may be missed by producers, but stalled node must not stop consumers
+            target, timeout = self.head_num + blocks, blocks * self.block_interval * 2
+        try:
+            await asyncio.wait_for(self._wait_blocks(target, waker), timeout)
+        except asyncio.TimeoutError:
+            pass
+        waker.clear()
+        self._count_wakeup(name)
+
+    def wake(self, name: str) -> None:
+        """Wake up waiting consumer now, its backoff is reset"""
+        self.idle_streaks[name] = 0
+        waker = self._wakers.get(name)
+        if waker is not None:
+            waker.set()
+
+    def stats(self) -> dict:
+        return {
+            "head_num": self.head_num,
+            "detection_latency": self.detection_latency,
+            "wakeups_per_minute": {
+                name: self._wakeups_per_minute(name) for name in self.wakeups
+            },
+        }
+
+    async def _wait_blocks(self, target: int or None, waker: asyncio.Event) -> None:
+        if target is None:
+            # Producer did not see any block yet, wait_for timeout works as plain sleep
+            await waker.wait()
+            return
+
+        while self.head_num < target and not waker.is_set():
+            waiters = [
+                asyncio.ensure_future(self.block.wait()),
+                asyncio.ensure_future(waker.wait()),
+            ]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+
+    def _count_wakeup(self, name: str) -> None:
+        now = time.monotonic()
+        wakeups = self.wakeups.setdefault(name, deque())
+        wakeups.append(now)
+        while wakeups[0] < now - 60:
+            wakeups.popleft()
+        metrics.inc("scheduler_wakeups_total", loop=name)
+        metrics.set("scheduler_wakeups_per_minute", len(wakeups), loop=name)
+
+    def _wakeups_per_minute(self, name: str) -> int:
+        now = time.monotonic()
+        return sum(1 for t in self.wakeups[name] if t >= now - 60)
@@ -1,4 +1,6 @@
 import asyncio
+from datetime import datetime, timedelta
+from copy import deepcopy
 
 from bitshares.aio import BitShares
 from bitshares.aio.account import Account
@@ -10,27 +12,67 @@ from bitshares.aio.instance import (
     set_shared_bitshares_instance,
     shared_bitshares_instance,
 )
+from bitsharesbase import operations
+from bitsharesbase.operationids import operations as operation_ids
 from bitsharesbase.signedtransactions import Signed_Transaction
 from graphenecommon.exceptions import (
     BlockDoesNotExistsException,
     AccountDoesNotExistsException,
 )
-from grapheneapi.exceptions import NumRetriesReached
+from grapheneapi.exceptions import NumRetriesReached, RPCError
 
 from src.gw_dto import (
     OrderType,
     TxStatus,
     TxError,
-    BitSharesOperation as BitSharesOperationDTO,
     Amount as DTOAmount,
 )
+from src.metrics import metrics
+from src.op_record import OpRecord
+from src.blockchain.block_window import BlockWindow
+from src.blockchain.node_mux import NodeRPC
+from src.blockchain.op_rules import AssetRules, OpValidator
+from src.blockchain.rpc_scheduler import (
+    RpcPriority,
+    RpcScheduler,
+    rpc_priority,
+    set_shared_scheduler,
+)
+from src.blockchain.signer import TransactionSigner
 from src.utils import get_logger
 
-from src.config import Config, BITSHARES_BLOCK_TIME, BITSHARES_NEED_CONF
+from src.config import (
+    Config,
+    BITSHARES_BLOCK_TIME,
+    BITSHARES_NEED_CONF,
+    BITSHARES_TX_EXPIRATION,
+)
 
 
 log = get_logger("BitSharesUtils")
 
+_shared_signer: TransactionSigner = None
+
+# Chain data which never changes: account names by IDs and back, assets by symbols, symbols by IDs.
+# Shared by all calls and saved to cache snapshot, so restarted gateway does not request it again
+_chain_cache = {
+    "account_names": {},
+    "account_ids": {},
+    "assets": {},
+    "asset_symbols": {},
+}
+
+TRANSFER_OP_TYPE = operation_ids["transfer"]
+
+# Operation types which gateway processes, other operations of gateway accounts are not fetched
+GATEWAY_OP_TYPES = (TRANSFER_OP_TYPE,)
+
+# Maximum page of history API calls
+HISTORY_PAGE_LIMIT = 100
+
+# False when node does not have get_account_history_operations, history is filtered locally then
+_history_by_type = True
+
 
 class InvalidMemoMask(Exception):
     def __init__(self, message: str) -> None:
@@ -56,7 +98,15 @@ async def init_bitshares(
             "You need to provide an gateway account. Gateway instance can not work without it!\n"
             "Check that your account is owner of asset that your instance will distribute!"
         )
-    bitshares_instance = BitShares(node=node, keys=keys, blocking="head", loop=loop)
+    bitshares_instance = BitShares(
+        node=node,
+        keys=keys,
+        blocking="head",
+        expiration=BITSHARES_TX_EXPIRATION,
+        loop=loop,
+    )
+    # Node may be local mux shared by gateways on this host, ws+unix:///path/to/socket
+    bitshares_instance.rpc_class = NodeRPC
     set_shared_bitshares_instance(bitshares_instance)
 
     try:
@@ -70,6 +120,37 @@ async def init_bitshares(
     return bitshares_instance
 
 
+def init_signer(keys: list, workers: int = None) -> TransactionSigner:
+    """Start signing processes with keys of connected shared instance and set them as shared"""
+    global _shared_signer
+    instance = shared_bitshares_instance()
+    _shared_signer = TransactionSigner(keys, instance.rpc.chain_params, workers)
+    return _shared_signer
+
+
+def init_rpc_scheduler(
+    rate: float = 0, burst: int = 100, max_in_flight: int = 16
+) -> RpcScheduler:
+    """
+    Start scheduling calls of shared instance by priorities: broadcast, confirmation, live history,
+    backfill. Calls are made with priority of rpc_priority() context, LIVE by default
+    """
+    scheduler = RpcScheduler(rate=rate, burst=burst, max_in_flight=max_in_flight)
+    set_shared_scheduler(scheduler)
+    return scheduler
+
+
+def shared_signer() -> TransactionSigner or None:
+    return _shared_signer
+
+
+def close_signer() -> None:
+    global _shared_signer
+    if _shared_signer:
+        _shared_signer.close()
+        _shared_signer = None
+
+
 async def broadcast_tx(tx: dict) -> dict:
     instance: BitShares = shared_bitshares_instance()
     instance.nobroadcast = False
@@ -77,6 +158,16 @@ async def broadcast_tx(tx: dict) -> dict:
     return tx_res
 
 
+async def send_tx(tx: dict) -> None:
+    """
+    Broadcast signed transaction without waiting for block. Unlike broadcast_tx, returns as soon as node
+    accepted transaction to its pending pool: inclusion must be checked later, by transaction ID
+    """
+    instance: BitShares = shared_bitshares_instance()
+    with rpc_priority(RpcPriority.BROADCAST):
+        await instance.rpc.broadcast_transaction(tx, api="network_broadcast")
+
+
 async def asset_issue(
     symbol: str, amount: DTOAmount, to: str, memo: str = None
 ) -> dict:
@@ -105,6 +196,99 @@ async def asset_transfer(
     )
 
 
+async def build_transfer(
+    to: str, amount: int, asset_id: str, memo: str = None, account: str = None
+):
+    """
+    Transfer of integer base units of asset. Unlike asset_transfer, amount is never converted
+    to float by python-bitshares Amount
+
+    :return: transaction builder with operation and signing keys, not constructed yet
+    """
+    instance = shared_bitshares_instance()
+    if not account:
+        account = instance.config["default_account"]
+
+    from_account = await Account(account)
+    to_account = await Account(to)
+    memo_obj = await Memo(from_account=from_account, to_account=to_account)
+
+    tx = instance.transactionbuilder_class(blockchain_instance=instance)
+    tx.appendOps(
+        operations.Transfer(
+            **{
+                "fee": {"amount": 0, "asset_id": "1.3.0"},
+                "from": from_account["id"],
+                "to": to_account["id"],
+                "amount": {"amount": int(amount), "asset_id": asset_id},
+                "memo": memo_obj.encrypt(memo),
+                "prefix": instance.prefix,
+            }
+        )
+    )
+    await tx.appendSigner(from_account["name"], "active")
+    return tx
+
+
+async def sign_transfer(
+    to: str, amount: int, asset_id: str, memo: str = None, account: str = None
+) -> tuple:
+    """
+    Build and sign transfer of base units. Signed by shared signer processes if they are started
+
+    :return: transaction ID and signed transaction. ID is known before broadcast, so transaction
+        can be saved first and then found in blocks
+    """
+    tx = await build_transfer(
+        to=to, amount=amount, asset_id=asset_id, memo=memo, account=account
+    )
+
+    signer = shared_signer()
+    if not signer:
+        await tx.sign()
+        signed_tx = await tx.json()
+        # get_tx_ids sets prefix in operations, it must not get into broadcast transaction
+        tx_id = (await get_tx_ids([deepcopy(signed_tx)], tx.blockchain.prefix))[0]
+        return tx_id, signed_tx
+
+    return await signer.sign(await tx.json(), list(tx.wifs))
+
+
+async def load_gateway_asset(cfg: Config) -> None:
+    """Look up gateway asset ID and precision, and precompute config limits in base units"""
+    symbol = f"{cfg.gateway_prefix}.{cfg.gateway_distribute_asset}"
+    assets = _chain_cache["assets"]
+    if symbol not in assets:
+        asset = await Asset(symbol)
+        assets[symbol] = [asset["id"], asset["precision"]]
+    cfg.set_asset(*assets[symbol])
+
+
+def chain_cache() -> dict:
+    return _chain_cache
+
+
+def restore_chain_cache(data: dict) -> None:
+    """Merge chain data saved from chain_cache() of the same chain"""
+    for name, values in _chain_cache.items():
+        values.update(data.get(name, {}))
+
+
+async def get_tx_ids(txs: list, prefix: str) -> list:
+    """IDs of transactions, hashed by shared signer processes if they are started"""
+    signer = shared_signer()
+    if signer:
+        return await signer.tx_ids(txs)
+
+    tx_ids = []
+    for tx in txs:
+        # python-bitshares takes memo public keys prefix from operation, else mainnet "BTS" is used
+        for op_in_tx in tx["operations"]:
+            op_in_tx[1]["prefix"] = prefix
+        tx_ids.append(Signed_Transaction(tx).id)
+    return tx_ids
+
+
 async def get_last_op_num(account: str) -> int:
     account_instance = await Account(account)
     history_agen = account_instance.history(limit=1)
@@ -122,19 +306,98 @@ async def wait_new_account_ops(account: str = None, last_op: int = 0) -> list:
     :return: Reversed iterator of account's operations. Gateway must process operations in order older->newer
     """
 
+    while True:
+        new_ops = await get_new_account_ops(account, last_op)
+        if new_ops:
+            return new_ops
+        else:
+            await asyncio.sleep(BITSHARES_BLOCK_TIME)
+
+
+async def get_new_account_ops(
+    account: str = None, last_op: int = 0, op_types: tuple = None
+) -> list:
+    """
+    Same as wait_new_account_ops, but return empty list instead of waiting if there is no new operations.
+    Allow to poll many accounts in one loop
+
+    :param op_types: fetch only operations of these types, like GATEWAY_OP_TYPES. Node filters them
+                     by history API get_account_history_operations, if it has one
+    """
+    new_ops, _ = await poll_account_ops(account, last_op, op_types)
+    return new_ops
+
+
+async def poll_account_ops(
+    account: str = None, last_op: int = 0, op_types: tuple = None
+) -> tuple:
+    """
+    Same as get_new_account_ops, but also return integer ID of the newest operation seen, relevant or
+    not. History cursor is moved to it, so operations of other types are not fetched again when node
+    does not filter them.
+
+    Node without history API by types is detected once, other polls filter history locally.
+
+    :return: operations from older to newer and ID of the newest seen operation, last_op if none
+    """
+    global _history_by_type
     instance = shared_bitshares_instance()
     if not account:
         account = instance.config["default_account"]
 
     account = await Account(account)
 
-    while True:
-        history_agen = account.history(last=last_op)
-        new_ops = [op async for op in history_agen]
-        if new_ops:
-            return list(reversed(new_ops))
-        else:
-            await asyncio.sleep(BITSHARES_BLOCK_TIME)
+    if op_types and _history_by_type:
+        try:
+            new_ops = await get_account_ops_by_types(account["id"], last_op, op_types)
+            newest = int(new_ops[-1]["id"].split(".")[2]) if new_ops else last_op
+            return new_ops, newest
+        except RPCError as ex:
+            _history_by_type = False
+            log.warning(
+                "Node does not filter history by operation type, filter it locally: %s",
+                ex,
+            )
+
+    history_agen = account.history(last=last_op)
+    new_ops = [op async for op in history_agen]
+    # History is returned from newer to older
+    newest = int(new_ops[0]["id"].split(".")[2]) if new_ops else last_op
+    if op_types:
+        # Operation type is the first item of raw operation, nothing is decoded before the check
+        relevant = [op for op in new_ops if op["op"][0] in op_types]
+        if len(relevant) < len(new_ops):
+            metrics.inc("history_ops_skipped_total", len(new_ops) - len(relevant))
+        new_ops = relevant
+    return list(reversed(new_ops)), newest
+
+
+async def get_account_ops_by_types(
+    account_id: str, last_op: int, op_types: tuple
+) -> list:
+    """Operations of account newer than last_op and of given types, from older to newer"""
+    instance = shared_bitshares_instance()
+    last_op = int(last_op)
+    ops = []
+    for op_type in op_types:
+        # Start 1.11.0 means the most recent operation, pages go back in history until last_op
+        start = 0
+        while True:
+            page = await instance.rpc.get_account_history_operations(
+                account_id,
+                op_type,
+                f"1.11.{start}",
+                f"1.11.{last_op}",
+                HISTORY_PAGE_LIMIT,
+                api="history",
+            )
+            ops.extend(page)
+            oldest = int(page[-1]["id"].split(".")[2]) if page else 0
+            if len(page) < HISTORY_PAGE_LIMIT or oldest - 1 <= last_op:
+                break
+            start = oldest - 1
+
+    return sorted(ops, key=lambda op: int(op["id"].split(".")[2]))
 
 
 async def parse_blocks(start_block_num: int):
@@ -163,85 +426,270 @@ async def get_current_block_num():
     return await bc.get_current_block_num()
 
 
-async def read_memo(memo_obj: dict) -> str:
-    """Decrypt memo object that was sent with operation TO gateway's account;
-        account private memo key must be in the instance's key storage"""
-    if memo_obj:
-        memo_reader = await Memo()
-        return memo_reader.decrypt(memo_obj)
+async def get_head_and_irreversible_block_nums() -> tuple:
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_dynamic_global_properties()
+    return props["head_block_number"], props["last_irreversible_block_num"]
 
 
-async def validate_op(op: dict, cfg: Config = None) -> BitSharesOperationDTO:
-    cfg = Config() if not cfg else cfg
+async def get_head_block() -> tuple:
+    """Number and time of head block, as naive UTC datetime"""
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_dynamic_global_properties()
+    return props["head_block_number"], parse_bitshares_time(props["time"])
+
 
-    """Parse BitShares operation body from Account.history generator, check fields. Return DataTransferObject"""
+async def get_block_interval() -> int:
+    """Seconds between blocks, chain parameter which committee can change"""
     instance = shared_bitshares_instance()
+    props = await instance.rpc.get_global_properties()
+    return props["parameters"]["block_interval"]
 
-    # Check operations types
-    # To learn more info about bithsares operationsIDs and types look at:
-    # https://github.com/bitshares/python-bitshares/blob/master/bitsharesbase/operationids.py
-    op_type = op["op"][0]
 
-    # Transfer type is 0
-    if op_type == 0:
+async def update_block_window(window: BlockWindow) -> int or None:
+    """
+    Learn IDs of new head blocks and detect forks by parent ID mismatch.
 
-        from_account = await Account(op["op"][1]["from"])
-        to = await Account(op["op"][1]["to"])
-        amount = await Amount(op["op"][1]["amount"])
-        asset = await Asset(amount["asset"])
-        memo = await read_memo(op["op"][1].get("memo"))
+    Walk from head block down by `previous` links until it joins already known block.
 
-        op_log_string = (
-            f"Op {op['id']}: {from_account.name} transfer {amount} to {to.name}"
-        )
-        if memo:
-            op_log_string += f" with memo `{memo}`"
+    :return: number of the first orphaned block if fork is detected, else None
+    """
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_dynamic_global_properties()
+    head_num = props["head_block_number"]
+    head_id = props["head_block_id"]
+
+    if window.get(head_num) == head_id:
+        return
+
+    learned = {head_num: head_id}
+    lowest_num = window.lowest_num
+    num = head_num
+    while (
+        lowest_num is not None
+        and num - 1 >= lowest_num
+        and num - 1 > head_num - window.size
+    ):
+        header = await instance.rpc.get_block_header(num)
+        if window.get(num - 1) == header["previous"]:
+            break
+        learned[num - 1] = header["previous"]
+        num -= 1
 
-        log.info(op_log_string)
+    fork_at = window.update(learned, head_num)
+    if fork_at is not None:
+        log.warning(f"Fork detected: blocks since {fork_at} are orphaned")
+    return fork_at
 
-        error = TxError.NO_ERROR
-        status = TxStatus.RECEIVED_NOT_CONFIRMED
 
-        # Validate asset
-        if asset.symbol != f"{cfg.gateway_prefix}.{cfg.gateway_distribute_asset}":
-            error = TxError.BAD_ASSET
+def parse_bitshares_time(value: str or datetime) -> datetime:
+    """BitShares API returns times as UTC strings like 2020-06-30T01:38:41"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
 
-        # Validate account
-        if from_account.name == cfg.account:
-            order_type = OrderType.DEPOSIT
-        elif to.name == cfg.account:
-            order_type = OrderType.WITHDRAWAL
-        else:
-            raise  # Just pretty code, this situation is impossible
 
-        # Validate amount for withdrawals
-        if order_type == OrderType.WITHDRAWAL:
+async def get_irreversible_block_time() -> datetime:
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_dynamic_global_properties()
+    header = await instance.rpc.get_block_header(props["last_irreversible_block_num"])
+    return parse_bitshares_time(header["timestamp"])
 
-            if amount < cfg.min_withdrawal:
-                error = TxError.LESS_MIN
 
-            if amount > cfg.max_withdrawal:
-                error = TxError.GREATER_MAX
+async def get_block_tx_ids(block: dict) -> list:
+    """IDs of block transactions. Computed locally if node does not return them"""
+    if block.get("transaction_ids"):
+        return block["transaction_ids"]
 
-            if not memo:
-                error = TxError.NO_MEMO
-            else:
-                try:
-                    await validate_withdrawal_memo(memo, cfg)
-                except InvalidMemoMask:
-                    error = TxError.FLOOD_MEMO
+    instance = shared_bitshares_instance()
+    return await get_tx_ids(block["transactions"], instance.prefix)
+
+
+async def find_transaction(tx_id: str, expiration: datetime) -> int or None:
+    """
+    Look for transaction in all irreversible blocks it could be included in.
+
+    Transaction can be included only in block with timestamp before it's expiration, and it could not be
+    created earlier than BITSHARES_TX_EXPIRATION seconds before expiration (doubled to be safe against
+    clocks skew). Caller must be sure that last irreversible block is newer than expiration,
+    otherwise result is not final.
+
+    :return: number of block with transaction or None
+    """
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_dynamic_global_properties()
+    irreversible_num = props["last_irreversible_block_num"]
+    header = await instance.rpc.get_block_header(irreversible_num)
+    irreversible_time = parse_bitshares_time(header["timestamp"])
+
+    # Missed blocks only make real block number of earliest time bigger, so this is the lower bound
+    earliest_time = expiration - timedelta(seconds=BITSHARES_TX_EXPIRATION * 2)
+    block_num = irreversible_num - int(
+        (irreversible_time - earliest_time).total_seconds() // BITSHARES_BLOCK_TIME
+    )
+
+    # Scan of old blocks must not delay broadcasts and confirmations
+    with rpc_priority(RpcPriority.BACKFILL):
+        while block_num <= irreversible_num:
+            block = await instance.rpc.get_block(block_num)
+            if parse_bitshares_time(block["timestamp"]) > expiration:
+                break
+            if tx_id in await get_block_tx_ids(block):
+                return block_num
+            block_num += 1
+
+
+async def get_max_tx_expiration() -> int:
+    """Seconds transaction may stay valid after it is signed, chain parameter"""
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_global_properties()
+    return props["parameters"]["maximum_time_until_expiration"]
+
+
+async def locate_transactions(tx_ids, from_block_num: int, to_block_num: int) -> dict:
+    """
+    Look for transactions in blocks of current chain, like transactions of blocks orphaned by fork,
+    which may be included again into other blocks.
+
+    :return: block numbers of found transactions by their IDs
+    """
+    instance = shared_bitshares_instance()
+    tx_ids = set(tx_ids)
+    found = {}
+    for block_num in range(from_block_num, to_block_num + 1):
+        block = await instance.rpc.get_block(block_num)
+        if block is None:
+            continue
+        for tx_id in await get_block_tx_ids(block):
+            if tx_id in tx_ids:
+                found[tx_id] = block_num
+    return found
+
+
+def relocate_operation(
+    op: OpRecord,
+    block_num: int or None,
+    irreversible_time: datetime,
+    max_expiration: int,
+) -> OpRecord or None:
+    """
+    Decide what operation rolled back by fork becomes.
+
+    If its transaction is found in block of current chain, operation is counting confirmations from
+    that block again. If transaction is expired before last irreversible block, it can never be
+    included: own transfer is broadcast again, incoming one is failed.
+
+    :param block_num: block of current chain with operation's transaction, None if not found yet
+    :param max_expiration: chain's maximum transaction lifetime, for transactions with unknown expiration
+    :return: updated copy of operation, or None while transaction still may be included
+    """
+    if block_num is not None:
+        return op.replace(
+            block_num=block_num, confirmations=0, irreversible_confirmations=0
+        )
+
+    expiration = op.tx_expiration
+    if expiration is None and op.tx_created_at is not None:
+        expiration = op.tx_created_at + timedelta(seconds=max_expiration)
+    if expiration is None or irreversible_time <= expiration:
+        return
+
+    if op.order_type == OrderType.DEPOSIT:
+        return op.replace(
+            op_id=None,
+            status=TxStatus.WAIT,
+            tx_hash=None,
+            tx_expiration=None,
+            confirmations=0,
+            irreversible_confirmations=0,
+        )
+    return op.replace(status=TxStatus.ERROR, error=TxError.TX_HASH_NOT_FOUND)
+
+
+async def read_memo(memo_obj: dict) -> str:
+    """Decrypt memo object that was sent with operation TO gateway's account;
+        account private memo key must be in the instance's key storage"""
+    if memo_obj:
+        memo_reader = await Memo()
+        return memo_reader.decrypt(memo_obj)
 
-        # Validate amount for deposits
-        if order_type == OrderType.DEPOSIT:
 
-            if amount < cfg.min_deposit:
-                error = TxError.LESS_MIN
+async def validate_op(
+    op: dict, cfg: Config = None, validator: OpValidator = None
+) -> OpRecord or None:
+    """
+    Parse BitShares operation body from Account.history generator, check fields. Return operation record,
+    or None if operation is not a transfer of gateway account.
+
+    Without validator, rules are compiled from cfg for this call. Loops pass validator compiled once.
+    """
+    if validator is None:
+        cfg = Config() if not cfg else cfg
+        if cfg.asset_precision is None:
+            await load_gateway_asset(cfg)
+        validator = OpValidator([AssetRules(cfg, await get_account_id(cfg.account))])
+    return (await validate_ops([op], validator))[0]
+
+
+async def validate_ops(ops: list, validator: OpValidator) -> list:
+    """
+    Validate page of history operations: rules are checked for all of them in one pass, then node
+    objects which records need are requested once per page: counterparty accounts and blocks.
+
+    :return: operation record or None for every operation, in the same order
+    """
+    transfers = [op["op"][1] if op["op"][0] == TRANSFER_OP_TYPE else None for op in ops]
+    memos = [
+        await read_memo(transfer.get("memo")) if transfer is not None else None
+        for transfer in transfers
+    ]
+    verdicts = validator.check_page(transfers, memos)
+
+    names = {}
+    symbols = {}
+    blocks = {}
+    for op, transfer, (rules, order_type, _) in zip(ops, transfers, verdicts):
+        if rules is None:
+            continue
+        counterparty = transfer["to" if order_type == OrderType.DEPOSIT else "from"]
+        if counterparty not in names:
+            names[counterparty] = await get_account_name(counterparty)
+        asset_id = transfer["amount"]["asset_id"]
+        if asset_id != rules.asset_id and asset_id not in symbols:
+            symbols[asset_id] = await get_asset_symbol(asset_id)
+        if op["block_num"] not in blocks:
+            blocks[op["block_num"]] = await Block(op["block_num"])
+
+    records = []
+    for op, transfer, memo, (rules, order_type, error) in zip(
+        ops, transfers, memos, verdicts
+    ):
+        if rules is None:
+            records.append(None)
+            continue
 
-            if amount > cfg.max_withdrawal:
-                error = TxError.GREATER_MAX
+        amount = int(transfer["amount"]["amount"])
+        asset = symbols.get(transfer["amount"]["asset_id"], rules.symbol)
+        if order_type == OrderType.DEPOSIT:
+            from_account, to_account = rules.account, names[transfer["to"]]
+        else:
+            from_account, to_account = names[transfer["from"]], rules.account
+
+        log.info(
+            "Op %s: %s transfer %s units of %s to %s with memo `%s`",
+            op["id"],
+            from_account,
+            amount,
+            asset,
+            to_account,
+            memo,
+        )
 
+        block = blocks[op["block_num"]]
         try:
-            tx_hash = await get_tx_hash_from_op(op, cfg)
+            tx_hash = await get_tx_hash_from_op(
+                op, block=block, prefix=rules.core_asset
+            )
         except OperationsCollision as ex:
             log.exception(ex)
             tx_hash = "Unknown"
@@ -257,29 +705,34 @@ async def validate_op(op: dict, cfg: Config = None) -> BitSharesOperationDTO:
 
         if error != TxError.NO_ERROR:
             status = TxStatus.ERROR
-            log.info(f"Op {op['id']}: catch Error: {error.name}")
+            log.info("Op %s: catch Error: %s", op["id"], error.name)
         else:
+            status = TxStatus.RECEIVED_NOT_CONFIRMED
             log.info(
-                f"Op {op['id']}: operation is valid and will be processed as {order_type.name}"
+                "Op %s: operation is valid and will be processed as %s",
+                op["id"],
+                order_type.name,
             )
 
-        op_dto = BitSharesOperationDTO(
-            op_id=int(op["id"].split(".")[2]),
-            order_type=order_type,
-            asset=asset.symbol,
-            from_account=from_account.name,
-            to_account=to.name,
-            amount=amount.amount,
-            status=status,
-            tx_hash=tx_hash,
-            confirmations=0,
-            block_num=op["block_num"],
-            tx_created_at=(await Block(op["block_num"])).time(),
-            error=error,
-            memo=memo,
+        records.append(
+            OpRecord(
+                op_id=int(op["id"].split(".")[2]),
+                order_type=order_type,
+                asset=asset,
+                from_account=from_account,
+                to_account=to_account,
+                amount=amount,
+                status=status,
+                tx_hash=tx_hash,
+                confirmations=0,
+                block_num=op["block_num"],
+                tx_created_at=block.time(),
+                error=error,
+                memo=memo,
+            )
         )
 
-        return op_dto
+    return records
 
 
 async def validate_withdrawal_memo(memo: str or dict, cfg: Config = None) -> None:
@@ -287,40 +740,73 @@ async def validate_withdrawal_memo(memo: str or dict, cfg: Config = None) -> Non
     if isinstance(memo, dict):
         memo = await read_memo(memo)
 
+    prefix, colon, address = memo.partition(":")
     if (
-        (len(memo.split(":")) != 2)
-        or memo.split(":")[0].upper() != cfg.gateway_distribute_asset
-        or len(memo.split(":")[1]) == 0
+        not colon
+        or not address
+        or ":" in address
+        or prefix.upper() != cfg.gateway_distribute_asset
     ):
         raise InvalidMemoMask(f"Flood memo: {memo}")
 
 
-async def confirm_op(op: BitSharesOperationDTO) -> bool:
+async def confirm_op(op: OpRecord, mode: str = "irreversible") -> OpRecord or None:
+    """
+    Count operation's confirmations and change status when there is enough of them.
+
+    :param mode: "irreversible" counts confirmations by last irreversible block,
+                 "head" counts them by head block. Head mode is faster but operation may be rolled back
+                 by fork, so it must be used together with fork tracking (update_block_window)
+
+    :return: updated copy of operation, or None if nothing is changed
+    """
+
+    (
+        head_block_num,
+        irreversible_block_num,
+    ) = await get_head_and_irreversible_block_nums()
+    current_block_num = head_block_num if mode == "head" else irreversible_block_num
+    changes = {}
 
-    current_block_num = await get_current_block_num()
-    change = False
+    irreversible_confirmations = max(irreversible_block_num - op.block_num, 0)
+    if irreversible_confirmations != op.irreversible_confirmations:
+        changes["irreversible_confirmations"] = irreversible_confirmations
 
     if current_block_num > op.block_num:
+        confirmations = op.confirmations
         confirmations_now = current_block_num - op.block_num
 
-        if confirmations_now > op.confirmations:
-            op.confirmations = confirmations_now
-            change = True
+        if confirmations_now > confirmations:
+            confirmations = changes["confirmations"] = confirmations_now
             log.info(
-                f"Op {op.op_id}: new confirmations! (currently {op.confirmations}/{BITSHARES_NEED_CONF})"
+                "Op %s: new confirmations! (currently %s/%s)",
+                op.op_id,
+                confirmations,
+                BITSHARES_NEED_CONF,
             )
 
-        if op.confirmations >= BITSHARES_NEED_CONF:
-            op.status = TxStatus.RECEIVED_AND_CONFIRMED
-            change = True
-            log.info(f"Op {op.op_id}: changing status to {op.status.name}")
+        if confirmations >= BITSHARES_NEED_CONF:
+            changes["status"] = TxStatus.RECEIVED_AND_CONFIRMED
+            log.info(
+                "Op %s: changing status to %s",
+                op.op_id,
+                TxStatus.RECEIVED_AND_CONFIRMED.name,
+            )
 
-    return change
+    return op.replace(**changes) if changes else None
 
 
-async def get_tx_hash_from_op(op: dict, cfg: Config = None) -> str:
-    cfg = Config() if not cfg else cfg
-    op_block = await Block(op["block_num"])
+async def get_tx_hash_from_op(
+    op: dict, cfg: Config = None, block: Block = None, prefix: str = None
+) -> str:
+    """
+    :param block: block of operation, if caller already has it
+    :param prefix: chain prefix, cfg.core_asset by default
+    """
+    if prefix is None:
+        cfg = Config() if not cfg else cfg
+        prefix = cfg.core_asset
+    op_block = await Block(op["block_num"]) if block is None else block
     related_txs = []
 
     for tx in op_block["transactions"]:
@@ -344,12 +830,12 @@ async def get_tx_hash_from_op(op: dict, cfg: Config = None) -> str:
                 continue
             # TODO memo compare
 
-            """this is prevent bug in python-bitshares when Block['transaction'] from
-               testnet returning with mainnet prefix "BTS"(should be "TEST")
-            """
-            tx["operations"][0][1]["prefix"] = cfg.core_asset
+            related_txs.append(tx)
 
-            related_txs.append(Signed_Transaction(tx).id)
+    """this is prevent bug in python-bitshares when Block['transaction'] from
+       testnet returning with mainnet prefix "BTS"(should be "TEST")
+    """
+    related_txs = await get_tx_ids(related_txs, prefix)
 
     if len(related_txs) == 1:
         return related_txs[0]
@@ -366,6 +852,52 @@ async def get_tx_hash_from_op(op: dict, cfg: Config = None) -> str:
         )
 
 
+async def get_account_id(account: str) -> str:
+    account_ids = _chain_cache["account_ids"]
+    if account not in account_ids:
+        account_ids[account] = (await Account(account))["id"]
+    return account_ids[account]
+
+
+async def get_account_name(account_id: str) -> str:
+    names = _chain_cache["account_names"]
+    if account_id not in names:
+        names[account_id] = (await Account(account_id)).name
+    return names[account_id]
+
+
+async def get_asset_symbol(asset_id: str) -> str:
+    symbols = _chain_cache["asset_symbols"]
+    if asset_id not in symbols:
+        symbols[asset_id] = (await Asset(asset_id)).symbol
+    return symbols[asset_id]
+
+
+async def get_account_balances(account_id: str) -> dict:
+    """Balances of account in base units by asset ID"""
+    instance = shared_bitshares_instance()
+    balances = await instance.rpc.get_account_balances(account_id, [])
+    return {balance["asset_id"]: int(balance["amount"]) for balance in balances}
+
+
+async def get_transfer_fee() -> int:
+    """
+    Fee of transfer with memo up to 1 KiB in core asset base units, by current fee schedule.
+    Memo is charged per kilobyte, so one kilobyte price bounds it for gateway memos
+    """
+    instance = shared_bitshares_instance()
+    props = await instance.rpc.get_global_properties()
+    fees = props["parameters"]["current_fees"]
+    transfer_fee = dict(fees["parameters"])[TRANSFER_OP_TYPE]
+    fee = int(transfer_fee["fee"]) + int(transfer_fee.get("price_per_kbyte", 0))
+    # Fee schedule values are scaled by percent of GRAPHENE_100_PERCENT = 10000
+    return fee * int(fees["scale"]) // 10000
+
+
+async def get_asset_id(symbol: str) -> str:
+    return (await Asset(symbol))["id"]
+
+
 async def validate_bitshares_account(account: str) -> bool:
     try:
         await Account(account)
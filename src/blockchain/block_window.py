@@ -0,0 +1,49 @@
+class BlockWindow:
+    """
+    Rolling window of recent block IDs by block numbers.
+
+    Used by head confirmation mode: if node reports other ID for already known block number, chain
+    was switched to another fork and all blocks since this number are orphaned.
+    """
+
+    def __init__(self, size: int = 100):
+        self.size = size
+        self.blocks = {}
+
+    @property
+    def head_num(self) -> int or None:
+        return max(self.blocks) if self.blocks else None
+
+    @property
+    def lowest_num(self) -> int or None:
+        return min(self.blocks) if self.blocks else None
+
+    def get(self, block_num: int) -> str or None:
+        return self.blocks.get(block_num)
+
+    def update(self, learned: dict, head_num: int) -> int or None:
+        """
+        Remember block IDs of current chain.
+
+        :param learned: IDs of current chain's blocks by numbers, must include head block
+        :param head_num: current head block number
+        :return: number of the first orphaned block if fork is detected, else None
+        """
+        orphaned = [
+            num
+            for num, block_id in learned.items()
+            if num in self.blocks and self.blocks[num] != block_id
+        ]
+        # Previous fork was longer than current chain
+        orphaned.extend(num for num in self.blocks if num > head_num)
+
+        fork_at = min(orphaned) if orphaned else None
+        if fork_at is not None:
+            for num in [num for num in self.blocks if num >= fork_at]:
+                del self.blocks[num]
+
+        self.blocks.update(learned)
+        for num in [num for num in self.blocks if num <= head_num - self.size]:
+            del self.blocks[num]
+
+        return fork_at
@@ -0,0 +1,327 @@
+"""
+Local multiplexer of BitShares node connections for many gateway processes on one host.
+
+    python -m src.blockchain.node_mux --socket /run/bitshares-mux.sock --node wss://node1/ --node wss://node2/
+
+Daemon holds one websocket to upstream node and serves node API to local clients over websocket on
+Unix socket. Gateways point at it with node url ws+unix:///run/bitshares-mux.sock, init_bitshares
+connects them transparently. Identical requests in flight are sent upstream once, blocks up to last
+irreversible one and objects of get_objects are served from shared cache.
+
+API is called by name, like ["database", "get_objects", [...]], which is stateless, so requests of
+all clients are the same and survive reconnects to another node. Login API is answered locally,
+subscriptions are not supported.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+import aiohttp
+import websockets
+from aiohttp import web
+from bitsharesapi.aio.bitsharesnoderpc import BitSharesNodeRPC
+from grapheneapi.aio.websocket import Websocket
+
+from src.blockchain.rpc_scheduler import shared_scheduler
+from src.config import BITSHARES_BLOCK_TIME, Config
+from src.utils import get_logger, RATE_LIMITED
+
+log = get_logger("NodeMux")
+
+UNIX_SCHEME = "ws+unix://"
+
+# Login API calls, answered by mux itself: API name works instead of numeric API ID
+LOGIN_APIS = (1, "login")
+
+# Blocks are immutable when irreversible, so they are cached without expiration
+BLOCK_METHODS = ("get_block", "get_block_header")
+
+# Methods which need notifications routed back to client
+SUBSCRIBE_METHODS = (
+    "set_subscribe_callback",
+    "set_pending_transaction_callback",
+    "set_block_applied_callback",
+    "subscribe_to_market",
+    "broadcast_transaction_with_callback",
+)
+
+
+class UnixWebsocket(Websocket):
+    """Websocket connection to mux over Unix socket, url is ws+unix:///path/to/socket"""
+
+    async def connect(self):
+        self.ws = await websockets.unix_connect(
+            self.url[len(UNIX_SCHEME) :], "ws://localhost/", loop=self.loop
+        )
+        self.loop.create_task(self._parsing_wrapper())
+
+
+class NodeRPC(BitSharesNodeRPC):
+    """
+    Node RPC of python-bitshares which also connects to mux by ws+unix:// url. API calls wait for
+    their turn in shared RPC scheduler, if it is started
+    """
+
+    def updated_connection(self):
+        if self.url.startswith(UNIX_SCHEME):
+            return UnixWebsocket(self.url, **self._kwargs)
+        return super().updated_connection()
+
+    def __getattr__(self, name):
+        func = super().__getattr__(name)
+        scheduler = shared_scheduler()
+        if scheduler is None or name.startswith("_"):
+            return func
+
+        async def scheduled(*args, **kwargs):
+            return await scheduler.call(self.url, func, *args, **kwargs)
+
+        return scheduled
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class Upstream:
+    """
+    Websocket to one of nodes, requests are matched with responses by own IDs.
+    Broken connection fails requests in flight, next request connects to next node
+    """
+
+    def __init__(self, nodes: list, timeout: float = 30):
+        self.nodes = [nodes] if isinstance(nodes, str) else list(nodes)
+        self.timeout = timeout
+        self._node = 0
+        self._request_id = 0
+        self._pending = {}
+        self._session = None
+        self._ws = None
+        self._reader = None
+        self._connecting = asyncio.Lock()
+
+    async def call(self, api, method: str, params: list) -> dict:
+        """:return: node response, with result or error"""
+        ws = await self._connect()
+        self._request_id += 1
+        request_id = self._request_id
+        response = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = response
+        try:
+            await ws.send_str(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": request_id,
+                        "method": "call",
+                        "params": [api, method, params],
+                    }
+                )
+            )
+            return await asyncio.wait_for(response, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+        if self._ws:
+            await self._ws.close()
+        if self._session:
+            await self._session.close()
+
+    async def _connect(self):
+        async with self._connecting:
+            if self._ws is not None and not self._ws.closed:
+                return self._ws
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+
+            for _ in range(len(self.nodes)):
+                url = self.nodes[self._node]
+                try:
+                    self._ws = await self._session.ws_connect(url, heartbeat=30)
+                except (aiohttp.ClientError, OSError) as ex:
+                    log.warning(
+                        "Node %s is unreachable: %s", url, ex, extra=RATE_LIMITED
+                    )
+                    self._node = (self._node + 1) % len(self.nodes)
+                    continue
+                log.info("Connected to node %s", url)
+                self._reader = asyncio.ensure_future(self._read(self._ws))
+                return self._ws
+            raise UpstreamError("All nodes are unreachable")
+
+    async def _read(self, ws) -> None:
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                response = json.loads(message.data)
+                waiter = self._pending.pop(response.get("id"), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(response)
+        finally:
+            log.warning(
+                "Connection to node %s is closed",
+                self.nodes[self._node],
+                extra=RATE_LIMITED,
+            )
+            self._node = (self._node + 1) % len(self.nodes)
+            for waiter in self._pending.values():
+                if not waiter.done():
+                    waiter.set_exception(UpstreamError("Connection to node is closed"))
+            self._pending.clear()
+
+
+class NodeMux:
+    """
+    Deduplicating and caching front of upstream node.
+
+    :param upstream: object with async call(api, method, params) returning node response
+    :param objects_ttl: seconds objects of get_objects are served from cache, one block by default
+    :param max_blocks: cached irreversible blocks
+    """
+
+    def __init__(
+        self,
+        upstream,
+        objects_ttl: float = BITSHARES_BLOCK_TIME,
+        max_blocks: int = 10000,
+    ):
+        self.upstream = upstream
+        self.objects_ttl = objects_ttl
+        self.max_blocks = max_blocks
+        self.irreversible_block_num = 0
+        self.stats = {"requests": 0, "upstream": 0, "deduplicated": 0, "cached": 0}
+        self._in_flight = {}
+        self._blocks = OrderedDict()
+        self._objects = {}
+        self._runner = None
+
+    async def request(self, api, method: str, params: list) -> dict:
+        """:return: response without ID, with result or error"""
+        self.stats["requests"] += 1
+        if api in LOGIN_APIS:
+            return {"result": True if method == "login" else method}
+        if method in SUBSCRIBE_METHODS:
+            return {"error": {"message": f"{method} is not supported by node mux"}}
+
+        if method in BLOCK_METHODS:
+            key = (method, params[0])
+            if key in self._blocks:
+                self._blocks.move_to_end(key)
+                self.stats["cached"] += 1
+                return {"result": self._blocks[key]}
+            response = await self._call(api, method, params)
+            if (
+                "result" in response
+                and isinstance(params[0], int)
+                and params[0] <= self.irreversible_block_num
+            ):
+                self._blocks[key] = response["result"]
+                if len(self._blocks) > self.max_blocks:
+                    self._blocks.popitem(last=False)
+            return response
+
+        if method == "get_objects":
+            now = time.monotonic()
+            cached = [self._objects.get(object_id) for object_id in params[0]]
+            if all(entry and now - entry[0] < self.objects_ttl for entry in cached):
+                self.stats["cached"] += 1
+                return {"result": [entry[1] for entry in cached]}
+            response = await self._call(api, method, params)
+            if "result" in response:
+                for object_id, obj in zip(params[0], response["result"]):
+                    self._objects[object_id] = (now, obj)
+                self._watch_irreversible(response["result"])
+            return response
+
+        response = await self._call(api, method, params)
+        if method == "get_dynamic_global_properties" and "result" in response:
+            self._watch_irreversible([response["result"]])
+        return response
+
+    async def _call(self, api, method: str, params: list) -> dict:
+        """Send request upstream, or wait for the same request in flight"""
+        key = json.dumps([api, method, params], sort_keys=True)
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(in_flight)
+
+        self.stats["upstream"] += 1
+        in_flight = self._in_flight[key] = asyncio.ensure_future(
+            self.upstream.call(api, method, params)
+        )
+        try:
+            return await asyncio.shield(in_flight)
+        finally:
+            if self._in_flight.get(key) is in_flight:
+                del self._in_flight[key]
+
+    def _watch_irreversible(self, objects: list) -> None:
+        for obj in objects:
+            if obj and "last_irreversible_block_num" in obj:
+                self.irreversible_block_num = max(
+                    self.irreversible_block_num, obj["last_irreversible_block_num"]
+                )
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        """Websocket of one client, its requests are served concurrently"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.TEXT:
+                asyncio.ensure_future(self._respond(ws, json.loads(message.data)))
+        return ws
+
+    async def _respond(self, ws, payload: dict) -> None:
+        api, method, params = payload["params"]
+        try:
+            response = await self.request(api, method, params)
+        except (UpstreamError, asyncio.TimeoutError) as ex:
+            response = {"error": {"message": f"Node mux: {ex or 'timeout'}"}}
+        if not ws.closed:
+            await ws.send_str(
+                json.dumps(dict(response, id=payload["id"], jsonrpc="2.0"))
+            )
+
+    async def start(self, path: str) -> None:
+        app = web.Application()
+        app.router.add_get("/", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.UnixSite(self._runner, path).start()
+        log.info("Serving node API on %s%s", UNIX_SCHEME, path)
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+        await self.upstream.close()
+
+
+async def serve(args) -> None:
+    mux = NodeMux(Upstream(args.node or Config.nodes), objects_ttl=args.objects_ttl)
+    await mux.start(args.socket)
+    try:
+        while True:
+            await asyncio.sleep(60)
+            log.info("Stats: %s", mux.stats)
+    finally:
+        await mux.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--socket", default="/tmp/bitshares-mux.sock")
+    parser.add_argument(
+        "--node", action="append", help="upstream node url, may be repeated"
+    )
+    parser.add_argument("--objects-ttl", type=float, default=BITSHARES_BLOCK_TIME)
+    try:
+        asyncio.get_event_loop().run_until_complete(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
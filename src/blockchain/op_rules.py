@@ -0,0 +1,132 @@
+"""
+Validation rules of transfers to and from gateway accounts, compiled from tenant configs.
+
+Rules match raw operation fields: account and asset object IDs and integer amounts, so checking
+an operation takes a few dict lookups and comparisons, without node requests.
+"""
+from src.gw_dto import OrderType, TxError
+
+
+class AssetRules:
+    """Limits and memo grammar of one (account, asset) pair, precomputed from its Config"""
+
+    __slots__ = (
+        "account_id",
+        "account",
+        "asset_id",
+        "symbol",
+        "memo_prefix",
+        "min_deposit",
+        "max_deposit",
+        "min_withdrawal",
+        "max_withdrawal",
+        "core_asset",
+    )
+
+    def __init__(self, cfg, account_id: str):
+        """Config must have asset loaded by set_asset()"""
+        if cfg.asset_id is None:
+            raise ValueError(f"Asset of {cfg.account} is not loaded")
+        self.account_id = account_id
+        self.account = cfg.account
+        self.asset_id = cfg.asset_id
+        self.symbol = f"{cfg.gateway_prefix}.{cfg.gateway_distribute_asset}"
+        self.memo_prefix = cfg.gateway_distribute_asset.upper()
+        self.min_deposit = cfg.min_deposit_units
+        self.max_deposit = cfg.max_deposit_units
+        self.min_withdrawal = cfg.min_withdrawal_units
+        self.max_withdrawal = cfg.max_withdrawal_units
+        self.core_asset = cfg.core_asset
+
+    def is_valid_memo(self, memo: str) -> bool:
+        """Withdrawal memo is `asset:address`, like eth:0x123..., asset is case-insensitive"""
+        prefix, colon, address = memo.partition(":")
+        return bool(
+            colon
+            and address
+            and ":" not in address
+            and prefix.upper() == self.memo_prefix
+        )
+
+
+class OpValidator:
+    """
+    Rules of all tenants, by (account ID, asset ID).
+
+    Transfer of asset which no tenant of the account serves is checked by the first tenant of the
+    account and gets BAD_ASSET error.
+    """
+
+    def __init__(self, rules: list):
+        self.rules = {}
+        self.by_account = {}
+        for asset_rules in rules:
+            key = (asset_rules.account_id, asset_rules.asset_id)
+            self.rules.setdefault(key, asset_rules)
+            self.by_account.setdefault(asset_rules.account_id, asset_rules)
+
+    @classmethod
+    def compile(cls, tenants: list, account_ids: dict) -> "OpValidator":
+        """:param account_ids: account object IDs by account names"""
+        return cls(
+            [AssetRules(tenant, account_ids[tenant.account]) for tenant in tenants]
+        )
+
+    def match(self, transfer: dict) -> tuple:
+        """
+        Rules and order type of transfer body, op["op"][1].
+
+        :return: (rules, order_type), or (None, None) if transfer does not touch gateway accounts
+        """
+        asset_id = transfer["amount"]["asset_id"]
+        for account_id, order_type in (
+            (transfer["from"], OrderType.DEPOSIT),
+            (transfer["to"], OrderType.WITHDRAWAL),
+        ):
+            rules = self.rules.get((account_id, asset_id)) or self.by_account.get(
+                account_id
+            )
+            if rules is not None:
+                return rules, order_type
+        return None, None
+
+    def check(self, transfer: dict, memo: str or None) -> tuple:
+        """
+        Validate transfer body with decrypted memo. Later checks override earlier errors, so memo
+        errors are reported over amount errors, and those over asset error.
+
+        :return: (rules, order_type, error), rules are None for foreign transfer
+        """
+        rules, order_type = self.match(transfer)
+        if rules is None:
+            return None, None, TxError.UNKNOWN_ERROR
+
+        amount = int(transfer["amount"]["amount"])
+        error = TxError.NO_ERROR
+        if transfer["amount"]["asset_id"] != rules.asset_id:
+            error = TxError.BAD_ASSET
+
+        if order_type == OrderType.WITHDRAWAL:
+            if amount < rules.min_withdrawal:
+                error = TxError.LESS_MIN
+            if amount > rules.max_withdrawal:
+                error = TxError.GREATER_MAX
+            if not memo:
+                error = TxError.NO_MEMO
+            elif not rules.is_valid_memo(memo):
+                error = TxError.FLOOD_MEMO
+        else:
+            if amount < rules.min_deposit:
+                error = TxError.LESS_MIN
+            if amount > rules.max_deposit:
+                error = TxError.GREATER_MAX
+
+        return rules, order_type, error
+
+    def check_page(self, transfers: list, memos: list) -> list:
+        """check() of many transfers in one pass. None in place of transfer gives (None, None, None)"""
+        check = self.check
+        return [
+            check(transfer, memo) if transfer is not None else (None, None, None)
+            for transfer, memo in zip(transfers, memos)
+        ]
@@ -0,0 +1,222 @@
+"""Priority scheduling of node API calls, with rate limits per node"""
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from enum import IntEnum
+
+from src.metrics import metrics
+
+
+class RpcPriority(IntEnum):
+    """Classes of node calls, from the most latency-critical one"""
+
+    BROADCAST = 0
+    CONFIRMATION = 1
+    LIVE = 2
+    BACKFILL = 3
+
+
+# Share of calls every class gets when all of them are waiting
+DEFAULT_WEIGHTS = {
+    RpcPriority.BROADCAST: 16,
+    RpcPriority.CONFIRMATION: 8,
+    RpcPriority.LIVE: 4,
+    RpcPriority.BACKFILL: 1,
+}
+
+# Priority of calls made by current task. Tasks copy context when created, so loops set their own
+_priority = ContextVar("rpc_priority", default=RpcPriority.LIVE)
+
+
+class rpc_priority:
+    """Context manager: calls inside it are made with given priority"""
+
+    def __init__(self, priority: RpcPriority):
+        self.priority = priority
+        self._token = None
+
+    def __enter__(self):
+        self._token = _priority.set(self.priority)
+        return self
+
+    def __exit__(self, *exc):
+        _priority.reset(self._token)
+
+
+def current_priority() -> RpcPriority:
+    return _priority.get()
+
+
+def with_rpc_priority(priority: RpcPriority, func):
+    """Coroutine function which runs func with given priority, for long-running loops"""
+
+    async def prioritized(*args, **kwargs):
+        with rpc_priority(priority):
+            return await func(*args, **kwargs)
+
+    prioritized.__name__ = func.__name__
+    return prioritized
+
+
+class TokenBucket:
+    """
+    Rate limit: rate calls per second on average, up to burst calls at once
+
+    :param rate: tokens added per second, 0 disables limit
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self, now: float = None) -> float:
+        """Take one token. :return: 0 if it is taken, else seconds until the next token"""
+        if not self.rate:
+            return 0
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RpcScheduler:
+    """
+    Queue of node calls by priority classes.
+
+    Calls are started while node has less than max_in_flight calls of this process and its token
+    bucket has tokens. Next call is taken from the class which received least service relative to its
+    weight (stride scheduling), so broadcast overtakes thousands of queued backfill calls, while
+    backfill is still never starved. Queue depth and wait time are exported by classes.
+
+    :param rate: calls per second to one node, 0 disables limit
+    :param burst: calls to one node at once after idle time
+    :param max_in_flight: calls sent to node and not answered yet. Node answers in order, so this is
+        how many calls broadcast can wait for
+    """
+
+    def __init__(
+        self,
+        rate: float = 0,
+        burst: int = 100,
+        max_in_flight: int = 16,
+        weights: dict = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.in_flight = 0
+        self._buckets = {}
+        self._queues = {priority: deque() for priority in RpcPriority}
+        self._passes = {priority: 0.0 for priority in RpcPriority}
+        self._vtime = 0.0
+        self._timer = None
+
+    def depth(self, priority: RpcPriority) -> int:
+        return len(self._queues[priority])
+
+    async def call(
+        self, node: str, func, *args, priority: RpcPriority = None, **kwargs
+    ):
+        """Wait for turn of call to node, then await func(*args, **kwargs)"""
+        priority = current_priority() if priority is None else priority
+        queue = self._queues[priority]
+        if not queue:
+            # Class which was idle does not get credit for idle time
+            self._passes[priority] = max(self._passes[priority], self._vtime)
+
+        turn = asyncio.get_event_loop().create_future()
+        queue.append((node, turn))
+        enqueued_at = time.monotonic()
+        self._report_depth(priority)
+        self._dispatch()
+
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                self._release()
+            raise
+        self._report_wait(priority, time.monotonic() - enqueued_at)
+
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Start queued calls while there are free slots and tokens"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self.in_flight < self.max_in_flight:
+            priority = self._next_priority()
+            if priority is None:
+                return
+            queue = self._queues[priority]
+            node, turn = queue[0]
+            if turn.done():
+                # Caller was cancelled while waiting
+                queue.popleft()
+                self._report_depth(priority)
+                continue
+
+            delay = self._bucket(node).take()
+            if delay:
+                self._timer = asyncio.get_event_loop().call_later(delay, self._dispatch)
+                return
+
+            queue.popleft()
+            self._report_depth(priority)
+            self._vtime = self._passes[priority]
+            self._passes[priority] += 1 / self.weights[priority]
+            self.in_flight += 1
+            turn.set_result(None)
+
+    def _next_priority(self) -> RpcPriority or None:
+        waiting = [priority for priority, queue in self._queues.items() if queue]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda priority: (self._passes[priority], priority))
+
+    def _bucket(self, node: str) -> TokenBucket:
+        bucket = self._buckets.get(node)
+        if bucket is None:
+            bucket = self._buckets[node] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _report_depth(self, priority: RpcPriority) -> None:
+        metrics.set(
+            "rpc_queue_depth",
+            len(self._queues[priority]),
+            priority=priority.name.lower(),
+        )
+
+    def _report_wait(self, priority: RpcPriority, seconds: float) -> None:
+        name = priority.name.lower()
+        metrics.inc("rpc_calls_total", priority=name)
+        metrics.inc("rpc_wait_seconds_total", seconds, priority=name)
+        metrics.set("rpc_wait_seconds", round(seconds, 6), priority=name)
+
+
+_shared_scheduler: RpcScheduler = None
+
+
+def set_shared_scheduler(scheduler: RpcScheduler or None) -> None:
+    global _shared_scheduler
+    _shared_scheduler = scheduler
+
+
+def shared_scheduler() -> RpcScheduler or None:
+    return _shared_scheduler
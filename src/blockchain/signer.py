@@ -0,0 +1,87 @@
+"""Transaction signing and hashing in worker processes, out of the event loop"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from bitsharesbase.account import PrivateKey
+from bitsharesbase.signedtransactions import Signed_Transaction
+
+# Hashing one transaction is cheaper than sending it to worker process
+INLINE_HASH_LIMIT = 8
+
+# Worker process state, filled once by _init_worker
+_worker_keys = {}
+_worker_chain = {}
+
+
+def _with_prefix(tx: dict, prefix: str) -> dict:
+    """Copy of transaction with operations prefix. Python-bitshares need it to parse memo public keys"""
+    tx = dict(tx)
+    tx["operations"] = [[op[0], dict(op[1], prefix=prefix)] for op in tx["operations"]]
+    return tx
+
+
+def _init_worker(keys: list, chain: dict) -> None:
+    _worker_chain.update(chain)
+    for wif in keys:
+        _worker_keys[str(PrivateKey(wif, prefix=chain["prefix"]).pubkey)] = wif
+
+
+def _sign(tx: dict, pubkeys: list) -> tuple:
+    signed_tx = Signed_Transaction(_with_prefix(tx, _worker_chain["prefix"]))
+    signed_tx.sign([_worker_keys[pubkey] for pubkey in pubkeys], chain=_worker_chain)
+    signed_json = dict(tx, signatures=signed_tx.json()["signatures"])
+    return signed_tx.id, signed_json
+
+
+def _tx_ids(txs: list, prefix: str) -> list:
+    return [Signed_Transaction(_with_prefix(tx, prefix)).id for tx in txs]
+
+
+class TransactionSigner:
+    """
+    Pool of worker processes which sign and hash transactions.
+
+    Private keys are sent to every worker once, at its start. Signing is pure python elliptic curve math
+    and takes tens of milliseconds, so in the event loop it would freeze every other coroutine.
+
+    :param keys: WIF private keys
+    :param chain: chain params of connected node, like instance.rpc.chain_params
+    :param workers: number of processes, os.cpu_count() by default
+    """
+
+    def __init__(self, keys: list, chain: dict, workers: int = None):
+        self.chain = dict(chain)
+        self.pubkeys = {
+            wif: str(PrivateKey(wif, prefix=self.chain["prefix"]).pubkey)
+            for wif in keys
+        }
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(keys, self.chain)
+        )
+
+    async def sign(self, tx: dict, wifs: list) -> tuple:
+        """
+        Sign constructed transaction with given keys. Only public keys are sent to workers
+
+        :return: transaction ID and signed transaction
+        """
+        missing = [wif for wif in wifs if wif not in self.pubkeys]
+        if missing:
+            raise KeyError(f"Signer was started without {len(missing)} of given keys")
+
+        pubkeys = [self.pubkeys[wif] for wif in wifs]
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, _sign, tx, pubkeys)
+
+    async def tx_ids(self, txs: list) -> list:
+        """IDs of transactions, for example transactions of block"""
+        if len(txs) < INLINE_HASH_LIMIT:
+            return _tx_ids(txs, self.chain["prefix"])
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, _tx_ids, txs, self.chain["prefix"]
+        )
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
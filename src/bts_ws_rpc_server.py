@@ -1,7 +1,20 @@
 """Some example of gateway's handlers.
 You can change, add and remove handlers depending on gateway's architecture"""
 
-import json
+import asyncio
+import os
+import threading
+from datetime import datetime
+
+from aiohttp_json_rpc.exceptions import (
+    RpcGenericServerDefinedError,
+    RpcInternalError,
+    RpcInvalidParamsError,
+    RpcInvalidRequestError,
+    RpcMethodNotFoundError,
+    RpcParseError,
+)
+from aiohttp_json_rpc.protocol import JsonRpcMsg, JsonRpcMsgTyp
 
 from booker.finteh_proto.server import BaseServer
 from booker.finteh_proto.dto import (
@@ -11,57 +24,255 @@ from booker.finteh_proto.dto import (
     ValidateAddressDTO,
 )
 
-from src.db_utils.queries import insert_operation, BitsharesOperation
+from src import codec
+from src.metrics import metrics
+from src.db_utils.insert_batcher import InsertBatcher
 from src.gw_dto import TxStatus, OrderType
+from src.op_record import OpRecord
+from src.utils import amount_to_units
+
+# Server defined JSON-RPC error: too many requests in flight, client should retry later
+OVERLOADED_ERROR_CODE = -32000
+DEFAULT_MAX_IN_FLIGHT = 1000
+
+# Schemas are stateless, so they are built once instead of on every request.
+# Only requests are loaded by them, responses are gateway's own DTOs and are encoded by codec directly
+order_schema = OrderDTO.Schema()
+deposit_address_schema = DepositAddressDTO.Schema()
+validate_address_schema = ValidateAddressDTO.Schema()
 
 
 class BtsWsRPCServer(BaseServer):
     def __init__(self, host="0.0.0.0", port=8080, ctx=None):
         super(BtsWsRPCServer, self).__init__(host, port, ctx)
 
+        self.max_in_flight = (
+            ctx.cfg.rpc_max_in_flight if ctx is not None else DEFAULT_MAX_IN_FLIGHT
+        )
+        self.in_flight = 0
+        self.insert_batcher = InsertBatcher()
+
         self.add_methods(
             ("", self.validate_address),
             ("", self.get_deposit_address),
             ("", self.init_new_tx),
         )
 
+        if ctx is not None and ctx.cfg.admin_rpc:
+            self.add_methods(
+                ("", self.get_metrics),
+                ("", self.get_health),
+                ("", self.get_loop_stats),
+                ("", self.get_scheduler_stats),
+                ("", self.start_profiling),
+                ("", self.stop_profiling),
+                ("", self.dump_profile),
+            )
+
+    async def _handle_rpc_msg(self, http_request, raw_msg):
+        """
+        Decode message by fast codec, handle single request or JSON-RPC batch array. Requests over
+        max_in_flight get explicit overload error instead of queueing without limit.
+
+        aiohttp_json_rpc has no public hook for batches, so its private method is overridden and the
+        library is pinned to exact version, covered by tests/test_bts_ws_rpc_server.py
+        """
+        try:
+            msg = codec.loads(raw_msg.data)
+        except ValueError:
+            await self._ws_send_str(
+                http_request,
+                codec.encode_error(RpcParseError.ERROR_CODE, RpcParseError.MESSAGE),
+            )
+            return
+
+        is_batch = isinstance(msg, list)
+        items = msg if is_batch else [msg]
+        if not items:
+            await self._ws_send_str(
+                http_request,
+                codec.encode_error(
+                    RpcInvalidRequestError.ERROR_CODE, RpcInvalidRequestError.MESSAGE
+                ),
+            )
+            return
+
+        if self.in_flight + len(items) > self.max_in_flight:
+            metrics.inc("rpc_overloaded_total", len(items))
+            responses = [
+                codec.encode_error(
+                    OVERLOADED_ERROR_CODE,
+                    "Server is overloaded, retry later",
+                    item.get("id") if isinstance(item, dict) else None,
+                )
+                for item in items
+            ]
+        else:
+            self.in_flight += len(items)
+            try:
+                if is_batch:
+                    metrics.inc("rpc_batch_requests_total")
+                    # Items are handled concurrently, so init_new_tx of the whole batch is one insert
+                    responses = await asyncio.gather(
+                        *(self._dispatch(http_request, item) for item in items)
+                    )
+                else:
+                    responses = [await self._dispatch(http_request, msg)]
+            finally:
+                self.in_flight -= len(items)
+
+        # Notifications have no responses
+        responses = [response for response in responses if response is not None]
+        if responses:
+            await self._ws_send_str(
+                http_request, f"[{','.join(responses)}]" if is_batch else responses[0]
+            )
+
+    async def _dispatch(self, http_request, msg) -> str or None:
+        """Call method of one request object and return encoded response"""
+        msg_id = msg.get("id") if isinstance(msg, dict) else None
+        if (
+            not isinstance(msg, dict)
+            or msg.get("jsonrpc") != "2.0"
+            or not isinstance(msg.get("method", ""), str)
+        ):
+            return codec.encode_error(
+                RpcInvalidRequestError.ERROR_CODE,
+                RpcInvalidRequestError.MESSAGE,
+                msg_id,
+            )
+
+        if "method" not in msg:
+            # Client's response to server request
+            if "result" in msg and msg_id in http_request.pending:
+                http_request.pending[msg_id].set_result(msg["result"])
+            return None
+
+        method = http_request.methods.get(msg["method"])
+        if method is None:
+            return codec.encode_error(
+                RpcMethodNotFoundError.ERROR_CODE,
+                RpcMethodNotFoundError.MESSAGE,
+                msg_id,
+            )
+
+        msg.setdefault("params", None)
+        msg.setdefault("id", None)
+        try:
+            result = await method(
+                http_request=http_request,
+                rpc=self,
+                msg=JsonRpcMsg(JsonRpcMsgTyp.REQUEST, msg),
+            )
+        except (
+            RpcGenericServerDefinedError,
+            RpcInvalidRequestError,
+            RpcInvalidParamsError,
+        ) as error:
+            return codec.encode_error(
+                error.error_code, error.message, msg_id, error.data
+            )
+        except Exception as error:
+            self.logger.error(error, exc_info=True)
+            return codec.encode_error(
+                RpcInternalError.ERROR_CODE, RpcInternalError.MESSAGE, msg_id
+            )
+
+        if msg_id is None:
+            return None
+        if getattr(method.method, "raw_response", False):
+            return result
+        try:
+            return codec.encode_result(msg_id, result)
+        except TypeError as error:
+            self.logger.error(error, exc_info=True)
+            return codec.encode_error(
+                RpcInternalError.ERROR_CODE, RpcInternalError.MESSAGE, msg_id
+            )
+
     async def init_new_tx(self, request):
-        order = OrderDTO.Schema().load(request.msg[1]["params"])
+        order = order_schema.load(request.msg[1]["params"])
 
         out_tx = order.out_tx
         out_tx.max_confirmations = self.ctx.cfg.max_confirmations
-        out_tx.from_address = self.ctx.cfg.account
-
-        async with self.ctx.db.acquire() as conn:
-            insert = await insert_operation(
-                conn,
-                BitsharesOperation(
-                    order_id=order.order_id,
-                    order_type=OrderType.DEPOSIT,
-                    asset=out_tx.coin,
-                    from_account=out_tx.from_address,
-                    to_account=out_tx.to_address,
-                    amount=out_tx.amount,
-                    status=TxStatus.WAIT,
-                ),
-            )
+        tenant = self.ctx.get_tenant_by_asset(out_tx.coin)
+        if tenant is None:
+            # Rejected before anything is written, never sent with asset of another tenant
+            raise RpcInvalidParamsError(message=f"Coin {out_tx.coin} is not served")
+        out_tx.from_address = tenant.account
+
+        try:
+            amount = amount_to_units(out_tx.amount, tenant.asset_precision)
+        except ValueError as ex:
+            raise RpcInvalidParamsError(message=str(ex))
+
+        # Concurrent requests are written by one multi-row insert
+        await self.insert_batcher.insert(
+            self.ctx.db,
+            OpRecord(
+                order_id=order.order_id,
+                order_type=OrderType.DEPOSIT,
+                asset=out_tx.coin,
+                from_account=out_tx.from_address,
+                to_account=out_tx.to_address,
+                amount=amount,
+                status=TxStatus.WAIT,
+            ),
+        )
+
+        # Do not let broadcast loop sleep through idle backoff
+        self.ctx.block_scheduler.wake("broadcast_transactions")
 
-        return self.jsonrpc_response(request, out_tx)
+        return out_tx
 
     async def get_deposit_address(self, request):
         # Do not forget to overwrite this method to implement returning real deposit address
-        deposit_address_body = DepositAddressDTO.Schema().load(request.msg[1]["params"])
+        deposit_address_body = deposit_address_schema.load(request.msg[1]["params"])
         assert deposit_address_body.user
         deposit_address_body.deposit_address = self.ctx.cfg.account
-        return self.jsonrpc_response(request, deposit_address_body)
+        return deposit_address_body
 
     async def validate_address(self, request):
         # Do not forget to overwrite this method to implement gateway side blockchain address validation
-        validate_address_body = ValidateAddressDTO.Schema().load(
-            request.msg[1]["params"]
-        )
+        validate_address_body = validate_address_schema.load(request.msg[1]["params"])
 
         assert validate_address_body.user
         validate_address_body.is_valid = True
 
-        return self.jsonrpc_response(request, validate_address_body)
+        return validate_address_body
+
+    async def get_metrics(self, request):
+        return metrics.snapshot()
+
+    async def get_health(self, request):
+        return self.ctx.supervisor.health()
+
+    async def get_loop_stats(self, request):
+        return self.ctx.loop_monitor.stats()
+
+    async def get_scheduler_stats(self, request):
+        return self.ctx.block_scheduler.stats()
+
+    async def start_profiling(self, request):
+        params = request.msg[1].get("params") or {}
+        self.ctx.profiler.interval = float(
+            params.get("interval", self.ctx.profiler.interval)
+        )
+        self.ctx.profiler.start(asyncio.get_event_loop(), threading.get_ident())
+        return {"running": True, "interval": self.ctx.profiler.interval}
+
+    async def stop_profiling(self, request):
+        self.ctx.profiler.stop()
+        return await self.dump_profile(request)
+
+    async def dump_profile(self, request):
+        """Write profile collected so far to profile_dir. Profiling is not stopped"""
+        profile_dir = self.ctx.cfg.profile_dir
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(
+            profile_dir, f"profile-{datetime.utcnow():%Y%m%d-%H%M%S}.folded"
+        )
+        samples = await asyncio.get_event_loop().run_in_executor(
+            None, self.ctx.profiler.dump, path
+        )
+        return {"path": path, "samples": samples, "running": self.ctx.profiler.running}
@@ -0,0 +1,59 @@
+"""Snapshot of in-memory caches in local msgpack file, so restarted gateway begins with warm caches"""
+import os
+
+import msgpack
+
+from src.utils import get_logger
+
+log = get_logger("CacheSnapshot")
+
+SNAPSHOT_VERSION = 1
+
+
+class CacheSnapshot:
+    """
+    File with header and named sections of caches.
+
+    Header tells which chain snapshot belongs to and the moment it was taken: head block and database
+    cursors. Snapshot of other chain or format version is ignored as a whole, every section is
+    validated by its owner on restore. File is replaced atomically, so crash while saving leaves
+    previous snapshot.
+
+    :param path: snapshot file, empty path disables snapshots
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def save(self, header: dict, sections: dict) -> int:
+        """:return: size of snapshot in bytes"""
+        if not self.path:
+            return 0
+        data = msgpack.packb(
+            {"version": SNAPSHOT_VERSION, "header": header, "sections": sections},
+            use_bin_type=True,
+        )
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        return len(data)
+
+    def load(self, chain_id: str) -> tuple:
+        """:return: header and sections of valid snapshot, or two empty dicts"""
+        if not self.path or not os.path.isfile(self.path):
+            return {}, {}
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = msgpack.unpackb(f.read(), raw=False)
+        except (OSError, ValueError, msgpack.UnpackException) as ex:
+            log.warning("Cache snapshot %s is unreadable: %s", self.path, ex)
+            return {}, {}
+
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            log.info("Cache snapshot %s has other format version", self.path)
+            return {}, {}
+        if snapshot["header"].get("chain_id") != chain_id:
+            log.info("Cache snapshot %s was taken on other chain", self.path)
+            return {}, {}
+        return snapshot["header"], snapshot["sections"]
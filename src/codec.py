@@ -0,0 +1,76 @@
+"""
+JSON codec of WS RPC messages: orjson when it is installed, stdlib json otherwise.
+
+Gateway's own DTOs are trusted, so they are encoded directly, without marshmallow dump. Wire format
+is the same as marshmallow one: enums by name, UUID and Decimal as strings, datetime in ISO format.
+"""
+import dataclasses
+import json
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Names of dataclass fields by class, dataclasses.fields() is slow for hot path
+_fields_cache = {}
+
+
+def to_primitive(obj):
+    """Convert DTOs and enums to JSON types. Other types are left to JSON encoder"""
+    if isinstance(obj, dict):
+        return {key: to_primitive(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_primitive(value) for value in obj]
+    if isinstance(obj, Enum):
+        return obj.name
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        names = _fields_cache.get(obj.__class__)
+        if names is None:
+            names = [field.name for field in dataclasses.fields(obj)]
+            _fields_cache[obj.__class__] = names
+        return {name: to_primitive(getattr(obj, name)) for name in names}
+    return obj
+
+
+def _default(obj):
+    if isinstance(obj, (Decimal, UUID)):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps(obj) -> str:
+        return orjson.dumps(to_primitive(obj), default=_default).decode()
+
+    # Raises orjson.JSONDecodeError, which is ValueError as in stdlib
+    loads = orjson.loads
+
+
+else:
+
+    def dumps(obj) -> str:
+        return json.dumps(to_primitive(obj), default=_default)
+
+    def loads(data: str or bytes):
+        return json.loads(data)
+
+
+def encode_result(msg_id, result) -> str:
+    return dumps({"jsonrpc": "2.0", "id": msg_id, "result": result})
+
+
+def encode_error(code: int, message: str, msg_id=None, data=None) -> str:
+    msg = {"jsonrpc": "2.0", "error": {"code": code, "message": message}}
+    if msg_id is not None:
+        msg["id"] = msg_id
+    if data is not None:
+        msg["error"]["data"] = data
+    return dumps(msg)
@@ -1,10 +1,12 @@
+from copy import copy
 from os import getenv
 from pathlib import Path
 
 from dotenv import load_dotenv
 import yaml
 
-from src.utils import get_logger
+from src.logger import DEFAULT_LOG_FORMAT, set_log_format
+from src.utils import get_logger, amount_to_units
 
 log = get_logger("Config build")
 
@@ -12,6 +14,8 @@ project_root_dir = Path(__file__).parent.parent
 
 BITSHARES_BLOCK_TIME = 3
 BITSHARES_NEED_CONF = 5
+# python-bitshares default lifetime of transaction in seconds
+BITSHARES_TX_EXPIRATION = 30
 
 
 class Config:
@@ -47,8 +51,107 @@ class Config:
     max_deposit: float = 1
     max_withdrawal: float = 1
 
+    # Gateway asset as known by node, and limits above in its integer base units. Set by set_asset()
+    asset_id: str = None
+    asset_precision: int = None
+    min_deposit_units: int = None
+    min_withdrawal_units: int = None
+    max_deposit_units: int = None
+    max_withdrawal_units: int = None
+
     max_confirmations = BITSHARES_NEED_CONF
 
+    # "irreversible" counts confirmations by last irreversible block. "head" counts them by head block
+    # and tracks forks to roll operations back: faster deposits, but forks risk is on the gateway
+    confirmation_mode: str = "irreversible"
+
+    # Finalized operations are moved to archive table by batches
+    archive_interval: int = 60
+    archive_batch_size: int = 1000
+
+    # Loops read operations from database by chunks of this size, so large backlog is streamed
+    query_chunk_size: int = 500
+
+    # Expected number of saved operations. Bloom filter of their IDs lets history replay skip them
+    op_filter_capacity: int = 1000000
+
+    # Caches are saved to this file periodically and on shutdown, and loaded at start. Empty path disables it
+    cache_snapshot_path: str = "cache.snapshot"
+    cache_snapshot_interval: int = 300
+
+    # Loops wake up after every new block while they have work, idle loops back off up to this many blocks
+    scheduler_max_idle_blocks: int = 8
+
+    # Processes signing and hashing transactions out of event loop, one per CPU core by default
+    signing_workers: int = None
+
+    # Node API calls are scheduled by priority: broadcast, confirmation, live history, backfill.
+    # Calls per second to one node (0 is unlimited), calls at once after idle time, and calls waiting
+    # for node response, so broadcast is never queued behind more of them
+    node_rate_limit: float = 0
+    node_burst: int = 100
+    node_max_in_flight: int = 16
+
+    # WS RPC requests handled at the same time. Requests over the limit get overload error
+    rpc_max_in_flight: int = 1000
+
+    # Event loop blocked longer than this, in seconds, is logged with the stack of blocking code
+    slow_callback_threshold: float = 0.1
+
+    # Admin WS RPC methods: loop stats and runtime profiling. Profiles are written to profile_dir
+    admin_rpc: bool = False
+    profile_dir: str = "profiles"
+
+    # Additional (account, asset) pairs served by the same process. Every item overrides
+    # top-level gateway.yml values, so only differences have to be listed
+    gateways: list = []
+
+    _optional_gateway_yml_params = (
+        "confirmation_mode",
+        "archive_interval",
+        "archive_batch_size",
+        "query_chunk_size",
+        "scheduler_max_idle_blocks",
+        "op_filter_capacity",
+        "cache_snapshot_path",
+        "cache_snapshot_interval",
+        "signing_workers",
+        "rpc_max_in_flight",
+        "node_rate_limit",
+        "node_burst",
+        "node_max_in_flight",
+        "slow_callback_threshold",
+        "admin_rpc",
+        "profile_dir",
+        "gateways",
+    )
+
+    def set_asset(self, asset_id: str, precision: int) -> None:
+        """Remember gateway asset and precompute amount limits in its base units"""
+        self.asset_id = asset_id
+        self.asset_precision = precision
+        for limit in ("min_deposit", "min_withdrawal", "max_deposit", "max_withdrawal"):
+            setattr(
+                self, f"{limit}_units", amount_to_units(getattr(self, limit), precision)
+            )
+
+    def tenants(self) -> list:
+        """Configs of all (account, asset) pairs served by this process. Self is always first"""
+        tenants = [self]
+        for overrides in self.gateways:
+            tenant = copy(self)
+            tenant.gateways = []
+            if overrides.get("account", self.account) != self.account:
+                tenant.keys = {}
+
+            for name, value in overrides.items():
+                if name.startswith("_") or not hasattr(Config, name):
+                    raise AttributeError(f"Unknown gateway parameter {name}")
+                setattr(tenant, name, value)
+
+            tenants.append(tenant)
+        return tenants
+
     def with_environment(self) -> None:
         try:
             """Using two files:
@@ -58,6 +161,8 @@ class Config:
 
             try:
                 load_dotenv()
+                # Loggers are created before .env is loaded
+                set_log_format(getenv("LOG_FORMAT", DEFAULT_LOG_FORMAT))
                 _env_params = {
                     "db_driver": getenv("DATABASE_DRIVER"),
                     "db_host": getenv("DATABASE_HOST"),
@@ -108,6 +213,10 @@ class Config:
 
                     setattr(self, name, value)
 
+                for name in self._optional_gateway_yml_params:
+                    if name in from_gateway_yml:
+                        setattr(self, name, from_gateway_yml[name])
+
                 if from_gateway_yml.get("keys"):
                     setattr(self, "keys", from_gateway_yml["keys"])
                     log.info("Using unencrypted keys from gateway.yml file")
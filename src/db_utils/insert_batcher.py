@@ -0,0 +1,73 @@
+"""Coalescing of concurrent operation inserts"""
+import asyncio
+
+from aiopg.sa import Engine
+
+from src.db_utils.queries import insert_operations, insert_operation
+from src.op_record import OpRecord
+from src.utils import get_logger
+
+log = get_logger("InsertBatcher")
+
+
+class InsertBatcher:
+    """
+    Group concurrent inserts of operations into one multi-row INSERT.
+
+    Inserts requested while previous batch is written to database are collected into the next batch,
+    so under load one round trip serves many requests. If batch fails, its operations are inserted
+    one by one, so only invalid operations fail.
+    """
+
+    def __init__(self, max_batch_size: int = 500):
+        self.max_batch_size = max_batch_size
+        self.pending = []
+        self._flushing = False
+
+    async def insert(self, db: Engine, operation: OpRecord) -> None:
+        future = asyncio.get_event_loop().create_future()
+        self.pending.append((operation, future))
+        if not self._flushing:
+            self._flushing = True
+            asyncio.ensure_future(self._flush(db))
+        await future
+
+    async def _flush(self, db: Engine) -> None:
+        try:
+            # Let concurrent requests of the same loop iteration, like items of RPC batch, join
+            await asyncio.sleep(0)
+            while self.pending:
+                batch = self.pending[: self.max_batch_size]
+                self.pending = self.pending[self.max_batch_size :]
+                try:
+                    await self._write(db, batch)
+                except Exception as ex:
+                    # Database is unreachable
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(ex)
+        finally:
+            self._flushing = False
+
+    @staticmethod
+    async def _write(db: Engine, batch: list) -> None:
+        async with db.acquire() as conn:
+            try:
+                await insert_operations(conn, [operation for operation, _ in batch])
+            except Exception as ex:
+                log.warning("Batch of %s inserts failed: %s", len(batch), ex)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+                return
+
+            for operation, future in batch:
+                try:
+                    await insert_operation(conn, operation)
+                except Exception as ex:
+                    if not future.done():
+                        future.set_exception(ex)
+                else:
+                    if not future.done():
+                        future.set_result(None)
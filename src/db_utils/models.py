@@ -20,8 +20,8 @@ class GatewayWallet(Base):
     last_operation = sa.Column(sa.Integer)
 
 
-class BitsharesOperation(Base):
-    __tablename__ = "bitshares_operations"
+class BitsharesOperationColumns:
+    """Columns shared by the hot operations table and its archive"""
 
     pk = sa.Column(sa.Integer, primary_key=True, index=True)
 
@@ -32,10 +32,12 @@ class BitsharesOperation(Base):
     asset = sa.Column(sa.String)
     from_account = sa.Column(sa.String)
     to_account = sa.Column(sa.String)
-    amount = sa.Column(sa.Numeric)
+    # Integer base units of asset, human readable amount is amount / 10 ** asset precision
+    amount = sa.Column(sa.BigInteger)
 
     status = sa.Column(sa.Enum(TxStatus))
     confirmations = sa.Column(sa.Integer)
+    irreversible_confirmations = sa.Column(sa.Integer)
     block_num = sa.Column(sa.Integer)
 
     tx_hash = sa.Column(sa.String)
@@ -45,3 +47,17 @@ class BitsharesOperation(Base):
     error = sa.Column(sa.Enum(TxError))
 
     memo = sa.Column(sa.String)
+
+
+class BitsharesOperation(BitsharesOperationColumns, Base):
+    """Operations that gateway loops still work with"""
+
+    __tablename__ = "bitshares_operations"
+
+
+class BitsharesOperationArchive(BitsharesOperationColumns, Base):
+    """Finalized operations moved out of bitshares_operations by archive_operations"""
+
+    __tablename__ = "bitshares_operations_archive"
+
+    tx_hash = sa.Column(sa.String, index=True)
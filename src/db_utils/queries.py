@@ -1,10 +1,17 @@
+from contextlib import asynccontextmanager
+
 import aiopg.sa
 from aiopg.sa import SAConnection as SAConn, Engine
 from aiopg.sa.result import RowProxy
 
-from sqlalchemy.sql import insert, delete, update, select
-from src.db_utils.models import GatewayWallet, BitsharesOperation
+from sqlalchemy.sql import insert, delete, update, select, func
+from src.db_utils.models import (
+    GatewayWallet,
+    BitsharesOperation,
+    BitsharesOperationArchive,
+)
 from src.gw_dto import OrderType, TxStatus, TxError
+from src.op_record import OpRecord
 from src.utils import get_logger, object_as_dict
 
 from src.config import Config
@@ -14,6 +21,52 @@ cfg = Config()
 
 log = get_logger("Postgres")
 
+# Advisory lock key. Inserts of operations hold it shared and archiving holds it exclusively, so
+# operation is never moved to archive between the check of archive and insert into hot table
+OPERATIONS_LOCK_KEY = 0x6277_6F70
+
+
+class DuplicateOperationError(Exception):
+    """Operation with the same op_id or order_id is already moved to archive"""
+
+
+@asynccontextmanager
+async def operations_lock(conn: SAConn, shared: bool = True):
+    """Hold operations lock until the end of current transaction, starting one if there is none"""
+    lock = func.pg_advisory_xact_lock_shared if shared else func.pg_advisory_xact_lock
+    if conn.in_transaction:
+        await conn.execute(select([lock(OPERATIONS_LOCK_KEY)]))
+        yield
+        return
+    async with conn.begin():
+        await conn.execute(select([lock(OPERATIONS_LOCK_KEY)]))
+        yield
+
+
+async def check_not_archived(conn: SAConn, values: list) -> None:
+    """
+    Unique constraints of op_id and order_id hold in each table separately, so operations are checked
+    against archive before insert. Caller must hold operations_lock
+    """
+    op_ids = [v["op_id"] for v in values if v.get("op_id") is not None]
+    order_ids = [v["order_id"] for v in values if v.get("order_id") is not None]
+    if not op_ids and not order_ids:
+        return
+    cursor = await conn.execute(
+        select(
+            [BitsharesOperationArchive.op_id, BitsharesOperationArchive.order_id]
+        ).where(
+            BitsharesOperationArchive.op_id.in_(op_ids)
+            | BitsharesOperationArchive.order_id.in_(order_ids)
+        )
+    )
+    archived = await cursor.fetchall()
+    if archived:
+        raise DuplicateOperationError(
+            "Operations are already archived: "
+            + ", ".join(f"op_id {row[0]} order_id {row[1]}" for row in archived)
+        )
+
 
 async def init_database(cfg: Config) -> Engine:
     """Async engine to execute clients requests"""
@@ -76,39 +129,126 @@ async def delete_gateway_wallet(conn: SAConn, account_name: str):
     )
 
 
-async def get_unconfirmed_operations(conn: SAConn):
-    cursor = await conn.execute(
-        select([BitsharesOperation])
-        .where(BitsharesOperation.status == TxStatus.RECEIVED_NOT_CONFIRMED)
-        .as_scalar()
-    )
-    result = await cursor.fetchall()
-    return result
+# Conditions of operations which gateway loops work with
+UNCONFIRMED = BitsharesOperation.status == TxStatus.RECEIVED_NOT_CONFIRMED
+NEW_FOR_BOOKER = (BitsharesOperation.order_id == None) & (
+    BitsharesOperation.status != TxStatus.ERROR
+)
+# Unconfirmed operation without block was rolled back by fork
+ROLLED_BACK = BitsharesOperation.block_num == None
+PENDING = (
+    (BitsharesOperation.order_id != None)
+    & (BitsharesOperation.tx_hash == None)
+    & (BitsharesOperation.status == TxStatus.WAIT)
+)
+
+
+async def iter_operations(conn: SAConn, where, chunk_size: int = 500):
+    """
+    Yield operations matching where condition, reading them by chunks of chunk_size rows.
+
+    Chunks are paginated by primary key (pk > last seen pk), so every query is an index range scan,
+    memory holds one chunk only, and first operations are processed before the rest is read.
+    Operations changed by caller so they do not match condition anymore are not skipped or repeated.
+    """
+    last_pk = 0
+    while True:
+        cursor = await conn.execute(
+            select([BitsharesOperation])
+            .where(where & (BitsharesOperation.pk > last_pk))
+            .order_by(BitsharesOperation.pk)
+            .limit(chunk_size)
+        )
+        # Chunk is read before yielding, so caller can execute queries on the same connection
+        chunk = [OpRecord.from_row(row) for row in await cursor.fetchmany(chunk_size)]
+        for operation in chunk:
+            yield operation
+
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def iter_unconfirmed_operations(conn: SAConn, chunk_size: int = 500):
+    return iter_operations(conn, UNCONFIRMED, chunk_size)
+
+
+def iter_new_ops_for_booker(conn: SAConn, chunk_size: int = 500):
+    return iter_operations(conn, NEW_FOR_BOOKER, chunk_size)
+
+
+def iter_pending_operations(conn: SAConn, chunk_size: int = 500):
+    return iter_operations(conn, PENDING, chunk_size)
+
+
+async def iter_op_ids(conn: SAConn, chunk_size: int = 10000, after: int = -1):
+    """
+    Yield IDs of operations saved to hot and archive tables, by chunks of op_id index
+
+    :param after: yield only IDs greater than this one
+    """
+    for table in (BitsharesOperation, BitsharesOperationArchive):
+        last_op_id = after
+        while True:
+            cursor = await conn.execute(
+                select([table.op_id])
+                .where(table.op_id > last_op_id)
+                .order_by(table.op_id)
+                .limit(chunk_size)
+            )
+            chunk = [row[0] for row in await cursor.fetchmany(chunk_size)]
+            for op_id in chunk:
+                yield op_id
+
+            if len(chunk) < chunk_size:
+                break
+            last_op_id = chunk[-1]
 
 
 async def get_operation(conn: SAConn, op_id: int) -> RowProxy:
-    cursor = await conn.execute(
-        select([BitsharesOperation])
-        .where(BitsharesOperation.op_id == op_id)
-        .as_scalar()
-    )
-    result = await cursor.fetchone()
-    return result
+    """Look for operation in hot table first, then in archive"""
+    for table in (BitsharesOperation, BitsharesOperationArchive):
+        cursor = await conn.execute(
+            select([table]).where(table.op_id == op_id).as_scalar()
+        )
+        result = await cursor.fetchone()
+        if result is not None:
+            return result
 
 
-async def insert_operation(conn: SAConn, operation: BitsharesOperation):
+def operation_values(operation: OpRecord or BitsharesOperation) -> dict:
+    """Column values of operation record or ORM instance, without primary key"""
+    if isinstance(operation, OpRecord):
+        return operation.values()
     _operation = object_as_dict(operation)
     _operation.pop("pk")
-    await conn.execute(insert(BitsharesOperation).values(**_operation))
+    return _operation
+
+
+async def insert_operation(conn: SAConn, operation: OpRecord or BitsharesOperation):
+    """:raise DuplicateOperationError: if operation with the same op_id or order_id is archived"""
+    _operation = operation_values(operation)
+    async with operations_lock(conn):
+        await check_not_archived(conn, [_operation])
+        await conn.execute(insert(BitsharesOperation).values(**_operation))
+
 
+async def insert_operations(conn: SAConn, operations: list) -> None:
+    """Insert many operations by one multi-row INSERT. Nothing is inserted if any of them is archived"""
+    values = [operation_values(operation) for operation in operations]
+    async with operations_lock(conn):
+        await check_not_archived(conn, values)
+        await conn.execute(insert(BitsharesOperation).values(values))
 
-async def add_operation(conn: SAConn, operation: BitsharesOperation):
+
+async def add_operation(conn: SAConn, operation: OpRecord or BitsharesOperation):
     isolation_level = "SERIALIZABLE"
     sql_tx = await conn.begin(isolation_level=isolation_level)
     try:
-        _operation = object_as_dict(operation)
-        _operation.pop("pk")
-        await conn.execute(insert(BitsharesOperation).values(**_operation))
+        _operation = operation_values(operation)
+        async with operations_lock(conn):
+            await check_not_archived(conn, [_operation])
+            await conn.execute(insert(BitsharesOperation).values(**_operation))
         operation_db_instance = await get_operation(conn, op_id=_operation["op_id"])
 
         if operation_db_instance.order_type is OrderType.DEPOSIT:
@@ -126,10 +266,9 @@ async def add_operation(conn: SAConn, operation: BitsharesOperation):
 
 
 async def update_operation(
-    conn: SAConn, operation: BitsharesOperation, where_key, where_value
+    conn: SAConn, operation: OpRecord or BitsharesOperation, where_key, where_value
 ) -> None:
-    _operation = object_as_dict(operation)
-    _operation.pop("pk")
+    _operation = operation_values(operation)
     if where_key == BitsharesOperation.order_id:
         _operation.pop("order_id")
     if where_key == BitsharesOperation.op_id:
@@ -142,38 +281,135 @@ async def update_operation(
     await conn.execute(q)
 
 
-async def get_new_ops_for_booker(conn: SAConn) -> RowProxy:
+async def get_operation_by_hash(conn: SAConn, tx_hash):
+    """Look for operation in hot table first, then in archive"""
+    for table in (BitsharesOperation, BitsharesOperationArchive):
+        cursor = await conn.execute(
+            select([table]).where(table.tx_hash == tx_hash).as_scalar()
+        )
+        result = await cursor.fetchone()
+        if result is not None:
+            return result
+
+
+async def archive_operations(
+    conn: SAConn, batch_size: int = 1000, max_block_num: int = None
+) -> int:
+    """
+    Move one batch of finalized operations from bitshares_operations to bitshares_operations_archive.
+
+    Operation is finalized when it is in ERROR status or it is RECEIVED_AND_CONFIRMED and booker
+    already knows about it (order_id is set). Rows are moved in a single statement, so operation is
+    always present in exactly one of tables.
+
+    :param max_block_num: do not archive confirmed operations from newer blocks, because they still can
+                          be rolled back by fork in head confirmation mode
+
+    :return: number of moved operations
+    """
+    confirmed = (BitsharesOperation.status == TxStatus.RECEIVED_AND_CONFIRMED) & (
+        BitsharesOperation.order_id != None
+    )
+    if max_block_num is not None:
+        confirmed &= BitsharesOperation.block_num <= max_block_num
+
+    finalized = (
+        select([BitsharesOperation.pk])
+        .where((BitsharesOperation.status == TxStatus.ERROR) | confirmed)
+        .order_by(BitsharesOperation.pk)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    columns = [c.name for c in BitsharesOperation.__table__.columns]
+    moved = (
+        delete(BitsharesOperation)
+        .where(BitsharesOperation.pk.in_(finalized))
+        .returning(*BitsharesOperation.__table__.columns)
+        .cte("moved")
+    )
+    # Inserts wait, so they see archived operation when they check archive
+    async with operations_lock(conn, shared=False):
+        result = await conn.execute(
+            insert(BitsharesOperationArchive).from_select(
+                columns, select([moved.c[name] for name in columns])
+            )
+        )
+    return result.rowcount
+
+
+async def rollback_operations(conn: SAConn, from_block_num: int) -> list:
+    """
+    Return operations from orphaned blocks to RECEIVED_NOT_CONFIRMED status. Their block is forgotten,
+    operation is confirmed again only after its transaction is found in current chain
+
+    :return: rolled back operations
+    """
     cursor = await conn.execute(
-        select([BitsharesOperation])
+        update(BitsharesOperation)
+        .values(
+            {
+                BitsharesOperation.status: TxStatus.RECEIVED_NOT_CONFIRMED,
+                BitsharesOperation.confirmations: 0,
+                BitsharesOperation.irreversible_confirmations: 0,
+                BitsharesOperation.block_num: None,
+            }
+        )
         .where(
-            (BitsharesOperation.order_id == None)
-            & (BitsharesOperation.status != TxStatus.ERROR)
+            (BitsharesOperation.block_num >= from_block_num)
+            & BitsharesOperation.status.in_(
+                [TxStatus.RECEIVED_NOT_CONFIRMED, TxStatus.RECEIVED_AND_CONFIRMED]
+            )
         )
-        .as_scalar()
+        .returning(*BitsharesOperation.__table__.columns)
     )
-    result = await cursor.fetchall()
-    return result
+    return [OpRecord.from_row(row) for row in await cursor.fetchall()]
 
 
-async def get_pending_operations(conn: SAConn) -> RowProxy:
+async def get_rolled_back_operations(conn: SAConn) -> list:
+    """Operations rolled back by fork, which transactions are not found in current chain yet"""
+    cursor = await conn.execute(
+        select([BitsharesOperation]).where(UNCONFIRMED & ROLLED_BACK)
+    )
+    return [OpRecord.from_row(row) for row in await cursor.fetchall()]
+
+
+async def get_broadcast_operations(conn: SAConn) -> list:
+    """Operations which transactions are broadcast, but not found in account history yet"""
     cursor = await conn.execute(
         select([BitsharesOperation])
         .where(
             (BitsharesOperation.order_id != None)
-            & (BitsharesOperation.tx_hash == None)
+            & (BitsharesOperation.tx_hash != None)
+            & (BitsharesOperation.tx_expiration != None)
             & (BitsharesOperation.status == TxStatus.WAIT)
         )
         .as_scalar()
     )
-    result = await cursor.fetchall()
-    return result
+    return [OpRecord.from_row(row) for row in await cursor.fetchall()]
 
 
-async def get_operation_by_hash(conn: SAConn, tx_hash):
-    cursor = await conn.execute(
-        select([BitsharesOperation])
-        .where(BitsharesOperation.tx_hash == tx_hash)
-        .as_scalar()
+async def mark_operation_included(conn: SAConn, order_id, block_num: int) -> None:
+    await conn.execute(
+        update(BitsharesOperation)
+        .values({BitsharesOperation.block_num: block_num})
+        .where(BitsharesOperation.order_id == order_id)
     )
-    result = await cursor.fetchone()
-    return result
+
+
+async def requeue_operation(conn: SAConn, order_id) -> bool:
+    """Forget expired transaction of WAIT operation, so it will be broadcast again"""
+    result = await conn.execute(
+        update(BitsharesOperation)
+        .values(
+            {
+                BitsharesOperation.tx_hash: None,
+                BitsharesOperation.tx_expiration: None,
+                BitsharesOperation.block_num: None,
+            }
+        )
+        .where(
+            (BitsharesOperation.order_id == order_id)
+            & (BitsharesOperation.status == TxStatus.WAIT)
+        )
+    )
+    return result.rowcount == 1
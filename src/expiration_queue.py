@@ -0,0 +1,84 @@
+"""Min-heap timer of broadcast transactions expiration"""
+import asyncio
+import heapq
+import itertools
+from datetime import datetime
+
+
+class ExpirationQueue:
+    """
+    Keep items ordered by time and wake up exactly when the earliest of them is due.
+
+    Nothing is polled: waiter sleeps until the earliest time or until an earlier item is pushed.
+    Times are naive UTC datetimes, same as BitShares transaction expiration.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._changed = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def changed(self) -> asyncio.Event:
+        # Created lazily to bind with running event loop
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        return self._changed
+
+    def push(self, key, when: datetime, value=None) -> None:
+        """Add item or reschedule item with the same key"""
+        entry = (when, next(self._counter), key)
+        self._entries[key] = (entry, value)
+        heapq.heappush(self._heap, entry)
+        self.changed.set()
+
+    def discard(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def next_time(self) -> datetime or None:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime = None) -> list:
+        """Remove and return (key, value) of all items which time has come"""
+        now = datetime.utcnow() if not now else now
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            _, value = self._entries.pop(entry[2])
+            due.append((entry[2], value))
+            self._drop_stale()
+        return due
+
+    async def wait_due(self) -> list:
+        """Sleep until at least one item is due and return (key, value) of all due items"""
+        while True:
+            self.changed.clear()
+            next_time = self.next_time()
+            timeout = None
+            if next_time is not None:
+                timeout = (next_time - datetime.utcnow()).total_seconds()
+                if timeout <= 0:
+                    return self.pop_due()
+
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _drop_stale(self):
+        """Heap entries of discarded or rescheduled items are removed lazily"""
+        while self._heap:
+            entry = self._heap[0]
+            current = self._entries.get(entry[2])
+            if current is not None and current[0] == entry:
+                return
+            heapq.heappop(self._heap)
@@ -13,6 +13,7 @@ from booker.finteh_proto.dto import (
     TransactionDTO,
     OrderDTO,
 )
+from src.utils import units_to_amount
 
 
 class DTOInvalidType(Exception):
@@ -55,10 +56,12 @@ class BitSharesOperation(DataTransferClass):
     asset: str = None
     from_account: str = None
     to_account: str = None
-    amount: Amount = None
+    # Integer base units of asset, converted to Amount only for booker
+    amount: int = None
 
     status: TxStatus = None
     confirmations: int = None
+    irreversible_confirmations: int = None
     block_num: int = None
 
     tx_hash: str = None
@@ -70,12 +73,12 @@ class BitSharesOperation(DataTransferClass):
     memo: str = None
 
 
-def op_to_order(op_dto: BitSharesOperation):
+def op_to_order(op_dto: BitSharesOperation, precision: int):
     BITSHARES_NEED_CONF = 5  # TODO replace with context
 
     tx = TransactionDTO(
         coin=op_dto.asset,
-        amount=op_dto.amount,
+        amount=units_to_amount(op_dto.amount, precision),
         from_address=op_dto.from_account,
         to_address=op_dto.to_account,
         created_at=op_dto.tx_created_at,
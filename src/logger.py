@@ -0,0 +1,176 @@
+"""
+Non-blocking logging: records are put to a queue in the caller thread and formatted and written
+to stderr by a single listener thread, so logging I/O never stalls the event loop.
+"""
+import atexit
+import json
+import logging
+import queue
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from os import getenv
+
+# "text" or "json". Loggers are created at import time, before Config loads .env, so format of
+# process environment is used until Config calls set_log_format() with value of .env
+DEFAULT_LOG_FORMAT = "text"
+
+# Records are dropped, not waited for, if the writer thread falls this far behind
+LOG_QUEUE_SIZE = 10000
+
+# Records logged with extra=RATE_LIMITED are emitted at most LOG_RATE_LIMIT times per logger and
+# message template in LOG_RATE_INTERVAL seconds, the rest are counted and reported with the next
+# passed record. Only repetitive loop messages are marked, per-order records are never dropped
+LOG_RATE_LIMIT = 20
+LOG_RATE_INTERVAL = 10.0
+RATE_LIMITED = {"rate_limit": True}
+
+TEXT_FORMAT = "%(asctime)s|%(name)s|%(levelname)s|%(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.utcfromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for extra in ("suppressed", "dropped"):
+            if getattr(record, extra, None):
+                data[extra] = getattr(record, extra)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Former plain format, with counts of suppressed and dropped records appended"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        for extra in ("suppressed", "dropped"):
+            if getattr(record, extra, None):
+                line += f"|{extra} {getattr(record, extra)}"
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Pass limited number of records per logger and message template in time interval. Only records
+    marked by extra=RATE_LIMITED are limited, others always pass.
+
+    Key is the unformatted message, so repetitive messages must use lazy %-style arguments:
+    log.info("Found new %s operations", count, extra=RATE_LIMITED)
+    """
+
+    def __init__(
+        self, limit: int = LOG_RATE_LIMIT, interval: float = LOG_RATE_INTERVAL
+    ):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR or not getattr(record, "rate_limit", False):
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        started, passed, suppressed = self._windows.get(key, (now, 0, 0))
+        if now - started >= self.interval:
+            if suppressed:
+                record.suppressed = suppressed
+            self._windows[key] = (now, 1, 0)
+            return True
+
+        if passed < self.limit:
+            self._windows[key] = (started, passed + 1, suppressed)
+            return True
+
+        self._windows[key] = (started, passed, suppressed + 1)
+        return False
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Put records to queue as is, without formatting them in the caller thread.
+
+    Message arguments are formatted later by listener thread, so they must not be mutated
+    after logging call. Records are dropped if queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped:
+            record.dropped = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+
+def _make_formatter(log_format: str) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    return TextFormatter(TEXT_FORMAT)
+
+
+def _build_handler() -> LazyQueueHandler:
+    global _stream_handler
+    stream_handler = _stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(
+        _make_formatter(getenv("LOG_FORMAT", DEFAULT_LOG_FORMAT))
+    )
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    # Flush records left in queue on exit
+    atexit.register(listener.stop)
+
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+    return handler
+
+
+_handler = None
+_stream_handler = None
+
+
+def set_log_format(log_format: str) -> None:
+    """Switch format of all loggers, "text" or "json" """
+    _build_handler_once()
+    _stream_handler.setFormatter(_make_formatter(log_format))
+
+
+def _build_handler_once() -> LazyQueueHandler:
+    global _handler
+    if _handler is None:
+        _handler = _build_handler()
+    return _handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger writing through shared queue. Safe to call many times with the same name"""
+    handler = _build_handler_once()
+
+    log = logging.getLogger(name)
+    log.setLevel(level=logging.INFO)
+    if handler not in log.handlers:
+        log.addHandler(handler)
+
+    return log
@@ -0,0 +1,44 @@
+"""In-process counters and gauges, read through admin WS RPC method get_metrics"""
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """
+    Registry of counters and gauges, keyed in Prometheus style: name{label="value"}.
+
+    Updates are plain dict operations, cheap enough for hot loops.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self.gauges[_key(name, labels)] = value
+
+    def get(self, name: str, **labels) -> float or None:
+        key = _key(name, labels)
+        return self.counters.get(key, self.gauges.get(key))
+
+    def snapshot(self) -> dict:
+        return {"counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        return "".join(
+            f"{key} {value}\n"
+            for key, value in sorted({**self.counters, **self.gauges}.items())
+        )
+
+
+# Shared registry of the process
+metrics = Metrics()
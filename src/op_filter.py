@@ -0,0 +1,69 @@
+"""Bloom filter of operation IDs which are already saved to database"""
+import math
+
+_MASK = (1 << 64) - 1
+
+
+class OpIdFilter:
+    """
+    Compact set of integer operation IDs without false negatives.
+
+    ID which is not in filter is surely new, so history loop validates it at once. ID in filter is
+    saved with probability 1 - false positive rate, and must be confirmed by unique op_id index in
+    database. Filter does not grow: when it holds more than capacity IDs, false positive rate goes up,
+    but answers stay correct.
+
+    :param capacity: expected number of IDs
+    :param error_rate: false positive rate at capacity
+    """
+
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.01):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, op_id: int) -> bool:
+        bits = self.bits
+        for position in self._positions(op_id):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, op_id: int) -> None:
+        bits = self.bits
+        for position in self._positions(op_id):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def state(self) -> dict:
+        """Plain data of filter, to save it in cache snapshot"""
+        return {
+            "size": self.size,
+            "hashes": self.hashes,
+            "count": self.count,
+            "bits": bytes(self.bits),
+        }
+
+    def restore(self, state: dict) -> bool:
+        """
+        Load bits saved by state(). Filter of other size, for other capacity, can not be loaded
+
+        :return: True if filter is loaded
+        """
+        if (state["size"], state["hashes"]) != (self.size, self.hashes):
+            return False
+        self.bits = bytearray(state["bits"])
+        self.count = state["count"]
+        return True
+
+    def _positions(self, op_id: int):
+        # Double hashing: k positions from two 64-bit mixes of ID. Second one is odd, so positions
+        # do not repeat when filter size is a power of two
+        h1 = (op_id * 0x9E3779B97F4A7C15) & _MASK
+        h2 = (((op_id ^ (op_id >> 31)) * 0xBF58476D1CE4E5B9) & _MASK) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
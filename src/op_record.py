@@ -0,0 +1,94 @@
+"""Compact record of gateway operation, used by gateway loops instead of DTOs and ORM instances"""
+
+# Columns of bitshares_operations table, in table order
+FIELDS = (
+    "pk",
+    "op_id",
+    "order_id",
+    "order_type",
+    "asset",
+    "from_account",
+    "to_account",
+    "amount",
+    "status",
+    "confirmations",
+    "irreversible_confirmations",
+    "block_num",
+    "tx_hash",
+    "tx_created_at",
+    "tx_expiration",
+    "error",
+    "memo",
+)
+
+_set = object.__setattr__
+
+
+class OpRecord:
+    """
+    Operation as plain slotted object: no instance dict, no SQLAlchemy instrumentation and no
+    marshmallow machinery. Marshmallow DTOs are built from it only at booker and WS RPC boundaries.
+
+    Record is immutable, changed copy is made by replace(). So record read from database can be
+    compared with or written instead of its updated copy, and nobody changes it under the loop.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            _set(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"Unknown operation fields: {', '.join(fields)}")
+
+    @classmethod
+    def from_row(cls, row) -> "OpRecord":
+        """Record of database row, like RowProxy of select([BitsharesOperation])"""
+        record = cls.__new__(cls)
+        for name in FIELDS:
+            _set(record, name, row[name])
+        return record
+
+    @classmethod
+    def from_object(cls, obj) -> "OpRecord":
+        """Record of object with operation attributes: DTO or ORM instance"""
+        record = cls.__new__(cls)
+        for name in FIELDS:
+            _set(record, name, getattr(obj, name, None))
+        return record
+
+    def replace(self, **changes) -> "OpRecord":
+        record = OpRecord.__new__(OpRecord)
+        for name in FIELDS:
+            _set(record, name, changes.pop(name, getattr(self, name)))
+        if changes:
+            raise TypeError(f"Unknown operation fields: {', '.join(changes)}")
+        return record
+
+    def values(self) -> dict:
+        """
+        Column values for INSERT and UPDATE, without primary key. These are fields of DTO as well:
+        BitSharesOperation(**record.values())
+        """
+        return {name: getattr(self, name) for name in FIELDS[1:]}
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"OpRecord is immutable, use replace({name}=...)")
+
+    def __delattr__(self, name):
+        raise AttributeError("OpRecord is immutable")
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}"
+            for name in FIELDS
+            if getattr(self, name) is not None
+        )
+        return f"OpRecord({fields})"
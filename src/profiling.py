@@ -0,0 +1,181 @@
+"""
+Event loop instrumentation: loop lag sampler, watchdog which logs the stack of blocking code,
+and sampling profiler which can be switched on and dumped at runtime.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from src.metrics import metrics
+from src.utils import get_logger
+
+log = get_logger("Profiling")
+
+
+def task_name(task: asyncio.Task or None) -> str:
+    """Name of coroutine running in task, like AppContext.watch_account_history"""
+    if task is None:
+        return "<no task>"
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or repr(coro)
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def format_stack(frame) -> list:
+    """Stack of frame, from outermost call to frame itself"""
+    stack = []
+    while frame is not None:
+        stack.append(frame_name(frame))
+        frame = frame.f_back
+    return stack[::-1]
+
+
+class LoopMonitor:
+    """
+    Measure event loop lag and detect callbacks which block the loop.
+
+    Sampler coroutine sleeps for interval and measures how late it wakes up. Watchdog thread checks
+    that sampler is alive: if it did not run for longer than threshold, some callback is blocking
+    the loop, and watchdog logs the running task and its current stack once per stall.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.loop = None
+        self.loop_thread_id = None
+
+        self.heartbeat = time.monotonic()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self.last_slow = None
+
+        self._stop = threading.Event()
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Must be called from loop thread"""
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        threading.Thread(
+            target=self._watchdog, name="LoopWatchdog", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def sample_lag(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            self.last_lag = max(self.heartbeat - started - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            metrics.set("loop_lag_seconds", self.last_lag)
+
+    def stats(self, reset: bool = True) -> dict:
+        """Current lag and maximum lag since last reset, in seconds"""
+        stats = {
+            "lag": round(self.last_lag, 6),
+            "max_lag": round(self.max_lag, 6),
+            "slow_callbacks": self.slow_callbacks,
+            "last_slow": self.last_slow,
+        }
+        if reset:
+            self.max_lag = 0.0
+        return stats
+
+    def _watchdog(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or reported == heartbeat:
+                continue
+
+            # Report every stall once, while it is still in progress
+            reported = heartbeat
+            self.slow_callbacks += 1
+            metrics.inc("loop_slow_callbacks_total")
+            frame = sys._current_frames().get(self.loop_thread_id)
+            name = task_name(asyncio.current_task(self.loop))
+            self.last_slow = name
+            log.warning(
+                "Event loop is blocked for %.3fs by %s at:\n    %s",
+                blocked,
+                name,
+                "\n    ".join(format_stack(frame) if frame else []),
+            )
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of event loop thread.
+
+    Background thread takes stack of loop thread every interval and counts identical stacks, prefixed
+    with running task name. Unlike sys.setprofile it does not slow down profiled code, so it can be
+    switched on in production. Profile is dumped in folded stacks format, which flamegraph.pl and
+    speedscope read.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop: asyncio.AbstractEventLoop, thread_id: int) -> None:
+        if self.running:
+            return
+        with self._lock:
+            self.stacks.clear()
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample, args=(loop, thread_id), name="Profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self) -> str:
+        """Profile as lines of `task;outer_frame;...;inner_frame samples`"""
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def dump(self, path: str) -> int:
+        """Write profile collected so far to file, profiling goes on. Return number of samples"""
+        folded = self.folded()
+        with open(path, "w") as f:
+            f.write(folded)
+        return sum(int(line.rsplit(" ", 1)[1]) for line in folded.splitlines())
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            stack = [task_name(asyncio.current_task(loop))] + format_stack(frame)
+            with self._lock:
+                self.stacks[";".join(stack)] += 1
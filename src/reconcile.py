@@ -0,0 +1,416 @@
+"""
+Offline reconciliation of saved operations with account history of gateway account.
+
+    python -m src.reconcile --history history.jsonl --operations operations.csv \
+        --account-id 1.2.123 --asset FINTEHTEST.USDT=1.3.10 --report diff.json
+
+History is a local stand-in of chain: JSON lines of account history ops as node returns them,
+ordered by op ID, with optional "block_time". Operations are a database snapshot: CSV export of
+bitshares_operations and its archive with header, like
+`\\copy (SELECT * FROM bitshares_operations ORDER BY op_id) TO 'operations.csv' CSV HEADER`.
+
+Both inputs are streamed once into columnar arrays of integers, then they are joined by op ID and
+summed by day and by status in bulk: with numpy when it is installed, with plain loops over arrays
+otherwise. Report lists totals which differ and operations which are missing or differ.
+"""
+import argparse
+import csv
+import json
+import sys
+from array import array
+from datetime import date, datetime
+
+from src.gw_dto import OrderType, TxStatus
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Order types and statuses are stored by their index in these lists
+ORDER_TYPES = list(OrderType)
+STATUSES = list(TxStatus)
+
+# Day of operation which time is not known
+NO_DAY = -1
+
+_DTYPES = {"q": "int64", "i": "int32", "b": "int8"}
+
+
+class Columns:
+    """Operations as parallel arrays of integers, one array per field"""
+
+    fields = {"op_id": "q", "amount": "q", "asset": "i", "day": "i", "order_type": "b"}
+
+    def __init__(self):
+        for name, typecode in self.fields.items():
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.op_id)
+
+    def append(self, **values) -> None:
+        for name, value in values.items():
+            getattr(self, name).append(value)
+
+    def sort(self) -> None:
+        """Order all columns by op ID, if input was not ordered"""
+        op_id = self.op_id
+        if all(op_id[n] < op_id[n + 1] for n in range(len(op_id) - 1)):
+            return
+        order = sorted(range(len(op_id)), key=op_id.__getitem__)
+        for name, typecode in self.fields.items():
+            column = getattr(self, name)
+            setattr(self, name, array(typecode, [column[n] for n in order]))
+
+    def column(self, name: str):
+        """Column as numpy array sharing memory with array, or array itself without numpy"""
+        values = getattr(self, name)
+        if numpy is None:
+            return values
+        return numpy.frombuffer(values, dtype=_DTYPES[values.typecode])
+
+
+class DbColumns(Columns):
+    fields = dict(Columns.fields, status="b")
+
+
+class Assets:
+    """Asset names interned to integers. Asset IDs of chain are named by symbols from mapping"""
+
+    def __init__(self, symbols_by_ids: dict):
+        self.symbols_by_ids = symbols_by_ids
+        self.names = []
+        self._indexes = {}
+
+    def index(self, asset: str) -> int:
+        asset = self.symbols_by_ids.get(asset, asset)
+        index = self._indexes.get(asset)
+        if index is None:
+            index = self._indexes[asset] = len(self.names)
+            self.names.append(asset)
+        return index
+
+
+def _day(value: str, cache: dict) -> int:
+    """Day ordinal of ISO date or datetime string, times share few distinct days"""
+    if not value:
+        return NO_DAY
+    key = value[:10]
+    day = cache.get(key)
+    if day is None:
+        day = cache[key] = date.fromisoformat(key).toordinal()
+    return day
+
+
+def load_history(lines, account_id: str, assets: Assets) -> Columns:
+    """Transfers of account from JSON lines of account history"""
+    columns = Columns()
+    days = {}
+    deposit = ORDER_TYPES.index(OrderType.DEPOSIT)
+    withdrawal = ORDER_TYPES.index(OrderType.WITHDRAWAL)
+    for line in lines:
+        if not line.strip():
+            continue
+        op = json.loads(line)
+        if op["op"][0] != 0:
+            continue
+        transfer = op["op"][1]
+        if transfer["from"] == account_id:
+            order_type = deposit
+        elif transfer["to"] == account_id:
+            order_type = withdrawal
+        else:
+            continue
+        columns.append(
+            op_id=int(op["id"].split(".")[2]),
+            amount=int(transfer["amount"]["amount"]),
+            asset=assets.index(transfer["amount"]["asset_id"]),
+            day=_day(op.get("block_time"), days),
+            order_type=order_type,
+        )
+    columns.sort()
+    return columns
+
+
+def load_operations(rows, assets: Assets) -> tuple:
+    """
+    Operations from CSV rows as dicts. Rows without op ID are not matched with chain, they are
+    counted in status totals only.
+
+    :return: columns of operations with op ID, columns of operations without it
+    """
+    saved = DbColumns()
+    unsent = DbColumns()
+    days = {}
+    order_types = {order_type.name: n for n, order_type in enumerate(ORDER_TYPES)}
+    statuses = {status.name: n for n, status in enumerate(STATUSES)}
+    for row in rows:
+        values = dict(
+            amount=int(row["amount"] or 0),
+            asset=assets.index(row["asset"]),
+            day=_day(row["tx_created_at"], days),
+            order_type=order_types[row["order_type"]],
+            status=statuses[row["status"]],
+        )
+        if row["op_id"]:
+            saved.append(op_id=int(row["op_id"]), **values)
+        else:
+            unsent.append(op_id=0, **values)
+    saved.sort()
+    return saved, unsent
+
+
+def join(left, right) -> tuple:
+    """Positions of equal values in two ascending unique arrays"""
+    if numpy is not None:
+        _, left_at, right_at = numpy.intersect1d(
+            left, right, assume_unique=True, return_indices=True
+        )
+        return left_at, right_at
+
+    left_at = array("q")
+    right_at = array("q")
+    n = m = 0
+    while n < len(left) and m < len(right):
+        if left[n] < right[m]:
+            n += 1
+        elif left[n] > right[m]:
+            m += 1
+        else:
+            left_at.append(n)
+            right_at.append(m)
+            n += 1
+            m += 1
+    return left_at, right_at
+
+
+def take(values, positions):
+    if numpy is not None:
+        return values[positions]
+    return array(values.typecode, [values[n] for n in positions])
+
+
+def differ(left, right) -> list:
+    """Positions where two equally long columns differ"""
+    if numpy is not None:
+        return numpy.flatnonzero(left != right).tolist()
+    return [n for n, (a, b) in enumerate(zip(left, right)) if a != b]
+
+
+def unmatched(size: int, matched) -> list:
+    """Positions of 0..size which are not in matched"""
+    if numpy is not None:
+        mask = numpy.ones(size, dtype=bool)
+        mask[matched] = False
+        return numpy.flatnonzero(mask).tolist()
+    matched = set(matched)
+    return [n for n in range(size) if n not in matched]
+
+
+def group_sums(keys: list, amounts) -> dict:
+    """
+    Count and sum of amounts by composite key. Keys are integer columns of the same length
+
+    :return: {(key values): (count, sum)}
+    """
+    if not len(amounts):
+        return {}
+    if numpy is None:
+        sums = {}
+        for key, amount in zip(zip(*keys), amounts):
+            count, total = sums.get(key, (0, 0))
+            sums[key] = (count + 1, total + amount)
+        return sums
+
+    # Sums are exact in int64, so rows are sorted by key and reduced between key boundaries
+    codes = numpy.zeros(len(amounts), dtype="int64")
+    for column in keys:
+        column = numpy.asarray(column, dtype="int64")
+        low = int(column.min())
+        codes = codes * (int(column.max()) - low + 1) + (column - low)
+    order = numpy.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(codes)) + 1))
+    totals = numpy.add.reduceat(numpy.asarray(amounts, dtype="int64")[order], starts)
+    counts = numpy.diff(numpy.append(starts, len(codes)))
+    first = order[starts]
+    return {
+        tuple(int(column[n]) for column in keys): (int(count), int(total))
+        for n, count, total in zip(first, counts, totals)
+    }
+
+
+def _columns_at(columns: Columns, positions) -> dict:
+    return {
+        name: take(columns.column(name), positions)
+        for name in ("amount", "asset", "day", "order_type")
+    }
+
+
+def reconcile(
+    chain: Columns,
+    db: DbColumns,
+    unsent: DbColumns,
+    assets: Assets,
+    max_mismatches: int = 1000,
+) -> dict:
+    """Compare chain and database columns, return report"""
+    chain_at, db_at = join(chain.column("op_id"), db.column("op_id"))
+    on_chain = _columns_at(chain, chain_at)
+    in_db = _columns_at(db, db_at)
+
+    mismatches = []
+    for field in ("amount", "asset", "order_type"):
+        for n in differ(on_chain[field], in_db[field]):
+            mismatches.append(
+                {
+                    "op_id": chain.op_id[chain_at[n]],
+                    "field": field,
+                    "chain": _field_value(field, on_chain[field][n], assets),
+                    "db": _field_value(field, in_db[field][n], assets),
+                }
+            )
+
+    missing_in_db = unmatched(len(chain), chain_at)
+    missing_on_chain = unmatched(len(db), db_at)
+
+    # Day of chain op without block time is taken from its database row
+    chain_days = chain.column("day")
+    if numpy is not None:
+        chain_days = chain_days.copy()
+        chain_days[chain_at] = numpy.where(
+            chain_days[chain_at] == NO_DAY, in_db["day"], chain_days[chain_at]
+        )
+    else:
+        chain_days = array("i", chain_days)
+        for n, m in zip(chain_at, db_at):
+            if chain_days[n] == NO_DAY:
+                chain_days[n] = db.day[m]
+
+    chain_totals = group_sums(
+        [chain_days, chain.column("asset"), chain.column("order_type")],
+        chain.column("amount"),
+    )
+    db_totals = group_sums(
+        [db.column("day"), db.column("asset"), db.column("order_type")],
+        db.column("amount"),
+    )
+    by_day = []
+    for key in sorted(set(chain_totals) | set(db_totals)):
+        chain_count, chain_sum = chain_totals.get(key, (0, 0))
+        db_count, db_sum = db_totals.get(key, (0, 0))
+        day, asset, order_type = key
+        by_day.append(
+            {
+                "day": date.fromordinal(day).isoformat() if day != NO_DAY else None,
+                "asset": assets.names[asset],
+                "order_type": ORDER_TYPES[order_type].name,
+                "chain_count": chain_count,
+                "chain_amount": chain_sum,
+                "db_count": db_count,
+                "db_amount": db_sum,
+                "diff": db_sum - chain_sum,
+            }
+        )
+
+    by_status = []
+    for columns, has_op in ((db, True), (unsent, False)):
+        totals = group_sums(
+            [columns.column("status"), columns.column("asset")],
+            columns.column("amount"),
+        )
+        for (status, asset), (count, total) in sorted(totals.items()):
+            by_status.append(
+                {
+                    "status": STATUSES[status].name,
+                    "asset": assets.names[asset],
+                    "in_history": has_op,
+                    "count": count,
+                    "amount": total,
+                }
+            )
+
+    return {
+        "summary": {
+            "chain_ops": len(chain),
+            "db_ops": len(db),
+            "db_ops_without_op_id": len(unsent),
+            "matched": len(chain_at),
+            "mismatched": len(mismatches),
+            "missing_in_db": len(missing_in_db),
+            "missing_on_chain": len(missing_on_chain),
+            "days_with_diff": sum(
+                1
+                for day in by_day
+                if day["diff"] or day["chain_count"] != day["db_count"]
+            ),
+        },
+        "by_day": by_day,
+        "by_status": by_status,
+        "mismatches": mismatches[:max_mismatches],
+        "missing_in_db": [chain.op_id[n] for n in missing_in_db[:max_mismatches]],
+        "missing_on_chain": [db.op_id[n] for n in missing_on_chain[:max_mismatches]],
+    }
+
+
+def _field_value(field: str, value, assets: Assets):
+    value = int(value)
+    if field == "asset":
+        return assets.names[value]
+    if field == "order_type":
+        return ORDER_TYPES[value].name
+    return value
+
+
+def main(args):
+    assets = Assets(
+        {asset_id: symbol for symbol, asset_id in (a.split("=") for a in args.asset)}
+    )
+
+    started = datetime.utcnow()
+    with open(args.history) as history:
+        chain = load_history(history, args.account_id, assets)
+    with open(args.operations, newline="") as operations:
+        db, unsent = load_operations(csv.DictReader(operations), assets)
+    report = reconcile(chain, db, unsent, assets, args.max_mismatches)
+    report["summary"]["seconds"] = round(
+        (datetime.utcnow() - started).total_seconds(), 3
+    )
+
+    if args.report:
+        with open(args.report, "w") as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    summary = report["summary"]
+    return int(
+        bool(
+            summary["mismatched"]
+            or summary["missing_in_db"]
+            or summary["missing_on_chain"]
+            or summary["days_with_diff"]
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--history", required=True, help="JSON lines of account history"
+    )
+    parser.add_argument("--operations", required=True, help="CSV export of operations")
+    parser.add_argument(
+        "--account-id", required=True, help="gateway account ID, like 1.2.123"
+    )
+    parser.add_argument(
+        "--asset",
+        action="append",
+        default=[],
+        help="SYMBOL=ID of gateway asset, so chain asset IDs match symbols in database",
+    )
+    parser.add_argument("--report", help="write report to file instead of stdout")
+    parser.add_argument("--max-mismatches", type=int, default=1000)
+    sys.exit(main(parser.parse_args()))
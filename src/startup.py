@@ -0,0 +1,89 @@
+"""Concurrent startup of gateway's dependencies"""
+import asyncio
+import time
+
+from src.utils import get_logger
+
+log = get_logger("Startup")
+
+
+class StartupPhaseFailed(Exception):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+
+
+class Startup:
+    """
+    Run startup phases concurrently respecting dependencies between them.
+
+    Every phase is started as soon as all phases it requires are finished, so independent network
+    handshakes (database, BitShares node, booker) are waiting for each other no longer.
+    Failure of critical phase stops the startup, failure of non-critical phase is only logged.
+
+    Example:
+        startup = Startup()
+        startup.add("database", init_db)
+        startup.add("node", init_node)
+        startup.add("sync", synchronize, requires=("database", "node"))
+        results = await startup.run()
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.timings = {}
+
+    def add(self, name: str, func, requires: tuple = (), critical: bool = True):
+        """
+        :param name: unique phase name
+        :param func: coroutine function without arguments
+        :param requires: names of phases that must be finished before this one
+        :param critical: if False, phase exception will be logged and startup continues
+        """
+        self.phases[name] = (func, tuple(requires), critical)
+
+    async def run(self) -> dict:
+        """Run all phases and return their results by names"""
+        for name, (_, requires, _) in self.phases.items():
+            for required in requires:
+                if required not in self.phases:
+                    raise StartupPhaseFailed(
+                        f"Phase {name} requires unknown phase {required}"
+                    )
+
+        started_at = time.monotonic()
+        tasks = {}
+
+        async def run_phase(name):
+            func, requires, critical = self.phases[name]
+            await asyncio.gather(*[tasks[required] for required in requires])
+
+            phase_started_at = time.monotonic()
+            try:
+                return await func()
+            except Exception as ex:
+                if critical:
+                    raise StartupPhaseFailed(f"Phase {name} failed: {ex}") from ex
+                log.warning(f"Phase {name} failed: {ex}")
+            finally:
+                self.timings[name] = time.monotonic() - phase_started_at
+
+        for name in self.phases:
+            tasks[name] = asyncio.ensure_future(run_phase(name))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.timings["total"] = time.monotonic() - started_at
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    def report(self) -> str:
+        """Timing breakdown of finished phases"""
+        return ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in self.timings.items()
+        )
@@ -0,0 +1,148 @@
+"""Supervisor of long-running gateway coroutines"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from src.metrics import metrics
+from src.utils import get_logger, RATE_LIMITED
+
+log = get_logger("Supervisor")
+
+
+class TaskState(IntEnum):
+    RUNNING = 0
+    BACKOFF = 1
+    FAILED = 2
+    STOPPED = 3
+
+
+class Supervisor:
+    """
+    Own long-running coroutines: restart them on failure with exponential backoff and jitter.
+
+    If a task fails more than budget times in budget_window seconds, it is considered FAILED and is not
+    restarted until the window passes. Task states and restarts are exposed via metrics.
+
+    Coroutines wrap units of work which must not be interrupted, like broadcast and saving of
+    transaction, into `async with supervisor.batch()`. On stop supervisor waits for these batches to
+    finish before cancelling tasks.
+
+    :param base_delay: first restart delay in seconds, doubled after every consecutive failure
+    :param max_delay: maximum restart delay. Task which worked longer than that is considered healthy
+    :param budget: restarts allowed in budget_window seconds
+    """
+
+    def __init__(
+        self,
+        base_delay: float = 1,
+        max_delay: float = 60,
+        budget: int = 5,
+        budget_window: float = 600,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.budget_window = budget_window
+
+        self.factories = {}
+        self.tasks = {}
+        self.states = {}
+
+        self.stopping = False
+        self.in_flight = 0
+        self._idle = None
+
+    def add(self, name: str, factory) -> None:
+        """Register coroutine function to be started by start()"""
+        self.factories[name] = factory
+
+    def start(self) -> None:
+        for name, factory in self.factories.items():
+            if name not in self.tasks:
+                self.tasks[name] = asyncio.ensure_future(self._supervise(name, factory))
+
+    def health(self) -> dict:
+        return {name: state.name for name, state in self.states.items()}
+
+    @asynccontextmanager
+    async def batch(self):
+        """Mark unit of work which stop() waits for instead of cancelling it in the middle"""
+        if self.stopping:
+            raise asyncio.CancelledError()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Let in-flight batches finish, then cancel all tasks"""
+        self.stopping = True
+        if self.in_flight:
+            log.info("Waiting for %s in-flight batches to finish", self.in_flight)
+            self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                log.warning("%s batches did not finish in time", self.in_flight)
+
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        for name in self.tasks:
+            self._set_state(name, TaskState.STOPPED)
+
+    def backoff_delay(self, failures: int) -> float:
+        """Exponential delay with full jitter in its upper half"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        return delay * random.uniform(0.5, 1)
+
+    async def _supervise(self, name: str, factory) -> None:
+        failures = 0
+        restarts = []
+        while True:
+            self._set_state(name, TaskState.RUNNING)
+            started = time.monotonic()
+            try:
+                await factory()
+                log.info("%s finished", name)
+                self._set_state(name, TaskState.STOPPED)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                log.exception("%s in %s: %s", ex.__class__.__name__, name, ex)
+
+            if self.stopping:
+                return
+
+            now = time.monotonic()
+            failures = 1 if now - started > self.max_delay else failures + 1
+            restarts = [t for t in restarts if now - t < self.budget_window] + [now]
+            metrics.inc("task_restarts_total", task=name)
+
+            if len(restarts) > self.budget:
+                self._set_state(name, TaskState.FAILED)
+                log.error(
+                    "%s failed %s times in %ss, next attempt in %ss",
+                    name,
+                    len(restarts),
+                    self.budget_window,
+                    self.budget_window,
+                )
+                await asyncio.sleep(self.budget_window)
+                failures, restarts = 0, []
+                continue
+
+            delay = self.backoff_delay(failures)
+            self._set_state(name, TaskState.BACKOFF)
+            log.info("Restarting %s in %.1fs", name, delay, extra=RATE_LIMITED)
+            await asyncio.sleep(delay)
+
+    def _set_state(self, name: str, state: TaskState) -> None:
+        self.states[name] = state
+        metrics.set("task_state", int(state), task=name)
@@ -0,0 +1,58 @@
+"""In-memory index of gateway's own broadcast transactions, to match them in account history"""
+from src.metrics import metrics
+from src.op_record import OpRecord
+
+
+class TxHashIndex:
+    """
+    Map tx_hash of broadcast, not yet matched operation to its record, as it is stored in database.
+
+    History loop looks deposits up here first and reads database only on miss: after restart before
+    index is rebuilt, or for transfers which gateway did not broadcast itself. Every change of
+    indexed operation in database must be applied here as well, or the entry must be discarded.
+    """
+
+    def __init__(self):
+        self._ops = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._ops)
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self._ops
+
+    def add(self, op: OpRecord) -> None:
+        self._ops[op.tx_hash] = op
+        metrics.set("tx_hash_index_size", len(self._ops))
+
+    def rebuild(self, ops) -> None:
+        self._ops = {op.tx_hash: op for op in ops}
+        metrics.set("tx_hash_index_size", len(self._ops))
+
+    def pop(self, tx_hash: str) -> OpRecord or None:
+        """Remove and return operation of transaction. Counted as hit or miss"""
+        op = self._ops.pop(tx_hash, None)
+        if op is None:
+            self.misses += 1
+            metrics.inc("tx_hash_index_misses_total")
+        else:
+            self.hits += 1
+            metrics.inc("tx_hash_index_hits_total")
+            metrics.set("tx_hash_index_size", len(self._ops))
+        metrics.set("tx_hash_index_hit_rate", round(self.hit_rate(), 3))
+        return op
+
+    def update(self, tx_hash: str, **changes) -> None:
+        op = self._ops.get(tx_hash)
+        if op is not None:
+            self._ops[tx_hash] = op.replace(**changes)
+
+    def discard(self, tx_hash: str) -> None:
+        if self._ops.pop(tx_hash, None) is not None:
+            metrics.set("tx_hash_index_size", len(self._ops))
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
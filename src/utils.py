@@ -1,9 +1,15 @@
 """Small stand-alone utils in one place"""
-import logging
+from decimal import Decimal
+
 import aiohttp
 from aiopg.sa.result import RowProxy
 from sqlalchemy import inspect
 
+from src.logger import (
+    get_logger,
+    RATE_LIMITED,
+)  # noqa: F401 re-exported, loggers are created from here
+
 
 async def get_gw_settings(gw, url=""):
     """Fetch gateway settings from control_center. Control_center URL stored in config/const.py"""
@@ -18,18 +24,6 @@ async def get_gw_settings(gw, url=""):
                 raise Exception(f"Unable to fetch gateway {gw} settings: {ex}")
 
 
-def get_logger(name: str) -> logging.Logger:
-
-    log = logging.getLogger(name)
-    log.setLevel(level=logging.INFO)
-    formatter = logging.Formatter("%(asctime)s|%(name)s|%(levelname)s|%(message)s")
-    ch = logging.StreamHandler()
-    ch.setFormatter(formatter)
-    log.addHandler(ch)
-
-    return log
-
-
 def object_as_dict(obj) -> dict:
     """Represent any sqlalchemy model object as python dict"""
     return {c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
@@ -42,3 +36,21 @@ def rowproxy_to_dto(row_proxy: RowProxy, from_, to_):
     model_dict.pop("pk")
     instance = to_(**model_dict)
     return instance
+
+
+def amount_to_units(amount: Decimal or str or float or int, precision: int) -> int:
+    """
+    Convert human readable amount to integer base units of asset with given precision.
+
+    Floats are converted by their shortest repr, so 0.1 from YAML is exactly 0.1.
+    Raise ValueError if amount has more decimal places than precision.
+    """
+    units = Decimal(str(amount)).scaleb(precision)
+    if units != units.to_integral_value():
+        raise ValueError(f"Amount {amount} has more than {precision} decimal places")
+    return int(units)
+
+
+def units_to_amount(units: int, precision: int) -> Decimal:
+    """Convert integer base units to exact decimal amount"""
+    return Decimal(units).scaleb(-precision)
@@ -0,0 +1,86 @@
+from src.balance_ledger import CORE_ASSET_ID, BalanceLedger
+from src.metrics import metrics
+
+GATEWAY_ID = "1.2.100"
+USDT = "1.3.10"
+
+
+def transfer_op(op_num: int, from_id: str, to_id: str, amount: int) -> dict:
+    return {
+        "id": f"1.11.{op_num}",
+        "op": [
+            0,
+            {
+                "fee": {"amount": 100, "asset_id": CORE_ASSET_ID},
+                "from": from_id,
+                "to": to_id,
+                "amount": {"amount": amount, "asset_id": USDT},
+            },
+        ],
+    }
+
+
+def make_ledger() -> BalanceLedger:
+    ledger = BalanceLedger("gateway", GATEWAY_ID)
+    ledger.seed({USDT: 1000, CORE_ASSET_ID: 250}, transfer_fee=100, last_op=10)
+    return ledger
+
+
+def test_balance_ledger_reserve():
+    ledger = make_ledger()
+
+    assert ledger.reserve("order-1", USDT, 600)
+    assert ledger.available(USDT) == 400
+    assert ledger.available(CORE_ASSET_ID) == 150
+    assert not ledger.reserve("order-2", USDT, 600)
+    assert ledger.reserve("order-2", USDT, 400)
+    # Fee is not covered for the third transfer
+    assert not ledger.reserve("order-3", USDT, 0)
+    assert metrics.get("ledger_insufficient_total", account="gateway") >= 2
+
+    # Reserving again replaces reservation
+    assert ledger.reserve("order-1", USDT, 500)
+    assert ledger.available(USDT) == 100
+
+    ledger.release("order-2")
+    ledger.release("unknown")
+    assert not ledger.is_reserved("order-2")
+    assert ledger.available(USDT) == 500
+    assert metrics.get("ledger_available", account="gateway", asset=USDT) == 500
+
+
+def test_balance_ledger_apply_op():
+    ledger = make_ledger()
+    assert ledger.reserve("order-1", USDT, 600)
+
+    # Ops up to seed are already counted
+    assert not ledger.apply_op(transfer_op(10, GATEWAY_ID, "1.2.200", 600))
+    assert ledger.apply_op(transfer_op(11, GATEWAY_ID, "1.2.200", 600))
+    ledger.release("order-1")
+    assert ledger.balances == {USDT: 400, CORE_ASSET_ID: 150}
+    assert ledger.available(USDT) == 400
+
+    assert ledger.apply_op(transfer_op(12, "1.2.200", GATEWAY_ID, 50))
+    assert not ledger.apply_op(transfer_op(13, "1.2.200", "1.2.300", 50))
+    assert ledger.balances[USDT] == 450
+    assert metrics.get("ledger_balance", account="gateway", asset=USDT) == 450
+
+
+def test_balance_ledger_applies_op_once():
+    ledger = make_ledger()
+    page = [
+        transfer_op(11, GATEWAY_ID, "1.2.200", 100),
+        transfer_op(12, "1.2.200", GATEWAY_ID, 30),
+    ]
+    assert all(ledger.apply_op(op) for op in page)
+    assert ledger.last_op == 12
+
+    # History loop restarted and fetched the same page again
+    assert not any(ledger.apply_op(op) for op in page)
+    assert ledger.balances[USDT] == 1000 - 100 + 30
+
+
+def test_balance_ledger_not_seeded():
+    ledger = BalanceLedger("gateway", GATEWAY_ID)
+    assert not ledger.apply_op(transfer_op(1, "1.2.200", GATEWAY_ID, 50))
+    assert not ledger.reserve("order-1", USDT, 1)
@@ -616,13 +616,13 @@ async def test_deposit_validate_greater_max():
 async def test_confirm_old_op():
     instance = await init_bitshares(account=cfg.account, node=cfg.nodes, keys=cfg.keys)
 
-    op_dto = BitSharesOperationDTO(
+    op_dto = OpRecord(
         op_id=43571314,
         order_type=OrderType.DEPOSIT,
         asset=f"{cfg.gateway_prefix}.{cfg.gateway_distribute_asset}",
         from_account=cfg.account,
         to_account=testnet_user_account,
-        amount=0.1,
+        amount=100000,
         status=TxStatus.RECEIVED_NOT_CONFIRMED,
         confirmations=0,
         block_num=37899972,
@@ -630,9 +630,90 @@ async def test_confirm_old_op():
         error=TxError.NO_ERROR,
     )
 
-    await confirm_op(op_dto)
+    confirmed = await confirm_op(op_dto)
+    assert confirmed.status == TxStatus.RECEIVED_AND_CONFIRMED
+    assert confirmed.confirmations > 0
+    assert op_dto.confirmations == 0
+
+    await instance.rpc.connection.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_confirm_old_op_head_mode():
+    instance = await init_bitshares(account=cfg.account, node=cfg.nodes, keys=cfg.keys)
+
+    op_dto = OpRecord(
+        op_id=43571314,
+        order_type=OrderType.DEPOSIT,
+        status=TxStatus.RECEIVED_NOT_CONFIRMED,
+        confirmations=0,
+        block_num=37899972,
+        error=TxError.NO_ERROR,
+    )
+
+    op_dto = await confirm_op(op_dto, mode="head")
     assert op_dto.status == TxStatus.RECEIVED_AND_CONFIRMED
-    assert op_dto.confirmations > 0
+    assert op_dto.confirmations >= op_dto.irreversible_confirmations > 0
+
+    await instance.rpc.connection.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_get_new_account_ops_by_types():
+    instance = await init_bitshares(account=cfg.account, node=cfg.nodes, keys=cfg.keys)
+    all_ops = await get_new_account_ops(cfg.account, last_op=0)
+    last_op = int(all_ops[0]["id"].split(".")[2]) - 1 if all_ops else 0
+
+    transfers = await get_new_account_ops(
+        cfg.account, last_op=last_op, op_types=GATEWAY_OP_TYPES
+    )
+
+    assert [op["id"] for op in transfers] == [
+        op["id"] for op in all_ops if op["op"][0] in GATEWAY_OP_TYPES
+    ]
+
+    await instance.rpc.connection.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_poll_account_ops_moves_cursor_past_other_types():
+    import src.blockchain.bitshares_utils as bitshares_utils
+
+    instance = await init_bitshares(account=cfg.account, node=cfg.nodes, keys=cfg.keys)
+    all_ops = await get_new_account_ops(cfg.account, last_op=0)
+    last_op = int(all_ops[0]["id"].split(".")[2]) - 1 if all_ops else 0
+
+    # Node without history API by types
+    bitshares_utils._history_by_type = False
+    try:
+        transfers, newest = await poll_account_ops(
+            cfg.account, last_op=last_op, op_types=GATEWAY_OP_TYPES
+        )
+    finally:
+        bitshares_utils._history_by_type = True
+
+    assert [op["id"] for op in transfers] == [
+        op["id"] for op in all_ops if op["op"][0] in GATEWAY_OP_TYPES
+    ]
+    assert newest == (int(all_ops[-1]["id"].split(".")[2]) if all_ops else last_op)
+
+    await instance.rpc.connection.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_update_block_window():
+    instance = await init_bitshares(account=cfg.account, node=cfg.nodes, keys=cfg.keys)
+    window = BlockWindow()
+
+    assert await update_block_window(window) is None
+    first_head = window.head_num
+
+    await asyncio.sleep(BITSHARES_BLOCK_TIME * 2)
+    assert await update_block_window(window) is None
+
+    assert window.head_num > first_head
+    # All blocks between heads are learned by parent links
+    assert all(window.get(num) for num in range(first_head, window.head_num + 1))
 
     await instance.rpc.connection.disconnect()
 
@@ -660,3 +741,48 @@ async def test_validate_bitshares_account():
     assert not await validate_bitshares_account("1kwaskoff")
 
     await instance.rpc.connection.disconnect()
+
+
+def test_relocate_operation_after_fork():
+    window = BlockWindow(size=10)
+    window.update({10: "a10", 11: "a11", 12: "a12", 13: "a13"}, 13)
+    fork_at = window.update({14: "b14", 13: "b13", 12: "b12"}, 14)
+    assert fork_at == 12
+
+    created_at = datetime(2020, 1, 1)
+    irreversible_time = created_at + timedelta(seconds=60)
+    # Operations of orphaned block 12, already rolled back
+    withdrawal = OpRecord(
+        op_id=1,
+        order_type=OrderType.WITHDRAWAL,
+        status=TxStatus.RECEIVED_NOT_CONFIRMED,
+        confirmations=0,
+        tx_hash="aa",
+        tx_created_at=created_at,
+    )
+    deposit = OpRecord(
+        op_id=2,
+        order_type=OrderType.DEPOSIT,
+        status=TxStatus.RECEIVED_NOT_CONFIRMED,
+        confirmations=0,
+        tx_hash="bb",
+        tx_created_at=created_at,
+        tx_expiration=created_at + timedelta(seconds=BITSHARES_TX_EXPIRATION),
+    )
+
+    # Transaction is included again into block of current chain
+    relocated = relocate_operation(withdrawal, 14, irreversible_time, 86400)
+    assert relocated.block_num == 14
+    assert relocated.status == TxStatus.RECEIVED_NOT_CONFIRMED
+
+    # Not found, but still may be included
+    assert relocate_operation(withdrawal, None, irreversible_time, 86400) is None
+
+    # Expired before irreversible block: incoming transfer is lost, own one is sent again
+    lost = relocate_operation(withdrawal, None, irreversible_time, 30)
+    assert lost.status == TxStatus.ERROR
+    assert lost.error == TxError.TX_HASH_NOT_FOUND
+
+    requeued = relocate_operation(deposit, None, irreversible_time, 86400)
+    assert requeued.status == TxStatus.WAIT
+    assert requeued.tx_hash is None and requeued.op_id is None
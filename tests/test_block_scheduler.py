@@ -0,0 +1,78 @@
+import asyncio
+import calendar
+from datetime import datetime
+
+import pytest
+
+from src.block_scheduler import BlockScheduler
+
+
+async def no_head():
+    raise ConnectionError
+
+
+def test_idle_backoff():
+    scheduler = BlockScheduler(no_head, max_idle_blocks=8)
+
+    assert [scheduler.blocks_to_wait("loop", busy=False) for _ in range(5)] == [
+        1,
+        2,
+        4,
+        8,
+        8,
+    ]
+    assert scheduler.blocks_to_wait("loop", busy=True) == 1
+    assert scheduler.blocks_to_wait("loop", busy=False) == 1
+
+
+def test_next_poll_delay():
+    scheduler = BlockScheduler(no_head, block_interval=3, delay=0.3)
+    head_time = datetime(2020, 6, 30, 1, 38, 41)
+    block_at = calendar.timegm(head_time.timetuple())
+    scheduler.on_block(100, head_time, now=block_at + 0.5)
+
+    assert scheduler.detection_latency == 0.5
+    # Poll just after the next expected block
+    assert scheduler.next_poll_delay(now=block_at + 0.5) == pytest.approx(2.8)
+    # Expected block is late: poll again soon, backing off up to block interval
+    assert scheduler.next_poll_delay(now=block_at + 4) == 0.3
+    assert scheduler.next_poll_delay(polls=1) == 0.6
+    assert scheduler.next_poll_delay(polls=5) == 3
+
+
+@pytest.mark.asyncio
+async def test_wait_for_blocks():
+    scheduler = BlockScheduler(no_head, block_interval=3)
+    scheduler.on_block(100, datetime.utcnow())
+    scheduler.idle_streaks["loop"] = 1
+
+    # Idle consumer waits for 2 blocks
+    waiter = asyncio.ensure_future(scheduler.wait("loop", busy=False))
+    await asyncio.sleep(0)
+    scheduler.on_block(101, datetime.utcnow())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    scheduler.on_block(102, datetime.utcnow())
+    await asyncio.wait_for(waiter, 1)
+    assert scheduler.stats()["wakeups_per_minute"] == {"loop": 1}
+
+
+@pytest.mark.asyncio
+async def test_wake():
+    scheduler = BlockScheduler(no_head, block_interval=3)
+    scheduler.on_block(100, datetime.utcnow())
+    scheduler.idle_streaks["loop"] = 3
+
+    waiter = asyncio.ensure_future(scheduler.wait("loop", busy=False))
+    await asyncio.sleep(0)
+    scheduler.wake("loop")
+
+    await asyncio.wait_for(waiter, 1)
+    assert scheduler.idle_streaks["loop"] == 0
+
+
+@pytest.mark.asyncio
+async def test_wait_without_producer():
+    scheduler = BlockScheduler(no_head, block_interval=0.01)
+    await asyncio.wait_for(scheduler.wait("loop", busy=True), 1)
@@ -0,0 +1,38 @@
+from src.blockchain.block_window import BlockWindow
+
+
+def test_block_window_new_blocks():
+    window = BlockWindow(size=3)
+
+    assert window.update({10: "a10"}, 10) is None
+    assert window.update({11: "a11"}, 11) is None
+    assert window.update({13: "a13", 12: "a12"}, 13) is None
+
+    assert window.head_num == 13
+    # Block 10 is out of window
+    assert window.lowest_num == 11
+    assert window.get(12) == "a12"
+
+
+def test_block_window_fork():
+    window = BlockWindow(size=10)
+    window.update({10: "a10", 11: "a11", 12: "a12", 13: "a13"}, 13)
+
+    # Node switched to other chain that forked after block 11
+    fork_at = window.update({14: "b14", 13: "b13", 12: "b12"}, 14)
+
+    assert fork_at == 12
+    assert window.get(11) == "a11"
+    assert window.get(12) == "b12"
+    assert window.head_num == 14
+
+
+def test_block_window_shorter_fork():
+    window = BlockWindow(size=10)
+    window.update({10: "a10", 11: "a11", 12: "a12", 13: "a13"}, 13)
+
+    fork_at = window.update({12: "b12"}, 12)
+
+    assert fork_at == 12
+    assert window.get(13) is None
+    assert window.head_num == 12
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.bts_ws_rpc_server import BtsWsRPCServer
+
+
+async def echo(request):
+    return request.msg[1]["params"]
+
+
+async def make_client() -> TestClient:
+    # Private _handle_rpc_msg of aiohttp_json_rpc is overridden, this runs it through real websocket
+    server = BtsWsRPCServer()
+    server.add_methods(("", echo))
+    app = web.Application()
+    app.router.add_route("*", "/ws-rpc", server.handle_request)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_single_request():
+    client = await make_client()
+    try:
+        ws = await client.ws_connect("/ws-rpc")
+        await ws.send_str(
+            json.dumps({"jsonrpc": "2.0", "id": 1, "method": "echo", "params": [7]})
+        )
+        assert json.loads(await ws.receive_str()) == {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "result": [7],
+        }
+
+        await ws.send_str(json.dumps({"jsonrpc": "2.0", "id": 2, "method": "nope"}))
+        response = json.loads(await ws.receive_str())
+        assert response["id"] == 2
+        assert response["error"]["code"] == -32601
+        await ws.close()
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_request():
+    client = await make_client()
+    try:
+        ws = await client.ws_connect("/ws-rpc")
+        await ws.send_str(
+            json.dumps(
+                [
+                    {"jsonrpc": "2.0", "id": 1, "method": "echo", "params": ["a"]},
+                    # Notification has no response
+                    {"jsonrpc": "2.0", "method": "echo", "params": ["b"]},
+                    {"jsonrpc": "2.0", "id": 3, "method": "nope"},
+                ]
+            )
+        )
+        responses = {
+            response["id"]: response for response in json.loads(await ws.receive_str())
+        }
+        assert set(responses) == {1, 3}
+        assert responses[1]["result"] == ["a"]
+        assert responses[3]["error"]["code"] == -32601
+
+        await ws.send_str("[]")
+        assert json.loads(await ws.receive_str())["error"]["code"] == -32600
+        await ws.close()
+    finally:
+        await client.close()
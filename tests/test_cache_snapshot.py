@@ -0,0 +1,44 @@
+from src.cache_snapshot import CacheSnapshot
+from src.op_filter import OpIdFilter
+
+
+def test_cache_snapshot(tmp_path):
+    snapshot = CacheSnapshot(str(tmp_path / "cache.snapshot"))
+    assert snapshot.load("chain") == ({}, {})
+
+    op_filter = OpIdFilter(capacity=1000)
+    for op_id in range(1000, 1500):
+        op_filter.add(op_id)
+
+    size = snapshot.save(
+        {"chain_id": "chain", "head_block_num": 100, "cursors": {"gateway": 1499}},
+        {
+            "op_filter": op_filter.state(),
+            "chain": {"account_names": {"1.2.100": "gateway"}},
+            "block_window": [(99, "0063"), (100, "0064")],
+        },
+    )
+    assert size == (tmp_path / "cache.snapshot").stat().st_size
+
+    header, sections = snapshot.load("chain")
+    assert header["cursors"] == {"gateway": 1499}
+    assert sections["chain"]["account_names"] == {"1.2.100": "gateway"}
+    assert dict(sections["block_window"]) == {99: "0063", 100: "0064"}
+
+    restored = OpIdFilter(capacity=1000)
+    assert restored.restore(sections["op_filter"])
+    assert len(restored) == 500
+    assert all(op_id in restored for op_id in range(1000, 1500))
+    assert not OpIdFilter(capacity=2000).restore(sections["op_filter"])
+
+    assert snapshot.load("other chain") == ({}, {})
+
+
+def test_cache_snapshot_unreadable(tmp_path):
+    path = tmp_path / "cache.snapshot"
+    path.write_bytes(b"\xc1 not msgpack")
+    assert CacheSnapshot(str(path)).load("chain") == ({}, {})
+
+    disabled = CacheSnapshot("")
+    assert disabled.save({"chain_id": "chain"}, {}) == 0
+    assert disabled.load("chain") == ({}, {})
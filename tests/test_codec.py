@@ -0,0 +1,144 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+
+import pytest
+from marshmallow import fields
+from marshmallow_dataclass import NewType, dataclass as schema_dataclass
+
+from booker.finteh_proto.dto import (
+    DepositAddressDTO,
+    OrderDTO,
+    TransactionDTO,
+    ValidateAddressDTO,
+)
+from src import codec
+from src.gw_dto import BitSharesOperation, OrderType, TxStatus, TxError
+
+
+class Status(Enum):
+    ERROR = 0
+    WAIT = 1
+
+
+@dataclass
+class Tx:
+    amount: Decimal = None
+    status: Status = None
+    created_at: datetime = None
+
+
+@dataclass
+class Order:
+    order_id: UUID = None
+    in_tx: Tx = None
+    statuses: list = None
+
+
+def test_codec_dumps_dto():
+    order = Order(
+        order_id=UUID("8a2f1f4e-9c55-4b27-b1a6-5a1fb1f6a6c1"),
+        in_tx=Tx(Decimal("0.10"), Status.WAIT, datetime(2020, 1, 2, 3, 4, 5)),
+        statuses=[Status.ERROR],
+    )
+
+    assert json.loads(codec.dumps(order)) == {
+        "order_id": "8a2f1f4e-9c55-4b27-b1a6-5a1fb1f6a6c1",
+        "in_tx": {
+            "amount": "0.10",
+            "status": "WAIT",
+            "created_at": "2020-01-02T03:04:05",
+        },
+        "statuses": ["ERROR"],
+    }
+
+
+def test_codec_messages():
+    result = codec.loads(codec.encode_result(1, Tx(status=Status.ERROR)))
+    error = codec.loads(codec.encode_error(-32000, "Server is overloaded", 2))
+
+    assert result == {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "result": {"amount": None, "status": "ERROR", "created_at": None},
+    }
+    assert error == {
+        "jsonrpc": "2.0",
+        "id": 2,
+        "error": {"code": -32000, "message": "Server is overloaded"},
+    }
+
+
+def test_codec_errors():
+    with pytest.raises(ValueError):
+        codec.loads("{bad")
+    with pytest.raises(TypeError):
+        codec.dumps(object())
+
+
+SchemaAmount = NewType("SchemaAmount", Decimal, field=fields.Decimal, as_string=True)
+
+
+@schema_dataclass
+class SchemaTx:
+    amount: SchemaAmount = None
+    status: Status = None
+    created_at: datetime = None
+
+
+@schema_dataclass
+class SchemaOrder:
+    order_id: UUID = None
+    in_tx: SchemaTx = None
+
+
+def test_codec_matches_schema_dump():
+    # Field types of WS DTOs: UUID, Decimal, datetime and enum
+    order = SchemaOrder(
+        order_id=UUID("8a2f1f4e-9c55-4b27-b1a6-5a1fb1f6a6c1"),
+        in_tx=SchemaTx(
+            Decimal("4.35"), Status.WAIT, datetime(2020, 1, 2, 3, 4, 5, 123456)
+        ),
+    )
+    assert codec.loads(codec.dumps(order)) == SchemaOrder.Schema().dump(order)
+    assert codec.loads(codec.dumps(SchemaOrder())) == SchemaOrder.Schema().dump(
+        SchemaOrder()
+    )
+
+
+def test_codec_matches_dto_schemas():
+    """DTOs returned over WS are encoded as their marshmallow schemas dump them"""
+    tx = TransactionDTO(
+        coin="FINTEHTEST.USDT",
+        amount=Decimal("4.35"),
+        from_address="gateway",
+        to_address="user",
+        created_at=datetime(2020, 1, 2, 3, 4, 5, 123456),
+        confirmations=3,
+        max_confirmations=5,
+        error=TxError.NO_ERROR,
+        tx_id="1:abc",
+    )
+    order = OrderDTO(
+        order_id=UUID("8a2f1f4e-9c55-4b27-b1a6-5a1fb1f6a6c1"), in_tx=tx, out_tx=tx
+    )
+    operation = BitSharesOperation(
+        op_id=1,
+        order_id=UUID("8a2f1f4e-9c55-4b27-b1a6-5a1fb1f6a6c1"),
+        order_type=OrderType.DEPOSIT,
+        amount=435,
+        status=TxStatus.RECEIVED_NOT_CONFIRMED,
+        error=TxError.NO_ERROR,
+    )
+
+    for dto in (
+        tx,
+        order,
+        DepositAddressDTO(user="user", deposit_address="gateway"),
+        ValidateAddressDTO(user="user", is_valid=True),
+        operation,
+    ):
+        assert codec.loads(codec.dumps(dto)) == dto.Schema().dump(dto)
@@ -1,3 +1,5 @@
+import pytest
+
 from src.config import Config, project_root_dir
 import os
 from shutil import copyfile
@@ -21,3 +23,43 @@ def test_config_with_env():
         os.remove(str(project_root_dir) + "/.env")
 
     assert c.is_test_env != Config.is_test_env
+
+
+def test_config_tenants():
+    c = Config()
+    assert c.tenants() == [c]
+
+    c.gateways = [
+        {"gateway_distribute_asset": "BTC", "max_withdrawal": 2},
+        {"account": "some-account", "gateway_distribute_asset": "ETH"},
+    ]
+    main, btc, eth = c.tenants()
+
+    assert main is c
+    assert (btc.account, btc.gateway_distribute_asset) == (c.account, "BTC")
+    assert btc.max_withdrawal == 2 and btc.min_withdrawal == c.min_withdrawal
+    assert btc.keys == c.keys
+    assert (eth.account, eth.gateway_distribute_asset) == ("some-account", "ETH")
+    assert not eth.keys
+    assert not btc.gateways and not eth.gateways
+
+
+def test_config_tenants_unknown_parameter():
+    c = Config()
+    c.gateways = [{"gateway_distrbute_asset": "BTC"}]
+    with pytest.raises(AttributeError):
+        c.tenants()
+
+
+def test_config_set_asset():
+    c = Config()
+    c.min_withdrawal, c.max_withdrawal = 0.1, 2
+    c.set_asset("1.3.1", 6)
+
+    assert (c.asset_id, c.asset_precision) == ("1.3.1", 6)
+    assert c.min_withdrawal_units == 100000
+    assert c.max_withdrawal_units == 2000000
+
+    c.min_deposit = 0.0000001
+    with pytest.raises(ValueError):
+        c.set_asset("1.3.1", 6)
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.expiration_queue import ExpirationQueue
+
+
+def test_pop_due_in_time_order():
+    queue = ExpirationQueue()
+    now = datetime.utcnow()
+
+    queue.push("b", now - timedelta(seconds=1), "second")
+    queue.push("a", now - timedelta(seconds=2), "first")
+    queue.push("c", now + timedelta(seconds=60), "later")
+
+    assert queue.pop_due(now) == [("a", "first"), ("b", "second")]
+    assert len(queue) == 1
+    assert "c" in queue
+
+
+def test_reschedule_and_discard():
+    queue = ExpirationQueue()
+    now = datetime.utcnow()
+
+    queue.push("a", now - timedelta(seconds=1))
+    queue.push("a", now + timedelta(seconds=60))
+    queue.push("b", now - timedelta(seconds=1))
+    queue.discard("b")
+
+    assert queue.pop_due(now) == []
+    assert queue.next_time() == now + timedelta(seconds=60)
+
+
+@pytest.mark.asyncio
+async def test_wait_due_wakes_up_on_earlier_push():
+    queue = ExpirationQueue()
+    queue.push("late", datetime.utcnow() + timedelta(seconds=60))
+
+    waiter = asyncio.ensure_future(queue.wait_due())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    queue.push("soon", datetime.utcnow() + timedelta(seconds=0.05), 1)
+    due = await asyncio.wait_for(waiter, 1)
+
+    assert due == [("soon", 1)]
+    assert "late" in queue
+
+
+@pytest.mark.asyncio
+async def test_discarded_item_is_never_due():
+    queue = ExpirationQueue()
+    queue.push("matched", datetime.utcnow() + timedelta(seconds=0.02), 1)
+    queue.push("expiring", datetime.utcnow() + timedelta(seconds=0.1), 2)
+
+    waiter = asyncio.ensure_future(queue.wait_due())
+    await asyncio.sleep(0)
+    # Transaction is found in history before it expires
+    queue.discard("matched")
+
+    due = await asyncio.wait_for(waiter, 1)
+    assert due == [("expiring", 2)]
+    assert len(queue) == 0
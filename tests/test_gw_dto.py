@@ -3,6 +3,7 @@ from uuid import uuid4
 from src.gw_dto import Amount, BitSharesOperation, OrderType, TxStatus, TxError
 from booker.finteh_proto.dto import OrderDTO, TransactionDTO
 from src.config import Config, BITSHARES_NEED_CONF
+from src.utils import units_to_amount
 from tests.fixtures import *
 import datetime
 
@@ -22,7 +23,7 @@ def test_op_to_order():
         asset=f"{cfg.gateway_prefix}.{cfg.gateway_distribute_asset}",
         from_account=cfg.account,
         to_account=testnet_user_account,
-        amount=0.1,
+        amount=100000,
         status=TxStatus.RECEIVED_NOT_CONFIRMED,
         confirmations=0,
         block_num=37899972,
@@ -32,7 +33,7 @@ def test_op_to_order():
 
     tx = TransactionDTO(
         coin=op_dto.asset,
-        amount=op_dto.amount,
+        amount=units_to_amount(op_dto.amount, 6),
         from_address=op_dto.from_account,
         to_address=op_dto.to_account,
         created_at=op_dto.tx_created_at,
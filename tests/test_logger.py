@@ -0,0 +1,99 @@
+import json
+import logging
+
+import src.logger
+from src.logger import (
+    RATE_LIMITED,
+    JsonFormatter,
+    RateLimitFilter,
+    TextFormatter,
+    get_logger,
+    set_log_format,
+)
+
+
+def make_record(msg, *args, level=logging.INFO, rate_limit=True):
+    record = logging.LogRecord("Test", level, __file__, 1, msg, args, None)
+    if rate_limit:
+        record.__dict__.update(RATE_LIMITED)
+    return record
+
+
+def test_get_logger_idempotent():
+    log = get_logger("TestLogger")
+    handlers = list(log.handlers)
+    assert get_logger("TestLogger") is log
+    assert log.handlers == handlers
+    assert len(handlers) == 1
+
+
+def test_rate_limit_filter():
+    rate_limit = RateLimitFilter(limit=3, interval=60)
+
+    passed = [
+        rate_limit.filter(make_record("Found new %s operations", n)) for n in range(10)
+    ]
+    assert passed == [True] * 3 + [False] * 7
+
+    # Other templates and errors are not limited by repetitive message
+    assert rate_limit.filter(make_record("Other message"))
+    assert rate_limit.filter(
+        make_record("Found new %s operations", 1, level=logging.ERROR)
+    )
+
+    # Next window reports suppressed records
+    rate_limit.interval = 0
+    record = make_record("Found new %s operations", 11)
+    assert rate_limit.filter(record)
+    assert record.suppressed == 7
+
+
+def test_rate_limit_filter_is_opt_in():
+    rate_limit = RateLimitFilter(limit=1, interval=60)
+
+    # Per-order records are never dropped
+    assert all(
+        rate_limit.filter(make_record("Broadcast %s transaction", n, rate_limit=False))
+        for n in range(10)
+    )
+
+    log = get_logger("TestRateLimit")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    handler.addFilter(rate_limit)
+    log.addHandler(handler)
+    try:
+        for n in range(3):
+            log.info("Found new %s operations", n, extra=RATE_LIMITED)
+            log.info("Op %s: changing status", n)
+    finally:
+        log.removeHandler(handler)
+    assert [record.msg for record in records] == [
+        "Found new %s operations",
+        "Op %s: changing status",
+        "Op %s: changing status",
+        "Op %s: changing status",
+    ]
+
+
+def test_json_formatter():
+    record = make_record("Op %s: changing status to %s", "1.11.1", "RECEIVED")
+    record.suppressed = 2
+
+    data = json.loads(JsonFormatter().format(record))
+
+    assert data["logger"] == "Test"
+    assert data["level"] == "INFO"
+    assert data["message"] == "Op 1.11.1: changing status to RECEIVED"
+    assert data["suppressed"] == 2
+
+
+def test_set_log_format():
+    get_logger("TestLogFormat")
+    try:
+        set_log_format("json")
+        assert isinstance(src.logger._stream_handler.formatter, JsonFormatter)
+    finally:
+        set_log_format("text")
+    assert isinstance(src.logger._stream_handler.formatter, TextFormatter)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from src.blockchain.node_mux import NodeMux
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, api, method: str, params: list) -> dict:
+        self.calls.append((method, params))
+        await asyncio.sleep(0.01)
+        if method == "get_dynamic_global_properties":
+            return {
+                "result": {"head_block_number": 110, "last_irreversible_block_num": 100}
+            }
+        if method == "get_block":
+            return {"result": {"block_num": params[0]}}
+        if method == "get_objects":
+            return {"result": [{"id": object_id} for object_id in params[0]]}
+        return {"error": {"message": f"Unknown method {method}"}}
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_node_mux_deduplicates_requests():
+    upstream = FakeUpstream()
+    mux = NodeMux(upstream)
+
+    responses = await asyncio.gather(
+        *[
+            mux.request("database", "get_dynamic_global_properties", [])
+            for _ in range(5)
+        ]
+    )
+    assert len(upstream.calls) == 1
+    assert all(response == responses[0] for response in responses)
+    assert mux.stats["deduplicated"] == 4
+    assert mux.irreversible_block_num == 100
+
+    # Errors are returned as node returned them
+    assert "error" in await mux.request("database", "unknown", [])
+    assert (await mux.request("login", "database", [])) == {"result": "database"}
+
+
+@pytest.mark.asyncio
+async def test_node_mux_caches_blocks_and_objects():
+    upstream = FakeUpstream()
+    mux = NodeMux(upstream, objects_ttl=60)
+    await mux.request("database", "get_dynamic_global_properties", [])
+
+    for _ in range(3):
+        assert await mux.request("database", "get_block", [100]) == {
+            "result": {"block_num": 100}
+        }
+        await mux.request("database", "get_block", [105])
+    # Reversible block is requested every time
+    assert upstream.calls.count(("get_block", [100])) == 1
+    assert upstream.calls.count(("get_block", [105])) == 3
+
+    await mux.request("database", "get_objects", [["1.2.100", "1.3.0"]])
+    assert await mux.request("database", "get_objects", [["1.3.0"]]) == {
+        "result": [{"id": "1.3.0"}]
+    }
+    await mux.request("database", "get_objects", [["1.3.0", "1.3.1"]])
+    assert [call for call in upstream.calls if call[0] == "get_objects"] == [
+        ("get_objects", [["1.2.100", "1.3.0"]]),
+        ("get_objects", [["1.3.0", "1.3.1"]]),
+    ]
+
+    mux.objects_ttl = 0
+    await mux.request("database", "get_objects", [["1.3.0"]])
+    assert upstream.calls[-1] == ("get_objects", [["1.3.0"]])
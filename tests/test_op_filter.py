@@ -0,0 +1,24 @@
+import random
+
+from src.op_filter import OpIdFilter
+
+
+def test_op_filter_no_false_negatives():
+    op_filter = OpIdFilter(capacity=10000)
+    op_ids = random.sample(range(10 ** 9), 10000)
+    for op_id in op_ids:
+        op_filter.add(op_id)
+
+    assert len(op_filter) == 10000
+    assert all(op_id in op_filter for op_id in op_ids)
+
+
+def test_op_filter_error_rate():
+    op_filter = OpIdFilter(capacity=10000, error_rate=0.01)
+    # History operation IDs are sequential
+    for op_id in range(43570000, 43580000):
+        op_filter.add(op_id)
+
+    false_positives = sum(op_id in op_filter for op_id in range(43580000, 43600000))
+    assert false_positives / 20000 < 0.02
+    assert 0 not in OpIdFilter()
@@ -0,0 +1,41 @@
+import pytest
+from uuid import uuid4
+
+from src.op_record import FIELDS, OpRecord
+
+
+def test_op_record():
+    order_id = uuid4()
+    op = OpRecord(op_id=1, order_id=order_id, amount=100000)
+
+    assert (op.op_id, op.order_id, op.amount) == (1, order_id, 100000)
+    assert op.pk is None and op.tx_hash is None
+    assert not hasattr(op, "__dict__")
+
+    with pytest.raises(AttributeError):
+        op.amount = 1
+    with pytest.raises(TypeError):
+        OpRecord(op_idd=1)
+
+
+def test_op_record_replace():
+    op = OpRecord(op_id=1, confirmations=0)
+    confirmed = op.replace(confirmations=5)
+
+    assert (op.confirmations, confirmed.confirmations) == (0, 5)
+    assert confirmed.op_id == 1
+    assert op == OpRecord(op_id=1, confirmations=0)
+    assert confirmed != op
+    with pytest.raises(TypeError):
+        op.replace(confirmation=5)
+
+
+def test_op_record_from_row():
+    row = {name: None for name in FIELDS}
+    row.update(pk=7, op_id=1, memo="eth:123")
+    op = OpRecord.from_row(row)
+
+    assert (op.pk, op.op_id, op.memo) == (7, 1, "eth:123")
+    assert "pk" not in op.values()
+    assert op.values()["memo"] == "eth:123"
+    assert OpRecord.from_object(op) == op
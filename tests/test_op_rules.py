@@ -0,0 +1,85 @@
+from copy import copy
+
+import pytest
+
+from src.blockchain.op_rules import AssetRules, OpValidator
+from src.config import Config
+from src.gw_dto import OrderType, TxError
+
+GATEWAY_ID = "1.2.100"
+USER_ID = "1.2.200"
+
+
+def make_validator() -> OpValidator:
+    usdt = Config()
+    usdt.set_asset("1.3.10", 6)
+    btc = copy(usdt)
+    btc.gateway_distribute_asset = "BTC"
+    btc.min_withdrawal = 0.001
+    btc.set_asset("1.3.11", 8)
+    return OpValidator.compile([usdt, btc], {usdt.account: GATEWAY_ID})
+
+
+def transfer(from_id: str, to_id: str, amount: int, asset_id: str = "1.3.10") -> dict:
+    return {
+        "from": from_id,
+        "to": to_id,
+        "amount": {"amount": amount, "asset_id": asset_id},
+    }
+
+
+def test_asset_rules_need_loaded_asset():
+    with pytest.raises(ValueError):
+        AssetRules(Config(), GATEWAY_ID)
+
+
+def test_op_validator_check():
+    validator = make_validator()
+
+    rules, order_type, error = validator.check(
+        transfer(USER_ID, GATEWAY_ID, 500000), "eth:0x123"
+    )
+    assert (rules.symbol, order_type, error) == (
+        "FINTEHTEST.USDT",
+        OrderType.WITHDRAWAL,
+        TxError.FLOOD_MEMO,
+    )
+    assert validator.check(transfer(USER_ID, GATEWAY_ID, 500000), "USDT:0x123")[2] == (
+        TxError.NO_ERROR
+    )
+    assert validator.check(transfer(USER_ID, GATEWAY_ID, 5), "usdt:0x1")[2] == (
+        TxError.LESS_MIN
+    )
+    assert validator.check(transfer(USER_ID, GATEWAY_ID, 500000), "")[2] == (
+        TxError.NO_MEMO
+    )
+    assert validator.check(transfer(USER_ID, GATEWAY_ID, 500000), "usdt:0x1:2")[2] == (
+        TxError.FLOOD_MEMO
+    )
+
+    # Rules are matched by asset ID, limits are in base units of that asset
+    rules, _, error = validator.check(
+        transfer(USER_ID, GATEWAY_ID, 200000, "1.3.11"), "btc:bc1q"
+    )
+    assert (rules.symbol, error) == ("FINTEHTEST.BTC", TxError.NO_ERROR)
+
+    rules, order_type, error = validator.check(
+        transfer(GATEWAY_ID, USER_ID, 2000000), None
+    )
+    assert (order_type, error) == (OrderType.DEPOSIT, TxError.GREATER_MAX)
+
+    rules, _, error = validator.check(
+        transfer(USER_ID, GATEWAY_ID, 500000, "1.3.0"), "usdt:0x1"
+    )
+    assert (rules.asset_id, error) == ("1.3.10", TxError.BAD_ASSET)
+
+
+def test_op_validator_check_page():
+    validator = make_validator()
+    verdicts = validator.check_page(
+        [transfer(USER_ID, GATEWAY_ID, 500000), None, transfer(USER_ID, "1.2.300", 1)],
+        ["usdt:0x1", None, None],
+    )
+    assert verdicts[0][1:] == (OrderType.WITHDRAWAL, TxError.NO_ERROR)
+    assert verdicts[1] == (None, None, None)
+    assert verdicts[2] == (None, None, TxError.UNKNOWN_ERROR)
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.profiling import LoopMonitor, SamplingProfiler
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_detects_blocking_task():
+    monitor = LoopMonitor(threshold=0.05, interval=0.01)
+    monitor.start(asyncio.get_event_loop())
+    sampler = asyncio.create_task(monitor.sample_lag())
+
+    async def blocking_coroutine():
+        block_loop(0.3)
+
+    await asyncio.sleep(0.05)
+    await asyncio.create_task(blocking_coroutine())
+    await asyncio.sleep(0.05)
+
+    sampler.cancel()
+    monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["slow_callbacks"] == 1
+    assert "blocking_coroutine" in stats["last_slow"]
+    assert stats["max_lag"] >= 0.2
+    assert monitor.stats()["max_lag"] < 0.2
+
+
+@pytest.mark.asyncio
+async def test_sampling_profiler(tmp_path):
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start(asyncio.get_event_loop(), threading.get_ident())
+
+    async def blocking_coroutine():
+        block_loop(0.1)
+
+    await asyncio.create_task(blocking_coroutine())
+    profiler.stop()
+
+    path = tmp_path / "profile.folded"
+    samples = profiler.dump(str(path))
+
+    lines = path.read_text().splitlines()
+    assert samples > 10
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == samples
+    assert any(
+        line.startswith("test_sampling_profiler.<locals>.blocking_coroutine;")
+        and "block_loop" in line
+        for line in lines
+    )
@@ -1,4 +1,6 @@
+import asyncio
 import pytest
+import datetime
 from uuid import uuid4
 
 from src.db_utils.queries import *
@@ -22,6 +24,12 @@ async def test_engine():
     assert e.closed is False
 
 
+def test_op_record_fields():
+    from src.op_record import FIELDS
+
+    assert FIELDS == tuple(c.name for c in BitsharesOperation.__table__.columns)
+
+
 @pytest.mark.asyncio
 async def test_add_gateway_wallet():
     async with (await get_test_engine()).acquire() as conn:
@@ -153,10 +161,9 @@ async def test_update_operation():
 
 
 @pytest.mark.asyncio
-async def test_get_unconfirmed_operations():
+async def test_iter_unconfirmed_operations_condition():
     async with (await get_test_engine()).acquire() as conn:
-        current_unconfirmed_ops = await get_unconfirmed_operations(conn)
-        assert isinstance(current_unconfirmed_ops, list)
+        current_unconfirmed_ops = [op async for op in iter_unconfirmed_operations(conn)]
 
         operation_1 = BitsharesOperation(
             op_id=666,
@@ -185,7 +192,7 @@ async def test_get_unconfirmed_operations():
 
         await add_operation(conn, operation_3)
 
-        new_unconfirmed_ops = await get_unconfirmed_operations(conn)
+        new_unconfirmed_ops = [op async for op in iter_unconfirmed_operations(conn)]
 
         assert len(new_unconfirmed_ops) > len(current_unconfirmed_ops)
 
@@ -200,6 +207,42 @@ async def test_get_unconfirmed_operations():
         )
 
 
+@pytest.mark.asyncio
+async def test_iter_unconfirmed_operations():
+    async with (await get_test_engine()).acquire() as conn:
+        current_unconfirmed_ops = [op async for op in iter_unconfirmed_operations(conn)]
+        op_ids = [661, 662, 663, 664, 665]
+        for op_id in op_ids:
+            await insert_operation(
+                conn,
+                OpRecord(
+                    op_id=op_id,
+                    order_type=OrderType.WITHDRAWAL,
+                    to_account=testnet_gateway_account_mock,
+                    status=TxStatus.RECEIVED_NOT_CONFIRMED,
+                ),
+            )
+
+        iterated = []
+        async for op in iter_unconfirmed_operations(conn, chunk_size=2):
+            # Confirmed operation leaves condition, next chunks must not skip anything
+            if op.op_id in op_ids:
+                await update_operation(
+                    conn,
+                    op.replace(status=TxStatus.RECEIVED_AND_CONFIRMED),
+                    BitsharesOperation.op_id,
+                    op.op_id,
+                )
+            iterated.append(op.op_id)
+
+        await conn.execute(
+            delete(BitsharesOperation).where(BitsharesOperation.op_id.in_(op_ids))
+        )
+
+        assert len(iterated) == len(current_unconfirmed_ops) + len(op_ids)
+        assert iterated[-len(op_ids) :] == op_ids
+
+
 @pytest.mark.asyncio
 async def test_delete_gateway_wallet():
     async with (await get_test_engine()).acquire() as conn:
@@ -211,7 +254,7 @@ async def test_delete_gateway_wallet():
 
 
 @pytest.mark.asyncio
-async def test_get_new_ops_for_booker():
+async def test_iter_new_ops_for_booker():
     async with (await get_test_engine()).acquire() as conn:
 
         operation_1 = BitsharesOperation(
@@ -240,7 +283,7 @@ async def test_get_new_ops_for_booker():
         await add_operation(conn, operation_2)
         await add_operation(conn, operation_3)
 
-        new_ops_for_booker = await get_new_ops_for_booker(conn)
+        new_ops_for_booker = [op async for op in iter_new_ops_for_booker(conn)]
 
         await conn.execute(
             delete(BitsharesOperation).where(BitsharesOperation.op_id == 666)
@@ -256,7 +299,7 @@ async def test_get_new_ops_for_booker():
 
 
 @pytest.mark.asyncio
-async def test_get_pending_operations():
+async def test_iter_pending_operations():
     async with (await get_test_engine()).acquire() as conn:
         operation_1 = BitsharesOperation(
             op_id=666,
@@ -287,7 +330,7 @@ async def test_get_pending_operations():
         await add_operation(conn, operation_2)
         await add_operation(conn, operation_3)
 
-        pending_operations = await get_pending_operations(conn)
+        pending_operations = [op async for op in iter_pending_operations(conn)]
 
         await conn.execute(
             delete(BitsharesOperation).where(BitsharesOperation.op_id == 666)
@@ -312,7 +355,7 @@ async def test_get_op_by_hash():
             order_type=OrderType.DEPOSIT,
             tx_hash="123x",
             asset="FINTEHTEST.USDT",
-            amount=0.1,
+            amount=100000,
             from_account="fincubator-gateway-test",
             status=TxStatus.WAIT,
         )
@@ -321,7 +364,7 @@ async def test_get_op_by_hash():
             order_id=uuid4(),
             order_type=OrderType.DEPOSIT,
             asset="FINTEHTEST.USDT",
-            amount=0.1,
+            amount=100000,
             from_account="fincubator-gateway-test",
             status=TxStatus.WAIT,
         )
@@ -338,3 +381,218 @@ async def test_get_op_by_hash():
         )
 
         assert ops.op_id == 666
+
+
+@pytest.mark.asyncio
+async def test_archive_operations():
+    async with (await get_test_engine()).acquire() as conn:
+        operation_1 = BitsharesOperation(
+            op_id=666,
+            order_id=uuid4(),
+            order_type=OrderType.DEPOSIT,
+            tx_hash="123x",
+            from_account=testnet_gateway_account_mock,
+            status=TxStatus.RECEIVED_AND_CONFIRMED,
+        )
+        operation_2 = BitsharesOperation(
+            op_id=555,
+            order_type=OrderType.WITHDRAWAL,
+            to_account=testnet_gateway_account_mock,
+            status=TxStatus.ERROR,
+        )
+        operation_3 = BitsharesOperation(
+            op_id=444,
+            order_type=OrderType.WITHDRAWAL,
+            to_account=testnet_gateway_account_mock,
+            status=TxStatus.RECEIVED_AND_CONFIRMED,
+        )
+        await add_operation(conn, operation_1)
+        await add_operation(conn, operation_2)
+        await add_operation(conn, operation_3)
+
+        moved = await archive_operations(conn, batch_size=1000)
+
+        hot_cursor = await conn.execute(
+            select([BitsharesOperation]).where(
+                BitsharesOperation.op_id.in_([666, 555, 444])
+            )
+        )
+        hot_ops = await hot_cursor.fetchall()
+        op_by_hash = await get_operation_by_hash(conn, "123x")
+        archived_op = await get_operation(conn, 555)
+
+        for table in (BitsharesOperation, BitsharesOperationArchive):
+            await conn.execute(delete(table).where(table.op_id.in_([666, 555, 444])))
+        await delete_gateway_wallet(conn, testnet_gateway_account_mock)
+
+        assert moved >= 2
+        # Booker still does not know about operation_3, so it must stay in hot table
+        assert [op.op_id for op in hot_ops] == [444]
+        assert op_by_hash.op_id == 666
+        assert archived_op.status == TxStatus.ERROR
+
+
+@pytest.mark.asyncio
+async def test_insert_archived_operation_fails():
+    async with (await get_test_engine()).acquire() as conn:
+        order_id = uuid4()
+        await insert_operation(
+            conn,
+            OpRecord(
+                op_id=681,
+                order_id=order_id,
+                order_type=OrderType.WITHDRAWAL,
+                to_account=testnet_gateway_account_mock,
+                status=TxStatus.RECEIVED_AND_CONFIRMED,
+            ),
+        )
+        await archive_operations(conn, batch_size=1000)
+
+        results = []
+        # Booker retries order, history is replayed
+        for duplicate in (
+            OpRecord(
+                order_id=order_id, order_type=OrderType.DEPOSIT, status=TxStatus.WAIT
+            ),
+            OpRecord(
+                op_id=681,
+                order_type=OrderType.WITHDRAWAL,
+                status=TxStatus.RECEIVED_NOT_CONFIRMED,
+            ),
+        ):
+            try:
+                await insert_operation(conn, duplicate)
+            except DuplicateOperationError as ex:
+                results.append(ex)
+        try:
+            await insert_operations(
+                conn, [OpRecord(order_id=order_id, status=TxStatus.WAIT)]
+            )
+        except DuplicateOperationError as ex:
+            results.append(ex)
+
+        hot_cursor = await conn.execute(
+            select([BitsharesOperation]).where(
+                (BitsharesOperation.op_id == 681)
+                | (BitsharesOperation.order_id == order_id)
+            )
+        )
+        hot_ops = await hot_cursor.fetchall()
+        for table in (BitsharesOperation, BitsharesOperationArchive):
+            await conn.execute(delete(table).where(table.op_id == 681))
+
+        assert len(results) == 3
+        assert hot_ops == []
+
+
+@pytest.mark.asyncio
+async def test_requeue_operation():
+    async with (await get_test_engine()).acquire() as conn:
+        order_id = uuid4()
+        operation = BitsharesOperation(
+            op_id=666,
+            order_id=order_id,
+            order_type=OrderType.DEPOSIT,
+            tx_hash="123x",
+            tx_expiration=datetime.datetime.utcnow(),
+            from_account=testnet_gateway_account_mock,
+            status=TxStatus.WAIT,
+        )
+        await add_operation(conn, operation)
+
+        broadcast_ops = await get_broadcast_operations(conn)
+        is_requeued = await requeue_operation(conn, order_id)
+        pending_ops = [op async for op in iter_pending_operations(conn)]
+
+        await conn.execute(
+            delete(BitsharesOperation).where(BitsharesOperation.op_id == 666)
+        )
+        await delete_gateway_wallet(conn, testnet_gateway_account_mock)
+
+        assert order_id in [op.order_id for op in broadcast_ops]
+        assert is_requeued
+        assert order_id in [op.order_id for op in pending_ops]
+
+
+@pytest.mark.asyncio
+async def test_rollback_operations():
+    async with (await get_test_engine()).acquire() as conn:
+        for op_id, block_num in ((671, 100), (672, 105)):
+            await insert_operation(
+                conn,
+                OpRecord(
+                    op_id=op_id,
+                    order_type=OrderType.WITHDRAWAL,
+                    to_account=testnet_gateway_account_mock,
+                    status=TxStatus.RECEIVED_AND_CONFIRMED,
+                    confirmations=10,
+                    block_num=block_num,
+                    tx_hash=f"{op_id}x",
+                ),
+            )
+
+        # Blocks since 103 are orphaned
+        rolled_back = await rollback_operations(conn, 103)
+        rolled_back_ops = await get_rolled_back_operations(conn)
+        kept = await get_operation(conn, 671)
+
+        await conn.execute(
+            delete(BitsharesOperation).where(BitsharesOperation.op_id.in_([671, 672]))
+        )
+
+        assert [op.op_id for op in rolled_back] == [672]
+        assert rolled_back[0].block_num is None
+        assert rolled_back[0].status == TxStatus.RECEIVED_NOT_CONFIRMED
+        assert rolled_back[0].confirmations == 0
+        assert 672 in [op.op_id for op in rolled_back_ops]
+        assert kept.block_num == 100
+        assert kept.status == TxStatus.RECEIVED_AND_CONFIRMED
+
+
+@pytest.mark.asyncio
+async def test_insert_batcher():
+    from src.db_utils.insert_batcher import InsertBatcher
+
+    engine = await get_test_engine()
+    batcher = InsertBatcher(max_batch_size=2)
+    order_ids = [uuid4() for _ in range(5)]
+
+    await asyncio.gather(
+        *(
+            batcher.insert(
+                engine,
+                BitsharesOperation(
+                    order_id=order_id,
+                    order_type=OrderType.DEPOSIT,
+                    from_account=testnet_gateway_account_mock,
+                    status=TxStatus.WAIT,
+                ),
+            )
+            for order_id in order_ids
+        )
+    )
+    # Duplicated order fails alone, other operations of its batch are inserted
+    duplicate = BitsharesOperation(
+        order_id=order_ids[0], order_type=OrderType.DEPOSIT, status=TxStatus.WAIT
+    )
+    new = BitsharesOperation(
+        order_id=uuid4(), order_type=OrderType.DEPOSIT, status=TxStatus.WAIT
+    )
+    results = await asyncio.gather(
+        batcher.insert(engine, duplicate),
+        batcher.insert(engine, new),
+        return_exceptions=True,
+    )
+
+    async with engine.acquire() as conn:
+        pending_ops = [op async for op in iter_pending_operations(conn)]
+        for order_id in order_ids + [new.order_id]:
+            await conn.execute(
+                delete(BitsharesOperation).where(
+                    BitsharesOperation.order_id == order_id
+                )
+            )
+
+    assert set(order_ids) <= {op.order_id for op in pending_ops}
+    assert isinstance(results[0], Exception)
+    assert results[1] is None
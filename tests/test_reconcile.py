@@ -0,0 +1,111 @@
+import csv
+import json
+
+from src import reconcile
+
+GATEWAY_ID = "1.2.100"
+USDT = "1.3.10"
+
+
+def history_op(op_num: int, from_id: str, to_id: str, amount: int, **extra) -> dict:
+    return dict(
+        id=f"1.11.{op_num}",
+        block_num=op_num * 10,
+        op=[
+            0,
+            {
+                "from": from_id,
+                "to": to_id,
+                "amount": {"amount": amount, "asset_id": USDT},
+            },
+        ],
+        **extra,
+    )
+
+
+def db_row(
+    op_id, order_type: str, amount: int, status: str = "RECEIVED_AND_CONFIRMED"
+) -> dict:
+    return {
+        "op_id": op_id,
+        "order_type": order_type,
+        "asset": "FINTEHTEST.USDT",
+        "amount": amount,
+        "status": status,
+        "tx_created_at": "2020-07-01 10:00:00.123",
+    }
+
+
+def write_inputs(tmp_path) -> tuple:
+    history = tmp_path / "history.jsonl"
+    ops = [
+        history_op(3, "1.2.200", GATEWAY_ID, 700, block_time="2020-07-01T10:00:00"),
+        history_op(1, GATEWAY_ID, "1.2.200", 500),
+        history_op(2, "1.2.200", "1.2.300", 1),
+        history_op(4, "1.2.200", GATEWAY_ID, 300, block_time="2020-07-02T00:00:01"),
+        {"id": "1.11.5", "op": [14, {}]},
+    ]
+    history.write_text("\n".join(json.dumps(op) for op in ops) + "\n")
+
+    operations = tmp_path / "operations.csv"
+    with open(operations, "w", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=list(db_row(0, "", 0)))
+        writer.writeheader()
+        writer.writerow(db_row(1, "DEPOSIT", 500))
+        writer.writerow(db_row(3, "WITHDRAWAL", 690))
+        writer.writerow(db_row(9, "WITHDRAWAL", 10, "RECEIVED_NOT_CONFIRMED"))
+        writer.writerow(db_row("", "DEPOSIT", 40, "WAIT"))
+    return history, operations
+
+
+def run(tmp_path) -> dict:
+    history, operations = write_inputs(tmp_path)
+    assets = reconcile.Assets({USDT: "FINTEHTEST.USDT"})
+    with open(history) as lines:
+        chain = reconcile.load_history(lines, GATEWAY_ID, assets)
+    with open(operations, newline="") as rows:
+        db, unsent = reconcile.load_operations(csv.DictReader(rows), assets)
+    return reconcile.reconcile(chain, db, unsent, assets)
+
+
+def check_report(report: dict):
+    assert report["summary"] == {
+        "chain_ops": 3,
+        "db_ops": 3,
+        "db_ops_without_op_id": 1,
+        "matched": 2,
+        "mismatched": 1,
+        "missing_in_db": 1,
+        "missing_on_chain": 1,
+        "days_with_diff": 2,
+    }
+    assert report["mismatches"] == [
+        {"op_id": 3, "field": "amount", "chain": 700, "db": 690}
+    ]
+    assert report["missing_in_db"] == [4]
+    assert report["missing_on_chain"] == [9]
+
+    by_day = {(day["day"], day["order_type"]): day for day in report["by_day"]}
+    # Chain op without block time is counted on day of its database row
+    assert by_day[("2020-07-01", "DEPOSIT")]["diff"] == 0
+    assert by_day[("2020-07-01", "WITHDRAWAL")]["chain_amount"] == 700
+    assert by_day[("2020-07-01", "WITHDRAWAL")]["db_amount"] == 700
+    assert by_day[("2020-07-02", "WITHDRAWAL")]["diff"] == -300
+
+    assert {
+        (status["status"], status["in_history"]): status["amount"]
+        for status in report["by_status"]
+    } == {
+        ("RECEIVED_AND_CONFIRMED", True): 1190,
+        ("RECEIVED_NOT_CONFIRMED", True): 10,
+        ("WAIT", False): 40,
+    }
+
+
+def test_reconcile(tmp_path):
+    check_report(run(tmp_path))
+
+
+def test_reconcile_without_numpy(tmp_path, monkeypatch):
+    monkeypatch.setattr(reconcile, "numpy", None)
+    check_report(run(tmp_path))
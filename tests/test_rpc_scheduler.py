@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from src.blockchain.rpc_scheduler import (
+    RpcPriority,
+    RpcScheduler,
+    TokenBucket,
+    current_priority,
+    rpc_priority,
+    with_rpc_priority,
+)
+from src.metrics import metrics
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated_at
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == 0
+    assert bucket.take(now) == pytest.approx(0.1)
+    assert bucket.take(now + 0.11) == 0
+
+    assert TokenBucket(rate=0, burst=1).take() == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_context():
+    assert current_priority() == RpcPriority.LIVE
+    with rpc_priority(RpcPriority.BACKFILL):
+        assert current_priority() == RpcPriority.BACKFILL
+
+    async def loop():
+        return current_priority()
+
+    prioritized = with_rpc_priority(RpcPriority.BROADCAST, loop)
+    assert prioritized.__name__ == "loop"
+    assert await prioritized() == RpcPriority.BROADCAST
+    assert current_priority() == RpcPriority.LIVE
+
+
+@pytest.mark.asyncio
+async def test_broadcast_overtakes_backfill():
+    scheduler = RpcScheduler(max_in_flight=2)
+    started = []
+    in_flight = []
+
+    async def node_call(name):
+        started.append(name)
+        in_flight.append(name)
+        assert len(in_flight) <= scheduler.max_in_flight
+        await asyncio.sleep(0.001)
+        in_flight.remove(name)
+        return name
+
+    backfill = [
+        asyncio.ensure_future(
+            scheduler.call("node", node_call, i, priority=RpcPriority.BACKFILL)
+        )
+        for i in range(50)
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.depth(RpcPriority.BACKFILL) == 48
+    assert metrics.get("rpc_queue_depth", priority="backfill") == 48
+
+    broadcast = asyncio.ensure_future(
+        scheduler.call("node", node_call, "tx", priority=RpcPriority.BROADCAST)
+    )
+    assert await broadcast == "tx"
+    assert started.index("tx") <= scheduler.max_in_flight + 1
+
+    assert await asyncio.gather(*backfill) == list(range(50))
+    assert scheduler.in_flight == 0
+    assert metrics.get("rpc_queue_depth", priority="backfill") == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rate_limit_and_cancel():
+    scheduler = RpcScheduler(rate=100, burst=1)
+
+    async def node_call():
+        return asyncio.get_event_loop().time()
+
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    times = await asyncio.gather(*[scheduler.call("node", node_call) for _ in range(4)])
+    # First call takes the burst token, others wait 10 ms each
+    assert times[-1] - start >= 0.025
+    # Other node has its own bucket
+    assert await scheduler.call("other", node_call) - times[-1] < 0.01
+
+    waiting = [
+        asyncio.ensure_future(scheduler.call("node", node_call)) for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    waiting[0].cancel()
+    results = await asyncio.gather(*waiting, return_exceptions=True)
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert scheduler.in_flight == 0
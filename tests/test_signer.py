@@ -0,0 +1,71 @@
+import pytest
+from bitsharesbase import operations
+from bitsharesbase.account import PrivateKey, PublicKey
+from bitsharesbase.objects import Operation
+from bitsharesbase.signedtransactions import Signed_Transaction
+
+from src.blockchain.signer import TransactionSigner
+
+CHAIN = {
+    "chain_id": "39f5e2ede1f8bc1a3a54a7914414e3779e33193f1f5693510e73cb7a87617447",
+    "core_symbol": "TEST",
+    "prefix": "TEST",
+}
+
+
+def make_transfer(amount: int) -> dict:
+    op = operations.Transfer(
+        **{
+            "fee": {"amount": 100, "asset_id": "1.3.0"},
+            "from": "1.2.100",
+            "to": "1.2.200",
+            "amount": {"amount": amount, "asset_id": "1.3.1"},
+            "prefix": "TEST",
+        }
+    )
+    return Signed_Transaction(
+        ref_block_num=1,
+        ref_block_prefix=2,
+        expiration="2030-01-01T00:00:00",
+        operations=[Operation(op)],
+    ).json()
+
+
+@pytest.mark.asyncio
+async def test_signer_sign():
+    wif = str(PrivateKey(prefix="TEST"))
+    signer = TransactionSigner([wif], CHAIN, workers=1)
+    tx = make_transfer(1000)
+    try:
+        tx_id, signed_tx = await signer.sign(tx, [wif])
+    finally:
+        signer.close()
+
+    assert len(signed_tx["signatures"]) == 1
+    assert tx_id == Signed_Transaction(make_transfer(1000)).id
+
+    pubkey = PublicKey(signer.pubkeys[wif], prefix="TEST")
+    verified = Signed_Transaction(signed_tx).verify([pubkey], CHAIN)
+    assert verified == [repr(pubkey)]
+
+
+@pytest.mark.asyncio
+async def test_signer_unknown_key():
+    signer = TransactionSigner([str(PrivateKey())], CHAIN, workers=1)
+    try:
+        with pytest.raises(KeyError):
+            await signer.sign(make_transfer(1000), [str(PrivateKey())])
+    finally:
+        signer.close()
+
+
+@pytest.mark.asyncio
+async def test_signer_tx_ids():
+    signer = TransactionSigner([], CHAIN, workers=1)
+    txs = [make_transfer(amount) for amount in range(1, 21)]
+    expected = [Signed_Transaction(make_transfer(amount)).id for amount in range(1, 21)]
+    try:
+        assert await signer.tx_ids(txs[:2]) == expected[:2]
+        assert await signer.tx_ids(txs) == expected
+    finally:
+        signer.close()
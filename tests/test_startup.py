@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from src.startup import Startup, StartupPhaseFailed
+
+
+@pytest.mark.asyncio
+async def test_startup_runs_independent_phases_concurrently():
+    events = []
+
+    async def phase(name, delay):
+        events.append(f"{name} started")
+        await asyncio.sleep(delay)
+        events.append(f"{name} finished")
+        return name
+
+    startup = Startup()
+    startup.add("database", lambda: phase("database", 0.05))
+    startup.add("node", lambda: phase("node", 0.01))
+    startup.add("sync", lambda: phase("sync", 0), requires=("database", "node"))
+
+    results = await startup.run()
+
+    assert results == {"database": "database", "node": "node", "sync": "sync"}
+    assert events[:2] == ["database started", "node started"]
+    assert events.index("sync started") > events.index("database finished")
+    assert set(startup.timings) == {"database", "node", "sync", "total"}
+    assert startup.timings["total"] < 0.05 + 0.01 + 0.04
+    assert "database" in startup.report()
+
+
+@pytest.mark.asyncio
+async def test_startup_non_critical_failure():
+    async def fail():
+        raise ConnectionError("booker is down")
+
+    async def ok():
+        return True
+
+    startup = Startup()
+    startup.add("booker", fail, critical=False)
+    startup.add("server", ok, requires=("booker",))
+
+    results = await startup.run()
+
+    assert results == {"booker": None, "server": True}
+
+
+@pytest.mark.asyncio
+async def test_startup_critical_failure():
+    async def fail():
+        raise ConnectionError("database is down")
+
+    async def never():
+        await asyncio.sleep(10)
+
+    startup = Startup()
+    startup.add("database", fail)
+    startup.add("node", never)
+
+    with pytest.raises(StartupPhaseFailed):
+        await startup.run()
+
+
+@pytest.mark.asyncio
+async def test_startup_unknown_requirement():
+    async def ok():
+        return True
+
+    startup = Startup()
+    startup.add("sync", ok, requires=("database",))
+
+    with pytest.raises(StartupPhaseFailed):
+        await startup.run()
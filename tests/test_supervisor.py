@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from src.metrics import metrics
+from src.supervisor import Supervisor, TaskState
+
+
+@pytest.mark.asyncio
+async def test_supervisor_restarts_with_backoff():
+    runs = []
+
+    async def failing():
+        runs.append(asyncio.get_event_loop().time())
+        raise ConnectionError("database is down")
+
+    supervisor = Supervisor(base_delay=0.01, max_delay=1, budget=3, budget_window=60)
+    supervisor.add("failing", failing)
+    supervisor.start()
+    await asyncio.sleep(0.2)
+
+    # First run and 3 restarts, then restart budget is exhausted
+    assert len(runs) == 4
+    assert supervisor.health() == {"failing": "FAILED"}
+    assert metrics.get("task_state", task="failing") == TaskState.FAILED
+    assert metrics.get("task_restarts_total", task="failing") == 4
+
+    delays = [b - a for a, b in zip(runs, runs[1:])]
+    assert delays[2] > delays[0]
+
+    await supervisor.stop()
+    assert supervisor.health() == {"failing": "STOPPED"}
+
+
+def test_supervisor_backoff_delay():
+    supervisor = Supervisor(base_delay=1, max_delay=60)
+
+    assert 0.5 <= supervisor.backoff_delay(1) <= 1
+    assert 4 <= supervisor.backoff_delay(4) <= 8
+    assert 30 <= supervisor.backoff_delay(20) <= 60
+
+
+@pytest.mark.asyncio
+async def test_supervisor_drains_batches_on_stop():
+    done = []
+
+    async def worker():
+        while True:
+            async with supervisor.batch():
+                await asyncio.sleep(0.05)
+                done.append(True)
+
+    supervisor = Supervisor()
+    supervisor.add("worker", worker)
+    supervisor.start()
+    await asyncio.sleep(0.01)
+
+    await supervisor.stop()
+
+    assert done == [True]
+    assert supervisor.in_flight == 0
+    assert supervisor.health() == {"worker": "STOPPED"}
@@ -0,0 +1,30 @@
+from uuid import uuid4
+
+from src.metrics import metrics
+from src.op_record import OpRecord
+from src.tx_hash_index import TxHashIndex
+
+
+def test_tx_hash_index():
+    index = TxHashIndex()
+    op = OpRecord(pk=1, order_id=uuid4(), tx_hash="123x", block_num=100)
+    index.rebuild([op, OpRecord(pk=2, order_id=uuid4(), tx_hash="456y")])
+
+    index.update("123x", block_num=101)
+    index.discard("456y")
+    assert len(index) == 1 and "456y" not in index
+
+    assert index.pop("123x") == op.replace(block_num=101)
+    assert index.pop("123x") is None
+    assert (index.hits, index.misses) == (1, 1)
+    assert index.hit_rate() == 0.5
+    assert metrics.get("tx_hash_index_hit_rate") == 0.5
+
+
+def test_tx_hash_index_add():
+    index = TxHashIndex()
+    assert index.hit_rate() == 0.0
+
+    index.add(OpRecord(tx_hash="123x"))
+    index.update("unknown", block_num=1)
+    assert "123x" in index and "unknown" not in index
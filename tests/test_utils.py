@@ -1,6 +1,8 @@
+from decimal import Decimal
+
 import pytest
 
-from src.utils import get_gw_settings
+from src.utils import amount_to_units, get_gw_settings, units_to_amount
 
 from .fixtures import test_control_center_url
 
@@ -11,3 +13,17 @@ async def test_get_gw_settings():
     if test_control_center_url:
         settings = await get_gw_settings("BTC", test_control_center_url)
         assert isinstance(settings, dict)
+
+
+def test_amount_to_units():
+    assert amount_to_units(0.1, 6) == 100000
+    assert amount_to_units("1.23", 2) == 123
+    assert amount_to_units(Decimal("0.000001"), 6) == 1
+    assert amount_to_units(5, 0) == 5
+    with pytest.raises(ValueError):
+        amount_to_units("0.0000001", 6)
+
+
+def test_units_to_amount():
+    assert units_to_amount(100000, 6) == Decimal("0.1")
+    assert units_to_amount(amount_to_units("123.45", 4), 4) == Decimal("123.45")